@@ -27,6 +27,12 @@ class ConcordAppConfig(AppConfig):
                 modules.append(module)
         return modules
 
+    def ready(self):
+        """Builds the registry of Concord classes once all models are loaded, so lookups don't have to reflect
+        over modules at runtime. Each Concord app calls this, but the registry is only built once."""
+        from concord.utils.lookups import registry
+        registry.get()
+
 
 class ActionsConfig(ConcordAppConfig):
     """AppConfig for Actions modeule."""
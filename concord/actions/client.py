@@ -10,7 +10,8 @@ from django.db.models import QuerySet
 from django.core.exceptions import ObjectDoesNotExist
 
 from concord.actions.models import Action, TemplateModel
-from concord.utils.lookups import get_all_permissioned_models, get_all_state_changes
+from concord.utils.lookups import (
+    get_all_permissioned_models, get_all_state_changes, get_all_foundational_state_changes, registry)
 from concord.utils.pipelines import action_pipeline
 from concord.actions import state_changes as sc
 
@@ -75,15 +76,27 @@ class BaseClient(object):
         each one. The function returns expects as args the dictionary of parameters that need to be passed on to
         the state change, and the client that will be used to create and take the action."""
         if self.app_name:
+            state_change = self.get_state_changes_by_method_name().get(name)
+            if state_change:
+                def state_change_function(**kwargs):
+                    proposed = kwargs.get("proposed", None)
+                    change = state_change(**kwargs)
+                    return self.create_and_take_action(change, proposed)
+                return state_change_function
+
+    def get_state_changes_by_method_name(self):
+        """Gets a dict of state changes belonging to the client's app, keyed by the method name used to call them
+        on the client. Computed once per client class and cached in the registry."""
+
+        def map_state_changes():
+            state_changes = {}
             for state_change in get_all_state_changes():
                 if self.match_state_change_app(state_change):
                     change_name = state_change.change_description(capitalize=False).strip(" ").replace(" ", "_")
-                    if change_name == name:
-                        def state_change_function(**kwargs):
-                            proposed = kwargs.get("proposed", None)
-                            change = state_change(**kwargs)
-                            return self.create_and_take_action(change, proposed)
-                        return state_change_function
+                    state_changes.setdefault(change_name, state_change)
+            return state_changes
+
+        return registry.get().memoize(("client_state_changes", self.__class__), map_state_changes)
 
     def set_target(self, target=None, target_pk=None, target_ct=None):
         """Sets target of the client. Accepts either a target model or the target's pk and ct and fetches,
@@ -260,36 +273,35 @@ class ActionClient(BaseClient):
 
     def get_action_history_given_target(self, target=None) -> QuerySet:
         """Gets the action history of a target. Accepts a target model passed in or, if no target is passed in,
-        uses the target currently set on the client."""
+        uses the target currently set on the client. Changes are deserialized together when it's evaluated."""
         self.optionally_overwrite_target(target=target)
         content_type = ContentType.objects.get_for_model(self.target)
-        return Action.objects.filter(content_type=content_type.id, object_id=self.target.id)
+        return Action.objects.filter(content_type=content_type.id, object_id=self.target.id).with_changes()
 
     def get_action_history_given_actor(self, actor=None) -> QuerySet:
         """Gets the action history of an actor. Accepts an User model passed in or, if no actor is passed in,
-        uses the actor currently set on the client."""
+        uses the actor currently set on the client. Changes are deserialized together when it's evaluated."""
         actor = actor if actor else self.actor
-        return Action.objects.filter(actor=actor)
+        return Action.objects.filter(actor=actor).with_changes()
 
     def get_foundational_actions_given_target(self, target=None) -> QuerySet:
         """Gets the action history of a target, filtered to include only foundational changes."""
         actions = self.get_action_history_given_target(target)
-        from concord.actions.utils import get_all_foundational_state_changes
-        changes = get_all_foundational_state_changes()
-        return [action for action in actions if action.change.get_change_type() in changes]
+        change_types = [change.get_change_type() for change in get_all_foundational_state_changes()]
+        return actions.filter(change_type__in=change_types)
 
     def get_governing_actions_given_target(self, target=None) -> QuerySet:
         """Gets the action history of a target, filtered to only include actions resolved via the
         governing permission."""
         actions = self.get_action_history_given_target(target)
-        return [action for action in actions if action.resolved_through == "governing"]
+        return actions.filter(resolved_through="governing")
 
     def get_owning_actions_given_target(self, target=None) -> QuerySet:
         """Gets the action history of a target, filtered to only include actions resolved through
         foundational permission. Similar to filtering foundational_actions, but includes non-foundational
         actions taken on targets with the foundational permission enabled."""
         actions = self.get_action_history_given_target(target)
-        return [action for action in actions if action.resolved_through == "foundational"]
+        return actions.filter(resolved_through="foundational")
 
     # Indirect change of state
 
@@ -1,13 +1,14 @@
 """This module contains custom fields used by this package's models.py, as well as the Python objects used to
 create those custom fields, which are occasionally used on their own."""
 
-import logging, json
+import copy, logging, json
 
 from django.db import models, transaction
 from concord.actions.utils import MockAction
 from concord.utils.dependent_fields import replace_fields
 from concord.utils.text_utils import (mock_action_to_text, foundational_actions_to_text, supplied_fields_to_text)
-from concord.utils.converters import ConcordConverterMixin
+from concord.utils.converters import ConcordConverterMixin, DeserializationContext, load_payload, dump_payload
+from concord.utils.lookups import get_concord_class
 
 
 logger = logging.getLogger(__name__)
@@ -18,38 +19,123 @@ logger = logging.getLogger(__name__)
 #############################
 
 
+class LazyStateChange:
+    """Stands in for a state change loaded from the database, keeping the serialized data and only deserializing
+    it when needed. Deserializing can be expensive since it fetches any models referenced by the change.
+
+    Class-level metadata like the change type and description is available without deserializing. Any other
+    attribute access deserializes the change and passes through to it."""
+
+    class_attributes = ["get_change_type", "change_description", "get_preposition", "get_uninstantiated_description",
+                        "descriptive_text", "section", "is_foundational", "allowable_targets", "get_context_keys"]
+
+    def __init__(self, serialized_value):
+        self._serialized_value = serialized_value
+        self._data = json.loads(serialized_value) if isinstance(serialized_value, str) else serialized_value
+        self._change = None
+
+    def __getattr__(self, name):
+        if name.startswith("__") or name in ["_serialized_value", "_data", "_change"]:
+            raise AttributeError(name)
+        if self._change is None:
+            if name in self.class_attributes:
+                return getattr(self.change_class, name)
+            if not hasattr(self.change_class, name):  # eg Django checking for resolve_expression
+                raise AttributeError(name)
+        return getattr(self.materialize(), name)
+
+    def __setattr__(self, name, value):
+        if name in ["_serialized_value", "_data", "_change"]:
+            return super().__setattr__(name, value)
+        setattr(self.materialize(), name, value)
+
+    def __str__(self):
+        return str(self.materialize())
+
+    def __repr__(self):
+        return f"LazyStateChange({self._data.get('class')}, materialized={self.is_materialized})"
+
+    @property
+    def serialized_data(self):
+        """The serialized change, as loaded from the database."""
+        return self._data
+
+    @property
+    def change_class(self):
+        return get_concord_class(self._data["class"])
+
+    @property
+    def change_type(self):
+        return self.change_class.get_change_type()
+
+    @property
+    def is_materialized(self):
+        return self._change is not None
+
+    def materialize(self, context=None):
+        """Deserializes the state change, if it hasn't been already, and returns it."""
+        if self._change is None:
+            serialized_value = self._serialized_value
+            if isinstance(serialized_value, dict):  # deserialize modifies dicts passed in
+                serialized_value = copy.deepcopy(serialized_value)
+            self._change = ConcordConverterMixin.deserialize(serialized_value, context=context)
+        return self._change
+
+    def serialize(self, to_json=False):
+        if self._change is not None:
+            return self._change.serialize(to_json=to_json)
+        return json.dumps(self._data) if to_json else self._data
+
+
+def materialize_state_changes(changes):
+    """Deserializes a batch of lazy state changes, eg for a page of actions, fetching the models they reference
+    with one query per model class rather than one per reference."""
+    lazy_changes = [change for change in changes if isinstance(change, LazyStateChange) and not change.is_materialized]
+    context = DeserializationContext(*[change.serialized_data for change in lazy_changes])
+    for change in lazy_changes:
+        change.materialize(context)
+
+
 class StateChangeField(models.Field):
-    """Django model field definition for State Change object."""
+    """Django model field definition for State Change object. If compact is True, saves changes in the compact
+    format (see utils/converters.py). Changes saved in either format can always be read."""
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, compact=False, *args, **kwargs):
+        self.compact = compact
         super().__init__(*args, **kwargs)
 
     def deconstruct(self):
         name, path, args, kwargs = super().deconstruct()
+        if self.compact:    # only include kwargs if it's not the default
+            kwargs['compact'] = self.compact
         return name, path, args, kwargs
 
     def db_type(self, connection):
         return 'varchar'
 
     def from_db_value(self, value, expression, connection):
-        return ConcordConverterMixin.deserialize(value)
+        if value is None:
+            return value
+        return LazyStateChange(load_payload(value))
 
     def to_python(self, value):
         from concord.actions.state_changes import BaseStateChange
-        if issubclass(value, BaseStateChange):
+        if isinstance(value, (BaseStateChange, LazyStateChange)):
             return value
-        return ConcordConverterMixin.deserialize(value)
+        return ConcordConverterMixin.deserialize(load_payload(value))
 
     def get_prep_value(self, value):
 
         # If actually given a state change, prep:
         from concord.actions.state_changes import BaseStateChange
-        if issubclass(value.__class__, BaseStateChange):
-            return value.serialize(to_json=True)
+        if isinstance(value, (BaseStateChange, LazyStateChange)):
+            return dump_payload(value.serialize(), compact=self.compact)
 
         # If already prepped for some reason, return as is:
         if isinstance(value, dict) and "class" in value and "StateChange" in value["class"]:
-            return json.dumps(value)
+            return dump_payload(value, compact=self.compact)
+        if isinstance(value, str):
+            return value
 
 
 ###############################
@@ -189,16 +275,20 @@ class Template(ConcordConverterMixin):
 
 
 class TemplateField(models.Field):
-    """Django model field definition for Template object."""
+    """Django model field definition for Template object. If compact is True, saves templates in the compact
+    format (see utils/converters.py). Templates saved in either format can always be read."""
 
-    def __init__(self, system=False, *args, **kwargs):
+    def __init__(self, system=False, compact=False, *args, **kwargs):
         self.system = system
+        self.compact = compact
         super().__init__(*args, **kwargs)
 
     def deconstruct(self):
         name, path, args, kwargs = super().deconstruct()
         if self.system:    # only include kwargs if it's not the default
             kwargs['system'] = self.system
+        if self.compact:
+            kwargs['compact'] = self.compact
         return name, path, args, kwargs
 
     def db_type(self, connection):
@@ -209,7 +299,7 @@ class TemplateField(models.Field):
         if value is None:
             return Template(system=self.system)
 
-        return Template.deserialize(value)
+        return Template.deserialize(load_payload(value))
 
     def to_python(self, value):
 
@@ -222,7 +312,7 @@ class TemplateField(models.Field):
         if isinstance(value, list) and all([item.__class__ == MockAction for item in value]):
             return Template(action_list=value, system=self.system)
 
-        return Template.deserialize(value)
+        return Template.deserialize(load_payload(value))
 
     def get_prep_value(self, value):
 
@@ -230,8 +320,11 @@ class TemplateField(models.Field):
             if self.system and not value.system:
                 # This is a system field (likely a condition) that somehow got initialized without this setting
                 value.system = True
-            return value.serialize(to_json=True)
+            return dump_payload(value.serialize(), compact=self.compact)
 
         if isinstance(value, list) and all([item.__class__ == MockAction for item in value]):
             template = Template(action_list=value, system=self.system)
-            return template.serialize(to_json=True)
+            return dump_payload(template.serialize(), compact=self.compact)
+
+        if isinstance(value, str):  # already prepped
+            return value
@@ -0,0 +1,52 @@
+"""Management command which rewrites saved state changes and templates in the compact or regular format."""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = 'Rewrites Action changes and TemplateModel templates in the compact (default) or regular format'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=['compact', 'regular'],
+            default='compact',
+            help='Format to convert payloads to',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows to rewrite per transaction',
+        )
+
+    def convert(self, model, field_name, compact, batch_size):
+
+        from concord.utils.converters import dump_payload
+
+        converted, batch = 0, []
+        rows = model.objects.values_list("pk", field_name).order_by("pk").iterator(chunk_size=batch_size)
+
+        for pk, value in rows:
+            batch.append((pk, dump_payload(value.serialize(), compact=compact)))
+            if len(batch) >= batch_size:
+                converted += self.save_batch(model, field_name, batch)
+                batch = []
+
+        return converted + self.save_batch(model, field_name, batch)
+
+    def save_batch(self, model, field_name, batch):
+        with transaction.atomic():
+            for pk, payload in batch:
+                model.objects.filter(pk=pk).update(**{field_name: payload})
+        return len(batch)
+
+    def handle(self, *args, **options):
+
+        from concord.actions.models import Action, TemplateModel
+
+        compact = options['format'] == 'compact'
+        for model, field_name in [(Action, "change"), (TemplateModel, "template_data")]:
+            converted = self.convert(model, field_name, compact, options['batch_size'])
+            self.stdout.write(f"Converted {converted} {model.__name__} rows to {options['format']} format")
@@ -0,0 +1,46 @@
+"""Management command which fills in change_type for actions whose change class wasn't known when the column was
+backfilled, such as state changes defined by apps using Concord."""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = 'Fills in change_type on actions where it is missing, looking up change classes in the registry'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of actions to update per transaction',
+        )
+
+    def handle(self, *args, **options):
+
+        from concord.actions.models import Action
+
+        batch_size = options['batch_size']
+        missing = Action.objects.filter(change_type__isnull=True).only("pk", "change").order_by("pk")
+        filled, unknown, last_pk = 0, 0, 0
+
+        while True:
+            batch = list(missing.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            actions = []
+            for action in batch:
+                if action.change and action.change.change_class:
+                    action.change_type = action.change.get_change_type()
+                    actions.append(action)
+                else:
+                    unknown += 1
+            with transaction.atomic():
+                Action.objects.bulk_update(actions, ["change_type"])
+            filled += len(actions)
+
+        self.stdout.write(f"Filled in change_type for {filled} actions")
+        if unknown:
+            self.stdout.write(f"Skipped {unknown} actions whose change class isn't registered")
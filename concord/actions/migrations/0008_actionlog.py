@@ -0,0 +1,29 @@
+# Generated by Django 2.2.13 on 2026-10-16 20:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('actions', '0007_action_note'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActionLog',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('approved_through', models.CharField(blank=True, db_index=True, max_length=50, null=True)),
+                ('matched_role', models.CharField(blank=True, max_length=200, null=True)),
+                ('rejection_reason', models.CharField(blank=True, db_index=True, max_length=500, null=True)),
+                ('info', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('action', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='log_entries', to='actions.Action')),
+            ],
+            options={
+                'ordering': ['-pk'],
+            },
+        ),
+    ]
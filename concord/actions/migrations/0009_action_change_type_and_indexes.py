@@ -0,0 +1,148 @@
+# Generated by Django 2.2.13 on 2026-10-16 20:30
+
+import json
+import logging
+
+from django.db import migrations, models
+from django.db.models.functions import Cast
+
+
+logger = logging.getLogger(__name__)
+
+# The change type of each state change class when this migration was written, so the backfill doesn't depend
+# on the current code. Change types are the class's module path plus its name.
+CHANGE_TYPES = {
+    "ChangeOwnerStateChange": "concord.actions.state_changes.ChangeOwnerStateChange",
+    "EnableFoundationalPermissionStateChange": "concord.actions.state_changes.EnableFoundationalPermissionStateChange",
+    "DisableFoundationalPermissionStateChange": "concord.actions.state_changes.DisableFoundationalPermissionStateChange",
+    "EnableGoverningPermissionStateChange": "concord.actions.state_changes.EnableGoverningPermissionStateChange",
+    "DisableGoverningPermissionStateChange": "concord.actions.state_changes.DisableGoverningPermissionStateChange",
+    "ViewStateChange": "concord.actions.state_changes.ViewStateChange",
+    "ApplyTemplateStateChange": "concord.actions.state_changes.ApplyTemplateStateChange",
+    "ChangeNameStateChange": "concord.communities.state_changes.ChangeNameStateChange",
+    "AddMembersStateChange": "concord.communities.state_changes.AddMembersStateChange",
+    "RemoveMembersStateChange": "concord.communities.state_changes.RemoveMembersStateChange",
+    "ChangeGovernorsStateChange": "concord.communities.state_changes.ChangeGovernorsStateChange",
+    "ChangeOwnersStateChange": "concord.communities.state_changes.ChangeOwnersStateChange",
+    "AddRoleStateChange": "concord.communities.state_changes.AddRoleStateChange",
+    "RemoveRoleStateChange": "concord.communities.state_changes.RemoveRoleStateChange",
+    "AddPeopleToRoleStateChange": "concord.communities.state_changes.AddPeopleToRoleStateChange",
+    "RemovePeopleFromRoleStateChange": "concord.communities.state_changes.RemovePeopleFromRoleStateChange",
+    "AddConditionStateChange": "concord.conditionals.state_changes.AddConditionStateChange",
+    "EditConditionStateChange": "concord.conditionals.state_changes.EditConditionStateChange",
+    "RemoveConditionStateChange": "concord.conditionals.state_changes.RemoveConditionStateChange",
+    "AddVoteStateChange": "concord.conditionals.state_changes.AddVoteStateChange",
+    "ApproveStateChange": "concord.conditionals.state_changes.ApproveStateChange",
+    "RejectStateChange": "concord.conditionals.state_changes.RejectStateChange",
+    "RespondConsensusStateChange": "concord.conditionals.state_changes.RespondConsensusStateChange",
+    "ResolveConsensusStateChange": "concord.conditionals.state_changes.ResolveConsensusStateChange",
+    "AddPermissionStateChange": "concord.permission_resources.state_changes.AddPermissionStateChange",
+    "EditPermissionStateChange": "concord.permission_resources.state_changes.EditPermissionStateChange",
+    "RemovePermissionStateChange": "concord.permission_resources.state_changes.RemovePermissionStateChange",
+    "AddActorToPermissionStateChange": "concord.permission_resources.state_changes.AddActorToPermissionStateChange",
+    "RemoveActorFromPermissionStateChange": "concord.permission_resources.state_changes.RemoveActorFromPermissionStateChange",
+    "AddRoleToPermissionStateChange": "concord.permission_resources.state_changes.AddRoleToPermissionStateChange",
+    "RemoveRoleFromPermissionStateChange": "concord.permission_resources.state_changes.RemoveRoleFromPermissionStateChange",
+    "ChangeInverseStateChange": "concord.permission_resources.state_changes.ChangeInverseStateChange",
+    "EnableAnyoneStateChange": "concord.permission_resources.state_changes.EnableAnyoneStateChange",
+    "DisableAnyoneStateChange": "concord.permission_resources.state_changes.DisableAnyoneStateChange",
+    "EditTemplateStateChange": "concord.permission_resources.state_changes.EditTemplateStateChange",
+    "AddCommentStateChange": "concord.resources.state_changes.AddCommentStateChange",
+    "EditCommentStateChange": "concord.resources.state_changes.EditCommentStateChange",
+    "DeleteCommentStateChange": "concord.resources.state_changes.DeleteCommentStateChange",
+    "AddListStateChange": "concord.resources.state_changes.AddListStateChange",
+    "EditListStateChange": "concord.resources.state_changes.EditListStateChange",
+    "DeleteListStateChange": "concord.resources.state_changes.DeleteListStateChange",
+    "AddColumnStateChange": "concord.resources.state_changes.AddColumnStateChange",
+    "EditColumnStateChange": "concord.resources.state_changes.EditColumnStateChange",
+    "DeleteColumnStateChange": "concord.resources.state_changes.DeleteColumnStateChange",
+    "AddRowStateChange": "concord.resources.state_changes.AddRowStateChange",
+    "EditRowStateChange": "concord.resources.state_changes.EditRowStateChange",
+    "DeleteRowStateChange": "concord.resources.state_changes.DeleteRowStateChange",
+    "CreateDocumentStateChange": "concord.resources.state_changes.CreateDocumentStateChange",
+    "EditDocumentStateChange": "concord.resources.state_changes.EditDocumentStateChange",
+    "DeleteDocumentStateChange": "concord.resources.state_changes.DeleteDocumentStateChange",
+}
+
+
+def get_change_class_name(raw_change):
+    """Gets the state change class name from a raw change payload without deserializing it."""
+    return json.loads(raw_change)["class"]
+
+
+def get_resolved_through_from_logs(raw_logs):
+    for log in json.loads(raw_logs) if raw_logs else []:
+        if log.get("approved_through"):
+            return log["approved_through"]
+
+
+def populate_change_type_and_resolved_through(apps, schema_editor, batch_size=1000):
+    """Fills in change_type and resolved_through in batches, reading the raw change payloads and legacy logs and
+    looking up resolved_through in ActionLog once per batch."""
+
+    Action = apps.get_model('actions', 'Action')
+    ActionLog = apps.get_model('actions', 'ActionLog')
+
+    rows = Action.objects.annotate(raw_change=Cast("change", models.TextField())).order_by("pk") \
+        .values_list("pk", "raw_change", "logs")
+    last_pk, unknown = 0, 0
+
+    while True:
+        batch = list(rows.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+
+        resolved_through_by_action = {}
+        logged = ActionLog.objects.filter(action_id__in=[pk for pk, raw_change, logs in batch]) \
+            .exclude(approved_through__isnull=True).exclude(approved_through="") \
+            .order_by("-pk").values_list("action_id", "approved_through")
+        for action_pk, approved_through in logged:
+            resolved_through_by_action.setdefault(action_pk, approved_through)
+
+        actions = []
+        for pk, raw_change, logs in batch:
+            change_type = CHANGE_TYPES.get(get_change_class_name(raw_change)) if raw_change else None
+            if raw_change and not change_type:
+                unknown += 1
+            resolved_through = resolved_through_by_action.get(pk) or get_resolved_through_from_logs(logs)
+            actions.append(Action(pk=pk, change_type=change_type, resolved_through=resolved_through))
+        Action.objects.bulk_update(actions, ["change_type", "resolved_through"])
+
+    if unknown:
+        logger.warning(f"change_type was left empty on {unknown} actions whose change class isn't part of Concord. "
+                       "Run the fill_change_types management command to fill them in.")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('actions', '0008_actionlog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='action',
+            name='change_type',
+            field=models.CharField(blank=True, db_index=True, max_length=200, null=True),
+        ),
+        migrations.AddField(
+            model_name='action',
+            name='resolved_through',
+            field=models.CharField(blank=True, db_index=True, max_length=50, null=True),
+        ),
+        migrations.AlterField(
+            model_name='action',
+            name='status',
+            field=models.CharField(db_index=True, default='default', max_length=15),
+        ),
+        migrations.AddIndex(
+            model_name='action',
+            index=models.Index(fields=['content_type', 'object_id', 'created_at'], name='actions_act_content_4c0555_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='action',
+            index=models.Index(fields=['actor', 'created_at'], name='actions_act_actor_i_aaea6a_idx'),
+        ),
+        migrations.RunPython(populate_change_type_and_resolved_through, migrations.RunPython.noop),
+    ]
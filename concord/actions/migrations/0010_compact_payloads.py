@@ -0,0 +1,24 @@
+# Generated by Django 2.2.13 on 2026-10-16 20:35
+
+import concord.actions.customfields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('actions', '0009_action_change_type_and_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='action',
+            name='change',
+            field=concord.actions.customfields.StateChangeField(compact=True),
+        ),
+        migrations.AlterField(
+            model_name='templatemodel',
+            name='template_data',
+            field=concord.actions.customfields.TemplateField(compact=True, default=concord.actions.customfields.Template),
+        ),
+    ]
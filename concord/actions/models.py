@@ -2,7 +2,8 @@
 
 import json
 import logging
-from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
 
 from django.db import models, DatabaseError
 from django.contrib.contenttypes.fields import GenericForeignKey
@@ -11,13 +12,37 @@ from django.contrib.auth.models import User
 
 from concord.utils.lookups import get_state_changes_settable_on_model
 from concord.utils.text_utils import action_to_text
-from concord.actions.customfields import StateChangeField, Template, TemplateField
+from concord.actions.customfields import StateChangeField, Template, TemplateField, materialize_state_changes
 from concord.utils.converters import ConcordConverterMixin
 
 
 logger = logging.getLogger(__name__)
 
 
+class ActionQuerySet(models.QuerySet):
+    """QuerySet for actions. Call with_changes to deserialize the changes of the fetched actions together."""
+
+    materialize_changes = False
+
+    def with_changes(self):
+        """When the queryset is evaluated, deserializes the changes of all fetched actions at once, fetching the
+        models they reference with one query per model class rather than one per action. Useful when displaying
+        a page of actions."""
+        clone = self._chain()
+        clone.materialize_changes = True
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone.materialize_changes = self.materialize_changes
+        return clone
+
+    def _fetch_all(self):
+        super()._fetch_all()
+        if self.materialize_changes:
+            materialize_state_changes([action.change for action in self._result_cache if isinstance(action, Action)])
+
+
 class Action(ConcordConverterMixin, models.Model):
     """Represents an action between an actor and a target.
 
@@ -34,12 +59,14 @@ class Action(ConcordConverterMixin, models.Model):
     target = GenericForeignKey()
 
     # Change field
-    change = StateChangeField()
+    change = StateChangeField(compact=True)
+    change_type = models.CharField(max_length=200, blank=True, null=True, db_index=True)  # denormalized from change
 
     # Status etc
-    status = models.CharField(max_length=15, default="default")
+    status = models.CharField(max_length=15, default="default", db_index=True)
+    resolved_through = models.CharField(max_length=50, blank=True, null=True, db_index=True)  # denormalized from logs
     template_info = models.CharField(max_length=2000, blank=True, null=True)
-    logs = models.CharField(max_length=800, blank=True, null=True)
+    logs = models.CharField(max_length=800, blank=True, null=True)  # legacy, new logs are saved as ActionLogs
     note = models.CharField(max_length=200, default="")
 
     # Regular old attributes
@@ -47,6 +74,14 @@ class Action(ConcordConverterMixin, models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_draft = models.BooleanField(default=False)
 
+    objects = ActionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["content_type", "object_id", "created_at"]),
+            models.Index(fields=["actor", "created_at"])
+        ]
+
     def __str__(self):
         target = self.target if self.target else "deleted target"
         return f"Action {self.pk} '{self.change.change_description()}' by {self.actor} on {target} ({self.status})"
@@ -56,42 +91,64 @@ class Action(ConcordConverterMixin, models.Model):
         if not self.is_draft and self.status != "implemented":
             if self.target is None or self.actor is None:
                 raise DatabaseError("Must set target and actor before sending or implementing an Action")
-        return super().save(*args, **kwargs)  # Call the "real" save() method.
+        self.change_type = self.change.get_change_type() if self.change else None
+        for log in self.pending_logs:
+            if log.get("approved_through"):
+                self.resolved_through = log["approved_through"]
+        super().save(*args, **kwargs)  # Call the "real" save() method.
+        self.save_pending_logs()
 
     def get_description(self, with_actor=True, with_target=True):
         """Gets description of the action by reference to `change_types` set via change field, including the target."""
         return action_to_text(self, with_actor, with_target)
 
+    @property
+    def pending_logs(self):
+        """Logs added since the action was last saved."""
+        if "_pending_logs" not in self.__dict__:
+            self._pending_logs = []
+        return self._pending_logs
+
     def add_log(self, log):
-        logs = self.get_logs_as_deque()
-        logs.appendleft(log)
-        to_save = json.dumps(list(logs))
-        while (len(to_save) > 800):
-            logs.pop()
-            to_save = json.dumps(list(logs))
-        self.logs = to_save
-
-    def get_logs_as_deque(self):
-        if self.logs:
-            return deque(json.loads(self.logs))
-        return deque()
+        """Adds a log, which is saved as an ActionLog the next time the action is saved."""
+        self.pending_logs.append(log)
 
-    def get_logs(self):
+    def save_pending_logs(self):
+        if self.pending_logs:
+            ActionLog.objects.bulk_create([ActionLog.from_dict(self, log) for log in self.pending_logs])
+            self.pending_logs.clear()
+
+    def get_legacy_logs(self):
+        """Gets logs saved to the logs field, which was used before ActionLog existed."""
         if self.logs:
             return json.loads(self.logs)
         return []
 
+    def get_logs(self):
+        """Gets all logs, most recent first."""
+        saved_logs = [log.as_dict() for log in self.log_entries.all()] if self.pk else []
+        return [log for log in reversed(self.pending_logs)] + saved_logs + self.get_legacy_logs()
+
     def approved_through(self):
-        for log in self.get_logs():
-            if "approved_through" in log and log["approved_through"]: return log["approved_through"]
+        for log in reversed(self.pending_logs):
+            if log.get("approved_through"): return log["approved_through"]
+        if self.pk:
+            approved_through = self.log_entries.exclude(approved_through__isnull=True).exclude(approved_through="") \
+                .values_list("approved_through", flat=True).first()
+            if approved_through: return approved_through
+        for log in self.get_legacy_logs():
+            if log.get("approved_through"): return log["approved_through"]
         return "not approved"
 
     def rejection_reason(self):
-        rejection_reasons = []
         if self.status == "rejected":
-            for log in self.get_logs():
-                if log["rejection_reason"]:
-                    rejection_reasons.append(log["rejection_reason"])
+            rejection_reasons = [log["rejection_reason"] for log in reversed(self.pending_logs)
+                                 if log.get("rejection_reason")]
+            if self.pk:
+                rejection_reasons += self.log_entries.exclude(rejection_reason__isnull=True) \
+                    .exclude(rejection_reason="").values_list("rejection_reason", flat=True)
+            rejection_reasons += [log["rejection_reason"] for log in self.get_legacy_logs()
+                                  if log.get("rejection_reason")]
             return ", ".join(rejection_reasons) if rejection_reasons else None
         return "not rejected"
 
@@ -116,6 +173,54 @@ class Action(ConcordConverterMixin, models.Model):
                 return ast.literal_eval(self.template_info)  # FIXME: we shouldn't need to do this
 
 
+save_authorized = ContextVar("save_authorized", default=False)
+
+
+@contextmanager
+def authorize_save():
+    """Within this context, permissioned models may be updated. Entered by BaseStateChange.implement_action so
+    that only state changes can update permissioned models."""
+    token = save_authorized.set(True)
+    try:
+        yield
+    finally:
+        save_authorized.reset(token)
+
+
+class ActionLog(models.Model):
+    """A log of an attempt to take an action, recording how the action was approved or why it was rejected, plus
+    information from the permissions pipelines."""
+
+    action = models.ForeignKey(Action, on_delete=models.CASCADE, related_name="log_entries")
+    approved_through = models.CharField(max_length=50, blank=True, null=True, db_index=True)
+    matched_role = models.CharField(max_length=200, blank=True, null=True)
+    rejection_reason = models.CharField(max_length=500, blank=True, null=True, db_index=True)
+    info = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-pk"]
+
+    def __str__(self):
+        return f"Log for action {self.action_id} (approved through: {self.approved_through}, " + \
+               f"rejection reason: {self.rejection_reason})"
+
+    @classmethod
+    def from_dict(cls, action, log):
+        rejection_reason = log.get("rejection_reason")
+        return cls(action=action, approved_through=log.get("approved_through"), matched_role=log.get("matched_role"),
+                   rejection_reason=rejection_reason[:500] if rejection_reason else rejection_reason,
+                   info=json.dumps(log["info"]) if "info" in log else None)
+
+    def as_dict(self):
+        """Returns the log in the format used by the legacy logs field."""
+        log = {"approved_through": self.approved_through, "matched_role": self.matched_role,
+               "rejection_reason": self.rejection_reason}
+        if self.info is not None:
+            log["info"] = json.loads(self.info)
+        return log
+
+
 class PermissionedModel(ConcordConverterMixin, models.Model):
     """An abstract base class that represents permissions.
 
@@ -244,8 +349,8 @@ class PermissionedModel(ConcordConverterMixin, models.Model):
             a non-community model has null values for owner fields.
 
         2:  A permissioned model's save method can *only* be invoked by a descendant of
-            `BaseStateChange`, on update (create is fine). For now, we inspect who is calling us, but
-            there may be a better long-term solution.
+            `BaseStateChange`, on update (create is fine). `BaseStateChange.implement_action` authorizes
+            saves for the duration of the change via `authorize_save`.
         """
 
         # CHECK 1: only allow null owner for communities
@@ -262,29 +367,16 @@ class PermissionedModel(ConcordConverterMixin, models.Model):
         if override_check is True:  # or, if override_check is passed, allow normal save
             return super().save(*args, **kwargs)
 
-        # Check all others for call by StateChange's 'implement' method.
-        import inspect
-        curframe = inspect.currentframe()
-        caller = inspect.getouterframes(curframe, 5)
-        calling_function_name = caller[1].function
-        if calling_function_name == "implement":
-            del curframe, caller
+        if save_authorized.get():  # or, if we're within a state change's implementation
             return super().save(*args, **kwargs)
 
-        # Accommodate overriding save on subclasses
-        if calling_function_name == "save":
-            calling_function_name = caller[2].function
-            if calling_function_name == "implement":
-                del curframe, caller
-                return super().save(*args, **kwargs)
-
         raise BaseException("Save called incorrectly")
 
 
 class TemplateModel(PermissionedModel):
     """The template model allows users to apply sets of actions to their communities."""
 
-    template_data = TemplateField(default=Template, system=False)
+    template_data = TemplateField(default=Template, system=False, compact=True)
     scopes = models.CharField(max_length=200)
     name = models.CharField(max_length=90, unique=True)
     user_description = models.CharField(max_length=500)
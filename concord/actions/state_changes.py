@@ -8,7 +8,7 @@ from django.contrib.contenttypes.models import ContentType
 from django.conf import settings
 from django.db import transaction
 
-from concord.actions.models import TemplateModel
+from concord.actions.models import TemplateModel, authorize_save
 from concord.utils.lookups import get_all_permissioned_models, get_all_community_models
 from concord.actions.utils import MockAction, AutoDescription
 from concord.utils.converters import ConcordConverterMixin
@@ -179,8 +179,9 @@ class BaseStateChange(ConcordConverterMixin):
 
     def implement_action(self, actor, target, action=None):
         """Wrapper for implement so we can refresh from database and make sure
-        all actions touching this target happen sequentially and consistently."""
-        with transaction.atomic():
+        all actions touching this target happen sequentially and consistently. Permissioned models may only be
+        updated from within this method."""
+        with transaction.atomic(), authorize_save():
             target = target._meta.model.objects.select_related().select_for_update().get(pk=target.pk)
             return self.implement(actor, target, action=action)
 
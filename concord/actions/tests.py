@@ -1,8 +1,15 @@
+from io import StringIO
+
 from django.test import TestCase
+from django.core.management import call_command
+from django.contrib.auth.models import User
 
+from concord.actions.models import Action, ActionLog
 from concord.actions.utils import AutoDescription
 from concord.resources.state_changes import AddRowStateChange
 from concord.resources.client import CommentClient
+from concord.communities.models import Community
+from concord.utils.helpers import Client
 
 
 class AutoDesciptionTestCase(TestCase):
@@ -42,4 +49,96 @@ class LookupStateChangeMethodsTestCase(TestCase):
         self.assertTrue(client.delete_comment)
         self.assertEquals(client.delete_comment.__name__, "state_change_function")
         self.assertTrue(client.add_comment)
-        self.assertEquals(client.add_comment.__name__, "add_comment")  # exists explicitly on client
\ No newline at end of file
+        self.assertEquals(client.add_comment.__name__, "add_comment")  # exists explicitly on client
+
+
+class ActionLogTestCase(TestCase):
+
+    def setUp(self):
+        self.action = Action(change=AddRowStateChange(row_content="new stuff for row"), is_draft=True)
+
+    def test_logs_saved_with_action(self):
+        self.action.add_log({"approved_through": None, "matched_role": None, "rejection_reason": "no permission",
+                             "info": []})
+        self.action.add_log({"approved_through": "specific", "matched_role": "members", "rejection_reason": None,
+                             "info": [{"pipeline": "specific"}]})
+        self.assertEquals(self.action.approved_through(), "specific")
+        self.action.save()
+        self.assertEquals(ActionLog.objects.filter(action=self.action).count(), 2)
+
+        action = Action.objects.get(pk=self.action.pk)
+        self.assertEquals([log["approved_through"] for log in action.get_logs()], ["specific", None])
+        self.assertEquals(action.get_logs()[0]["info"], [{"pipeline": "specific"}])
+        self.assertEquals(action.approved_through(), "specific")
+        action.status = "rejected"
+        self.assertEquals(action.rejection_reason(), "no permission")
+
+    def test_legacy_logs_still_read(self):
+        self.action.logs = '[{"approved_through": "governing", "matched_role": null, "rejection_reason": null}]'
+        self.action.save()
+        self.action.add_log({"approved_through": None, "rejection_reason": "rejected by filter"})
+        self.action.save()
+        self.assertEquals([log["approved_through"] for log in self.action.get_logs()], [None, "governing"])
+        self.assertEquals(self.action.approved_through(), "governing")
+
+
+class LazyStateChangeTestCase(TestCase):
+
+    def setUp(self):
+        self.action = Action(change=AddRowStateChange(row_content="new stuff for row"), is_draft=True)
+        self.action.save()
+
+    def test_metadata_available_without_deserializing(self):
+        action = Action.objects.get(pk=self.action.pk)
+        self.assertEquals(action.change.get_change_type(), AddRowStateChange.get_change_type())
+        self.assertEquals(action.change.change_description(), AddRowStateChange.change_description())
+        self.assertFalse(action.change.is_materialized)
+
+    def test_fields_deserialized_on_access(self):
+        action = Action.objects.get(pk=self.action.pk)
+        self.assertEquals(action.change.row_content, "new stuff for row")
+        self.assertTrue(action.change.is_materialized)
+        action.change.row_content = "different stuff"
+        action.save()
+        self.assertEquals(Action.objects.get(pk=self.action.pk).change.row_content, "different stuff")
+
+    def test_saving_without_deserializing(self):
+        action = Action.objects.get(pk=self.action.pk)
+        action.status = "taken"
+        action.save()
+        self.assertFalse(action.change.is_materialized)
+        self.assertEquals(Action.objects.get(pk=self.action.pk).change.row_content, "new stuff for row")
+
+
+class PayloadFormatTestCase(TestCase):
+
+    def test_convert_payload_format(self):
+        action = Action(change=AddRowStateChange(row_content="new stuff for row"), is_draft=True)
+        action.save()
+        self.assertTrue(Action.objects.filter(pk=action.pk, change__startswith='{"v":1').exists())
+
+        call_command("convert_payload_format", format="regular", stdout=StringIO())
+        self.assertTrue(Action.objects.filter(pk=action.pk, change__startswith='{"class"').exists())
+        self.assertEquals(Action.objects.get(pk=action.pk).change.row_content, "new stuff for row")
+
+        call_command("convert_payload_format", stdout=StringIO())
+        self.assertTrue(Action.objects.filter(pk=action.pk, change__startswith='{"v":1').exists())
+        self.assertEquals(Action.objects.get(pk=action.pk).change.row_content, "new stuff for row")
+
+
+class ActionHistoryTestCase(TestCase):
+
+    def setUp(self):
+        self.users = [User.objects.create(username=name) for name in ["pinoe", "rose", "tobin"]]
+        self.community = Community.objects.create(name="USWNT")
+        for user in self.users:
+            Action.objects.create(actor=self.users[0], target=self.community, status="implemented",
+                                  change=AddRowStateChange(row_content={"player": user}))
+
+    def test_history_changes_deserialized_together(self):
+        history = Client().Action.get_action_history_given_target(target=self.community).order_by("pk")
+        with self.assertNumQueries(2):  # one for the actions, one for the users their changes reference
+            actions = list(history)
+        with self.assertNumQueries(0):
+            players = [action.change.row_content["player"] for action in actions]
+        self.assertEquals(players, self.users)
@@ -4,10 +4,11 @@ import logging
 
 from django.db.models import Model
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
 
 from concord.actions.client import BaseClient
 from concord.utils.text_utils import community_basic_info_to_text, community_governance_info_to_text
-from concord.communities.models import Community
+from concord.communities.models import Community, RoleMembership
 from concord.communities.customfields import RoleHandler
 
 
@@ -55,27 +56,19 @@ class CommunityClient(BaseClient):
         """Given a supplied user_pk, gets all communities the associated user is a part of.  If arg 'split' is
         true, separates communities the user is a leader of from those they're not a leader of."""
 
-        community_list, leader_list, member_list = [], [], []
+        memberships = RoleMembership.objects.filter(
+            community_content_type=ContentType.objects.get_for_model(self.community_model), user_pk=user_pk)
+        member_pks = set(memberships.filter(role_name="members").values_list("community_object_id", flat=True))
+        communities = self.get_communities().filter(pk__in=member_pks)
 
-        for community in self.get_communities():
+        if not split:
+            return list(communities)
 
-            if community.roles.is_member(user_pk):
-                community_list.append(community)
-
-                if split:
-
-                    is_governor, through_role = community.roles.is_governor(user_pk)
-                    is_owner, through_role = community.roles.is_owner(user_pk)
-
-                    if is_governor or is_owner:
-                        leader_list.append(community)
-                    else:
-                        member_list.append(community)
-
-        if split:
-            return leader_list, member_list
-        else:
-            return community_list
+        leader_pks = set(memberships.filter(role_name__in=["owners", "governors"])
+                         .values_list("community_object_id", flat=True))
+        leader_list = [community for community in communities if community.pk in leader_pks]
+        member_list = [community for community in communities if community.pk not in leader_pks]
+        return leader_list, member_list
 
     def get_owner(self, *, owned_object: Model) -> Community:
         """Gets the owner of the owned object, which should always be a community."""
@@ -141,11 +134,22 @@ class CommunityClient(BaseClient):
         """Returns True if actor has foundational authority, otherwise False."""
         return self.target.roles.is_owner(actor.pk)
 
-    def has_governing_authority(self, *, actor) -> bool:
-        """Returns True if actor has governing authority, otherwise False."""
-        self.target.refresh_from_db()
+    def has_governing_authority(self, *, actor, refresh_roles=True) -> bool:
+        """Returns True if actor has governing authority, otherwise False. Pass refresh_roles=False if the
+        target's roles are already known to be current, for instance within a permissions pipeline run."""
+        if refresh_roles:
+            self.refresh_roles_if_stale()
         return self.target.roles.is_governor(actor.pk)
 
+    def refresh_roles_if_stale(self):
+        """Reloads the target's roles and leadership conditions if they've changed in the database since the target
+        was loaded. Checking roles_version is a single-column lookup, much cheaper than reloading and deserializing
+        the roles."""
+        current_version = self.target.__class__.objects.filter(pk=self.target.pk) \
+            .values_list("roles_version", flat=True).first()
+        if current_version is not None and current_version != self.target.roles_version:
+            self.target.refresh_from_db(fields=["roles", "roles_version", "owner_condition", "governor_condition"])
+
     def has_role_in_community(self, *, role: str, actor_pk: int) -> bool:
         """Returns True if actor has specific role in community. otherwise False."""
         return self.target.roles.has_specific_role(role, actor_pk)
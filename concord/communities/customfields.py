@@ -18,13 +18,22 @@ class RoleHandler(ConcordConverterMixin):
 
     There are three protected names which cannot be used: owners, governors, and members.
 
-    A person cannot be added as owner, governor or custom role unless they're already a member."""
+    A person cannot be added as owner, governor or custom role unless they're already a member.
+
+    To keep checks fast on large communities, we lazily build an index from user pk to the set of roles they have
+    (including "members", and "owners" and "governors" where they're listed as actors). The write methods below
+    keep it up to date, so if you change the role data directly rather than through them, call reset_index.
+
+    The write methods also mark the handler as changed, so that the community can tell on save whether roles need
+    to be synced without serializing and comparing them. Call mark_changed if you change the role data directly."""
 
     members: List[int] = []
     owners: Dict = {}
     governors: Dict = {}
     custom_roles: Dict = {}
     protected_roles = ["owners", "governors", "members"]
+    _user_index = None
+    _changed = False
 
     def __str__(self):
         return f"RoleHandler {str(self.get_roles())}"
@@ -34,6 +43,10 @@ class RoleHandler(ConcordConverterMixin):
 
     def __init__(self, *, members=None, owners=None, governors=None, custom_roles=None):
 
+        # validation may build the index before everything is set, so start from empty roles
+        self.members, self.custom_roles = [], {}
+        self.owners, self.governors = {'actors': [], 'roles': []}, {'actors': [], 'roles': []}
+
         if members:
             self.validate_members(members=members)
         self.members = members if members else []
@@ -50,6 +63,9 @@ class RoleHandler(ConcordConverterMixin):
             self.validate_governors(governors=governors)
         self.governors = governors if governors else {'actors': [], 'roles': []}
 
+        self.reset_index()
+        self._changed = False
+
     def initialize_with_creator(self, creator):
         """To be valid, the RoleHandler must have at least one member and one owner.  The most
         common use case is that the creator of a community is the only member and only owner
@@ -59,6 +75,62 @@ class RoleHandler(ConcordConverterMixin):
         self.members.append(creator)
         self.owners['actors'].append(creator)
         self.governors['actors'].append(creator)
+        self.reset_index()
+        self.mark_changed()
+
+    #######################
+    ### Change Tracking ###
+    #######################
+
+    def mark_changed(self):
+        self._changed = True
+
+    def mark_unchanged(self):
+        """Called once the roles have been saved."""
+        self._changed = False
+
+    def has_changed(self):
+        """Returns True if the roles have been changed through the write methods since they were loaded or saved."""
+        return self._changed
+
+    #############
+    ### Index ###
+    #############
+
+    def reset_index(self):
+        """Discards the index, which will be rebuilt the next time it's needed."""
+        self._user_index = None
+
+    def get_user_index(self):
+        """Gets a dict of user pks to the set of role names each user has, building it if necessary."""
+        if self._user_index is None:
+            index = {}
+            for pk in self.members:
+                index.setdefault(pk, set()).add("members")
+            for pk in self.owners["actors"]:
+                index.setdefault(pk, set()).add("owners")
+            for pk in self.governors["actors"]:
+                index.setdefault(pk, set()).add("governors")
+            for role_name, role_actors in self.custom_roles.items():
+                for pk in role_actors:
+                    index.setdefault(pk, set()).add(role_name)
+            self._user_index = index
+        return self._user_index
+
+    def get_role_names_for_user(self, pk):
+        """Gets the set of role names the user has, not including owner/governor roles held through custom
+        roles."""
+        return self.get_user_index().get(pk, set())
+
+    def _add_to_index(self, pk, role_name):
+        if self._user_index is not None:
+            self._user_index.setdefault(pk, set()).add(role_name)
+
+    def _remove_from_index(self, pk, role_name):
+        if self._user_index is not None and pk in self._user_index:
+            self._user_index[pk].discard(role_name)
+            if not self._user_index[pk]:
+                del self._user_index[pk]
 
     ##########################
     ### Validation Methods ###
@@ -160,20 +232,18 @@ class RoleHandler(ConcordConverterMixin):
 
     def is_member(self, pk):
         """Returns True if pk passed in is member, False if not."""
-        return pk in self.members
+        return "members" in self.get_role_names_for_user(pk)
 
     def is_role(self, role_name):
         """Returns True if role_name passed in is a role on the community, False if not."""
-        return role_name in self.get_role_names()
+        return role_name in self.custom_roles or role_name in self.protected_roles
 
     def has_specific_role(self, role_name, pk):
         """Checks whether a given user, specified by pk, has a role on the community, specified by role_name."""
-        all_roles = self.get_roles()
-        if role_name not in all_roles.keys():
+        if not self.is_role(role_name):
             logger.warning(f"Role {role_name} does not exist")
-        if role_name in ["owners", "governors"]:
-            return pk in all_roles[role_name]["actors"]
-        return pk in all_roles[role_name]
+            return False
+        return role_name in self.get_role_names_for_user(pk)
 
     def has_governors(self):
         """Returns true if any governor is set on community, otherwise false."""
@@ -182,20 +252,22 @@ class RoleHandler(ConcordConverterMixin):
     def is_governor(self, pk):
         """Checks if user is an governor.  Not a pure boolean since it's helpful to know
         which (if any) role matched for permission pipeline logging."""
-        if pk in self.governors['actors']:
+        user_roles = self.get_role_names_for_user(pk)
+        if "governors" in user_roles:
             return True, None
         for role in self.governors['roles']:
-            if self.has_specific_role(role_name=role, pk=pk):
+            if role in user_roles:
                 return True, role
         return False, None
 
     def is_owner(self, pk):
         """Checks if user is an owner.  Not a pure boolean since it's helpful to know
         which (if any) role matched for permission pipeline logging."""
-        if pk in self.owners['actors']:
+        user_roles = self.get_role_names_for_user(pk)
+        if "owners" in user_roles:
             return True, None
         for role in self.owners['roles']:
-            if self.has_specific_role(role_name=role, pk=pk):
+            if role in user_roles:
                 return True, role
         return False, None
 
@@ -237,16 +309,8 @@ class RoleHandler(ConcordConverterMixin):
         """Gets all roles in the group, given a user's pk.
 
         Note that this doesn't catch when a user is owner/governor through custom roles."""
-        list_of_user_roles = []
-        all_roles = self.get_roles()
-        for role_name in all_roles:
-            if role_name in ["owners", "governors"]:
-                if pk in all_roles[role_name]["actors"]:
-                    list_of_user_roles.append(role_name)
-            else:
-                if pk in all_roles[role_name]:
-                    list_of_user_roles.append(role_name)
-        return list_of_user_roles
+        user_roles = self.get_role_names_for_user(pk)
+        return [role_name for role_name in self.get_roles() if role_name in user_roles]
 
     def get_owners(self, actors_only=False):
         """Gets all owners."""
@@ -295,6 +359,8 @@ class RoleHandler(ConcordConverterMixin):
         self.owners = role_dict["owners"]
         self.governors = role_dict["governors"]
         self.custom_roles = role_dict["custom_roles"]
+        self.reset_index()
+        self.mark_changed()
 
     # Custom roles
 
@@ -304,6 +370,7 @@ class RoleHandler(ConcordConverterMixin):
         all_roles = [role.lower() for role in self.get_roles()]
         if role_name.lower() not in all_roles:
             self.custom_roles.update({role_name: []})
+            self.mark_changed()
         else:
             logger.warning(f"Role {role_name} already exists")
 
@@ -315,7 +382,9 @@ class RoleHandler(ConcordConverterMixin):
         if role_name.lower() not in all_roles:
             logger.warning(f"No role {role_name} found; therefore it cannot be removed.")
         else:
-            del self.custom_roles[role_name]
+            for pk in self.custom_roles.pop(role_name):
+                self._remove_from_index(pk, role_name)
+            self.mark_changed()
 
     def add_people_to_role(self, role_name, people_to_add):
         """Add people to custom role.  Protected roles are handled separately."""
@@ -323,6 +392,9 @@ class RoleHandler(ConcordConverterMixin):
         if role_name in all_roles:
             merged_people = set(all_roles[role_name]) | set(people_to_add)
             self.custom_roles[role_name] = list(merged_people)
+            for pk in people_to_add:
+                self._add_to_index(pk, role_name)
+            self.mark_changed()
         else:
             logger.warning(f"Role {role_name} not in roles")
 
@@ -332,6 +404,9 @@ class RoleHandler(ConcordConverterMixin):
         if role_name in all_roles:
             remaining_people = set(all_roles[role_name]) - set(people_to_remove)
             self.custom_roles[role_name] = list(remaining_people)
+            for pk in people_to_remove:
+                self._remove_from_index(pk, role_name)
+            self.mark_changed()
         else:
             logger.warning(f"Role {role_name} not in roles")
 
@@ -339,8 +414,10 @@ class RoleHandler(ConcordConverterMixin):
 
     def add_member(self, pk):
         """Adds a member given member pk."""
-        if pk not in self.members:
+        if not self.is_member(pk):
             self.members.append(pk)
+            self._add_to_index(pk, "members")
+            self.mark_changed()
         else:
             logger.info(f"User {pk} is already a member.")
 
@@ -351,8 +428,10 @@ class RoleHandler(ConcordConverterMixin):
 
     def remove_member(self, pk):
         """Remove member given pk."""
-        if pk in self.members:
+        if self.is_member(pk):
             self.members.remove(pk)
+            self._remove_from_index(pk, "members")
+            self.mark_changed()
         else:
             logger.warning(f"User {pk} is not a member and cannot be removed.")
 
@@ -368,11 +447,15 @@ class RoleHandler(ConcordConverterMixin):
             self.governors['actors'] = pks
         if roles:
             self.governors['roles'] = roles
+        self.reset_index()
+        self.mark_changed()
 
     def add_governor(self, pk):
         """Add governor given pk."""
         if pk not in self.governors['actors']:
             self.governors['actors'].append(pk)
+            self._add_to_index(pk, "governors")
+            self.mark_changed()
         else:
             logger.warning(f"User {pk} is already a governor.")
 
@@ -380,6 +463,7 @@ class RoleHandler(ConcordConverterMixin):
         """Add role as governor role given role_name."""
         if role_name not in self.governors['roles']:
             self.governors['roles'].append(role_name)
+            self.mark_changed()
         else:
             logger.warning(f"Role {role_name} already in governor roles")
 
@@ -387,6 +471,8 @@ class RoleHandler(ConcordConverterMixin):
         """Remove governor given pk."""
         if pk in self.governors['actors']:
             self.governors['actors'].remove(pk)
+            self._remove_from_index(pk, "governors")
+            self.mark_changed()
         else:
             logger.warning(f"User {pk} is not a governor and can't be removed from governor role.")
 
@@ -394,6 +480,7 @@ class RoleHandler(ConcordConverterMixin):
         """Remove role as governor role given role_name."""
         if role_name in self.governors['roles']:
             self.governors['roles'].remove(role_name)
+            self.mark_changed()
         else:
             logger.warning(f"Role {role_name} not in governor roles")
 
@@ -403,6 +490,8 @@ class RoleHandler(ConcordConverterMixin):
             raise TypeError("Must supply pk when adding owner.")
         if pk not in self.owners['actors']:
             self.owners['actors'].append(pk)
+            self._add_to_index(pk, "owners")
+            self.mark_changed()
         else:
             logger.warning(f"User {pk} is already an owner.")
 
@@ -412,6 +501,7 @@ class RoleHandler(ConcordConverterMixin):
             raise TypeError("Must supply role_name when adding owner role.")
         if role_name not in self.owners['roles']:
             self.owners['roles'].append(role_name)
+            self.mark_changed()
         else:
             logger.warning(f"Role {role_name} already in owner roles")
 
@@ -421,6 +511,8 @@ class RoleHandler(ConcordConverterMixin):
             raise TypeError("Owner pk must be int, not type ", type(pk))
         if pk in self.owners['actors']:
             self.owners['actors'].remove(pk)
+            self._remove_from_index(pk, "owners")
+            self.mark_changed()
         else:
             logger.warning(f"User {pk} is not an owner and can't be removed from owner role.")
 
@@ -430,6 +522,7 @@ class RoleHandler(ConcordConverterMixin):
             raise TypeError("Owner role must be string, not type ", type(role_name))
         if role_name in self.owners['roles']:
             self.owners['roles'].remove(role_name)
+            self.mark_changed()
         else:
             logger.warning(f"Role {role_name} not in roles")
 
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from concord.communities.models import RoleMembership
+from concord.utils.lookups import get_all_community_models
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the role membership table from the roles saved on each community.'
+
+    def handle(self, *args, **options):
+
+        community_models = get_all_community_models()
+        RoleMembership.objects.rebuild(community_models)
+        self.stdout.write(f"Rebuilt role memberships for {', '.join(m.__name__ for m in community_models)}")
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.13 on 2026-10-16 20:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communities', '0006b_auto_20201009_1605'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='community',
+            name='roles_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='defaultcommunity',
+            name='roles_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
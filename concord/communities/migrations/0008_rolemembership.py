@@ -0,0 +1,58 @@
+# Generated by Django 2.2.13 on 2026-10-16 20:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_role_memberships(apps, schema_editor):
+    """Builds membership rows from the roles of each existing community. Community models defined by apps using
+    Concord aren't covered here, so those apps should run the rebuild_role_memberships command after migrating."""
+
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    RoleMembership = apps.get_model('communities', 'RoleMembership')
+
+    for model_name in ['Community', 'DefaultCommunity']:
+        model = apps.get_model('communities', model_name)
+        content_type, created = ContentType.objects.get_or_create(
+            app_label='communities', model=model._meta.model_name)
+
+        for community in model.objects.iterator():
+            roles = community.roles
+            memberships = set((pk, role_name) for pk, role_names in roles.get_user_index().items()
+                              for role_name in role_names if role_name not in ['owners', 'governors'])
+            memberships.update((pk, 'owners') for pk in roles.get_owner_pks())
+            memberships.update((pk, 'governors') for pk in roles.get_governor_pks())
+            RoleMembership.objects.bulk_create([
+                RoleMembership(community_content_type=content_type, community_object_id=community.pk,
+                               user_pk=user_pk, role_name=role_name)
+                for user_pk, role_name in memberships])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('communities', '0007_roles_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoleMembership',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('community_object_id', models.PositiveIntegerField()),
+                ('user_pk', models.PositiveIntegerField()),
+                ('role_name', models.CharField(max_length=200)),
+                ('community_content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.ContentType')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='rolemembership',
+            index=models.Index(fields=['user_pk', 'role_name'], name='communities_user_pk_68e0fb_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='rolemembership',
+            unique_together={('community_content_type', 'community_object_id', 'user_pk', 'role_name')},
+        ),
+        migrations.RunPython(populate_role_memberships, migrations.RunPython.noop),
+    ]
@@ -1,24 +1,33 @@
 """Models for Community package."""
 
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_save, post_delete
 
 from concord.actions.models import PermissionedModel
 from concord.communities.customfields import RoleHandler, RoleField
+from concord.utils.permission_cache import invalidate_permission_cache
+from concord.utils.versioning import VersionedStateMixin
 
 
 ################################
 ### Community Resource/Items ###
 ################################
 
-class BaseCommunityModel(PermissionedModel):
+class BaseCommunityModel(VersionedStateMixin, PermissionedModel):
     """The base community model is the abstract type for all communities.  Much of its
-    logic is contained in customfields.RoleField and customfields.RoleHandler."""
+    logic is contained in customfields.RoleField and customfields.RoleHandler.
+
+    roles_version is bumped whenever the roles or leadership conditions change, so that other copies of the
+    community can cheaply detect that they're stale."""
     is_community = True
+    version_field = "roles_version"
 
     name = models.CharField(max_length=200)
     roles = RoleField(default=RoleHandler)
+    roles_version = models.PositiveIntegerField(default=0)
 
     owner_condition = models.ForeignKey('conditionals.ConditionManager', on_delete=models.SET_NULL, null=True,
                                         blank=True, related_name="%(app_label)s_%(class)s_owner_conditioned")
@@ -35,6 +44,41 @@ class BaseCommunityModel(PermissionedModel):
         return f"CommunityModel(pk={self.pk}, name={self.name}, roles={self.roles}, " + \
                f"owner_condition={self.has_condition('owner')}, governor_condition={self.has_condition('governor')}"
 
+    def get_leadership_condition_ids(self):
+        return (self.owner_condition_id, self.governor_condition_id)
+
+    def snapshot_state(self, fields=None):
+        """Records which RoleHandler and leadership conditions were loaded from the database, so save can tell
+        whether they've changed. The RoleHandler tracks changes made through its own write methods."""
+        if fields is None or "roles" in fields:
+            self._loaded_roles = self.__dict__.get("roles")
+        if fields is None or "owner_condition" in fields or "governor_condition" in fields:
+            self._loaded_condition_ids = self.get_leadership_condition_ids()
+
+    def roles_have_changed(self):
+        """Returns True if the roles were replaced or changed since they were loaded or saved. Returns False if
+        roles were deferred and never accessed."""
+        roles = self.__dict__.get("roles")
+        if roles is None:
+            return False
+        return roles is not getattr(self, "_loaded_roles", None) or roles.has_changed()
+
+    def state_has_changed(self):
+        conditions_changed = self.get_leadership_condition_ids() != getattr(self, "_loaded_condition_ids", None)
+        return self.roles_have_changed() or conditions_changed
+
+    def save(self, *args, **kwargs):
+        """Keeps RoleMembership in sync with the roles, if they've been set or changed. The community and its
+        membership rows are saved in one transaction, so they can't disagree if the sync fails."""
+        adding = self._state.adding
+        roles_changed = self.roles_have_changed()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding or roles_changed:
+                RoleMembership.objects.sync_community(self)
+        if "roles" in self.__dict__:
+            self.roles.mark_unchanged()
+
     def get_name(self):
         """Get name of community."""
         return self.__str__()
@@ -83,6 +127,70 @@ class DefaultCommunity(BaseCommunityModel):
     user_owner = models.OneToOneField(User, on_delete=models.CASCADE, related_name="default_community")
 
 
+class RoleMembershipManager(models.Manager):
+
+    def for_community(self, community):
+        content_type = ContentType.objects.get_for_model(community)
+        return self.filter(community_content_type=content_type, community_object_id=community.pk)
+
+    def sync_community(self, community):
+        """Brings the rows for the community in line with its roles, adding and deleting only what's changed."""
+
+        roles = community.roles
+        expected = set((pk, role_name) for pk, role_names in roles.get_user_index().items()
+                       for role_name in role_names if role_name not in ["owners", "governors"])
+        expected.update((pk, "owners") for pk in roles.get_owner_pks())
+        expected.update((pk, "governors") for pk in roles.get_governor_pks())
+
+        existing = {(user_pk, role_name): pk for pk, user_pk, role_name
+                    in self.for_community(community).values_list("pk", "user_pk", "role_name")}
+
+        to_delete = [pk for key, pk in existing.items() if key not in expected]
+        if to_delete:
+            self.filter(pk__in=to_delete).delete()
+
+        content_type = ContentType.objects.get_for_model(community)
+        self.bulk_create([
+            RoleMembership(community_content_type=content_type, community_object_id=community.pk,
+                           user_pk=user_pk, role_name=role_name)
+            for user_pk, role_name in expected if (user_pk, role_name) not in existing])
+
+    def rebuild(self, community_models):
+        """Rebuilds the table for all communities of the given models from their roles. Each community is synced
+        in its own transaction, so its rows are never missing or half-written, and rows left behind by communities
+        which no longer exist are deleted at the end."""
+        for model in community_models:
+            for community in model.objects.iterator():
+                with transaction.atomic():
+                    self.sync_community(community)
+            content_type = ContentType.objects.get_for_model(model)
+            self.filter(community_content_type=content_type) \
+                .exclude(community_object_id__in=model.objects.values("pk")).delete()
+
+
+class RoleMembership(models.Model):
+    """Denormalized copy of community roles, with one row per community, user and role, so that membership can be
+    looked up with an indexed query instead of deserializing every community's roles. The roles on the community
+    are the source of truth; rows are synced whenever a community's roles are saved.
+
+    Rows for "owners" and "governors" include users who are owners or governors through a role."""
+
+    community_content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    community_object_id = models.PositiveIntegerField()
+    community = GenericForeignKey("community_content_type", "community_object_id")
+    user_pk = models.PositiveIntegerField()
+    role_name = models.CharField(max_length=200)
+
+    objects = RoleMembershipManager()
+
+    class Meta:
+        unique_together = ["community_content_type", "community_object_id", "user_pk", "role_name"]
+        indexes = [models.Index(fields=["user_pk", "role_name"])]
+
+    def __str__(self):
+        return f"User {self.user_pk} has role {self.role_name} in community {self.community_object_id}"
+
+
 def create_default_community(sender, instance, created, **kwargs):
     """Creates default community for a user when a new user is created."""
     if created:
@@ -93,3 +201,21 @@ def create_default_community(sender, instance, created, **kwargs):
 
 
 post_save.connect(create_default_community, sender=User)
+
+
+def invalidate_cached_permissions_for_community(sender, instance, **kwargs):
+    """Invalidates cached permission decisions when a community, including its roles, changes. Connected without
+    a sender so it also covers community models defined by apps using Concord."""
+    if getattr(instance, "is_community", False):
+        invalidate_permission_cache(sender, instance, **kwargs)
+
+
+def delete_role_memberships(sender, instance, **kwargs):
+    """Deletes the membership rows for a community when it's deleted."""
+    if getattr(instance, "is_community", False):
+        RoleMembership.objects.for_community(instance).delete()
+
+
+post_save.connect(invalidate_cached_permissions_for_community)
+post_delete.connect(invalidate_cached_permissions_for_community)
+post_delete.connect(delete_role_memberships)
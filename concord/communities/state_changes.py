@@ -242,25 +242,12 @@ class RemoveRoleStateChange(BaseStateChange):
 
     role_name = field_utils.RoleField(label="Role to remove from community", required=True)
 
-    def role_in_permissions(self, permission, actor):
-        """Checks for role in permission and returns True if it exists.  Checks in permissions
-        which are nested on this permission as well."""
-        role_references = []
-        if permission.has_role(role=self.role_name):
-            role_references.append(permission)
-        client = Client(actor=actor, target=permission)
-        for permission in client.PermissionResource.get_all_permissions():
-            role_references += self.role_in_permissions(permission, actor)
-        return role_references
-
     def validate(self, actor, target):
         """A role cannot be deleted without removing it from the permissions it's referenced in, and
         without removing it from owner and governor roles if it is there."""
 
-        role_references = []
         client = Client(actor=actor, target=target)
-        for permission in client.PermissionResource.get_all_permissions():
-            role_references += self.role_in_permissions(permission, actor)
+        role_references = client.PermissionResource.get_permissions_for_role(role_name=self.role_name, community=target)
 
         if len(role_references) > 0:
             permission_string = ", ".join([str(permission.pk) for permission in role_references])
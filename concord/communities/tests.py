@@ -0,0 +1,49 @@
+from django.test import TestCase
+
+from concord.communities.customfields import RoleHandler
+
+
+class RoleHandlerTestCase(TestCase):
+
+    def setUp(self):
+        self.roles = RoleHandler()
+        self.roles.initialize_with_creator(creator=1)
+        self.roles.add_members([2, 3, 4])
+        self.roles.add_role("forwards")
+        self.roles.add_people_to_role("forwards", [2, 3])
+
+    def test_checks_use_current_roles(self):
+        self.assertTrue(self.roles.is_member(2))
+        self.assertFalse(self.roles.is_member(5))
+        self.assertTrue(self.roles.has_specific_role("forwards", 2))
+        self.assertFalse(self.roles.has_specific_role("forwards", 4))
+        self.assertEquals(self.roles.is_owner(1), (True, None))
+        self.assertEquals(self.roles.is_governor(2), (False, None))
+
+    def test_index_kept_in_sync_by_write_methods(self):
+        self.roles.add_governor_role("forwards")
+        self.assertEquals(self.roles.is_governor(3), (True, "forwards"))
+        self.roles.remove_people_from_role("forwards", [3])
+        self.assertEquals(self.roles.is_governor(3), (False, None))
+        self.roles.add_owner(4)
+        self.assertEquals(self.roles.get_roles_given_user(4), ["owners", "members"])
+        self.roles.remove_member(4)
+        self.assertFalse(self.roles.is_member(4))
+        self.roles.remove_role("forwards")
+        self.assertFalse(self.roles.has_specific_role("forwards", 2))
+
+    def test_serialization_unchanged(self):
+        serialized = self.roles.serialize()
+        self.assertEquals(set(serialized.keys()),
+                          {"class", "concord_dict", "members", "owners", "governors", "custom_roles"})
+        roles = RoleHandler.deserialize(serialized)
+        self.assertEquals(roles.get_roles_given_user(2), ["forwards", "members"])
+
+    def test_write_methods_mark_roles_changed(self):
+        roles = RoleHandler.deserialize(self.roles.serialize())
+        self.assertFalse(roles.has_changed())
+        roles.add_people_to_role("forwards", [4])
+        self.assertTrue(roles.has_changed())
+        roles.mark_unchanged()
+        roles.remove_member(4)
+        self.assertTrue(roles.has_changed())
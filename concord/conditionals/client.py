@@ -1,19 +1,50 @@
 """Clients for conditionals."""
 
-from typing import Dict
+from typing import Dict, List, Tuple
 import logging
 
+from django.db import transaction
 from django.db.models import Model
 
 from concord.actions.client import BaseClient
 from concord.utils.helpers import Client
 from concord.utils.lookups import get_all_conditions, get_acceptance_conditions
+from concord.utils.pipelines import action_pipeline, has_permission_batch
 from concord.conditionals import utils
+from concord.conditionals import state_changes as sc
+from concord.conditionals.models import defer_retries
 
 
 logger = logging.getLogger(__name__)
 
 
+def take_actions_in_bulk(target, actors_and_changes):
+    """Creates and takes an action for each (actor, change) pair passed in, all on the target condition and within a
+    single transaction. Permissions are checked for the whole batch at once, and the action the condition was
+    created for is retried once at the end rather than after each change. Returns a list of (action, result)
+    tuples, in the order passed in."""
+
+    actor_pks = [actor.pk for actor, change in actors_and_changes]
+    if len(actor_pks) != len(set(actor_pks)):
+        raise ValueError("Each actor may only appear once in a batch")
+
+    with defer_retries(), transaction.atomic():
+
+        actions = [BaseClient(actor=actor, target=target).create_action(change)
+                   for actor, change in actors_and_changes]
+        valid_actions = [action for action in actions if action.status != "invalid"]
+        for action in valid_actions:
+            action.status = "taken"
+
+        results = {}
+        if valid_actions:
+            for action, matches in zip(valid_actions, has_permission_batch(valid_actions)):
+                results[action.pk] = action_pipeline(action, matches=matches)
+
+    target.refresh_from_db()
+    return [(action, results.get(action.pk) if action.status != "invalid" else None) for action in actions]
+
+
 class ApprovalConditionClient(BaseClient):
     """The target of the ApprovalConditionClient must always be an ApprovalCondition instance."""
     app_name = "conditionals"
@@ -37,6 +68,13 @@ class VoteConditionClient(BaseClient):
         """Gets current results of vote condition."""
         return self.target.current_results()
 
+    # State changes
+
+    def vote_in_bulk(self, *, votes: List[Tuple]) -> List[Tuple]:
+        """Takes a list of (actor, vote) tuples and adds the votes to the target in one transaction, creating an
+        action for each voter. See take_actions_in_bulk."""
+        return take_actions_in_bulk(self.target, [(actor, sc.AddVoteStateChange(vote=vote)) for actor, vote in votes])
+
 
 class ConsensusConditionClient(BaseClient):
     """The target of the ConsensusConditionClient must always be a ConsensusCondition instance."""
@@ -56,6 +94,14 @@ class ConsensusConditionClient(BaseClient):
         """Gets current results of vote condition."""
         return self.target.get_responses()
 
+    # State changes
+
+    def respond_in_bulk(self, *, responses: List[Tuple]) -> List[Tuple]:
+        """Takes a list of (actor, response) tuples and adds the responses to the target in one transaction,
+        creating an action for each participant. See take_actions_in_bulk."""
+        return take_actions_in_bulk(
+            self.target, [(actor, sc.RespondConsensusStateChange(response=response)) for actor, response in responses])
+
 
 class ConditionalClient(BaseClient):
     """ConditionalClient is largely used as an easy way to access all the specific conditionclients at once, but
@@ -100,14 +146,18 @@ class ConditionalClient(BaseClient):
         if leadership_type == "owner": return source.owner_condition
         if leadership_type == "governor": return source.governor_condition
 
-    def check_condition_status(self, *, action, manager):
+    def check_condition_status(self, *, action, manager, prefetched=None):
         if action.__class__.__name__ == "MockAction":
             return "waiting"
-        return utils.condition_status(manager=manager, action=action)
+        return utils.condition_status(manager=manager, action=action, prefetched=prefetched)
 
-    def create_conditions_for_action(self, action, condition_managers):
+    def create_conditions_for_action(self, action, condition_managers, prefetched=None):
+        """Creates any conditions not yet created for the action. Existing instances for all the managers are
+        fetched together, unless already loaded into prefetched."""
+        prefetched = prefetched if prefetched else utils.PrefetchedConditions()
+        prefetched.load([(action, manager) for manager in condition_managers])
         for manager in condition_managers:
-            utils.create_conditions(manager=manager, action=action)
+            utils.create_conditions(manager=manager, action=action, prefetched=prefetched)
 
     def get_condition_items_given_action_and_source(self, *, action, source, leadership_type=None) -> Model:
         """Given the action which triggered a condition, the source and the leadership type, get the item.
@@ -12,6 +12,11 @@ class Filter(object):
         for key, value in kwargs.items():
             setattr(self, key, value)
 
+    def prepare(self):
+        """Called once when the filter is compiled for a condition manager (see get_compiled_filters in
+        conditionals/utils.py), so filters can process their configuration up front rather than on every check."""
+        return self
+
     def condition_status(self, action):
         result, message = self.check(action=action)
         if not result:
@@ -215,12 +220,18 @@ class LimitedFieldsFilter(Filter):
 
     limited_fields = field_utils.ListField(label="Limit fields to", required=True)
 
+    def prepare(self):
+        self.parsed_limited_fields = set(json.loads(self.limited_fields))
+        return self
+
     def check(self, *, action, **kwargs):
         failure_msg = f"fields were limited to {self.limited_fields}"
         if not action.change.fields_to_include:
             # We're limited our fields, but if 'fields_to_include' is not set that means "get everything"
             return False, failure_msg
-        limited_fields = json.loads(self.limited_fields)
+        limited_fields = getattr(self, "parsed_limited_fields", None)
+        if limited_fields is None:
+            limited_fields = json.loads(self.limited_fields)
         for field in action.change.fields_to_include:
             if field not in limited_fields:
                 return False, failure_msg
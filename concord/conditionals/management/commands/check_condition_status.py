@@ -8,17 +8,54 @@ from concord.utils.lookups import get_all_conditions
 retry_action_signal = django.dispatch.Signal(providing_args=["instance"])
 
 
+def get_timed_conditions():
+    """Gets condition classes whose status may change once their deadline passes."""
+    return [condition_class for condition_class in get_all_conditions()
+            if getattr(condition_class, "has_timeout", False)
+            and not getattr(condition_class, "resolved_manually", False)]
+
+
+def retry_conditions(condition_class, instances):
+    """Retries the actions associated with the given conditions. Conditions which are no longer waiting afterwards
+    are marked resolved so they aren't checked again. Returns the pks of the resolved conditions."""
+    resolved_pks = []
+    for instance in instances:
+        retry_action_signal.send(sender=condition_class, instance=instance, created=False)
+        if instance.condition_status() != "waiting":
+            resolved_pks.append(instance.pk)
+    # update() rather than save() so we don't send post_save and retry the action a second time
+    condition_class.objects.filter(pk__in=resolved_pks).update(resolved=True)
+    return resolved_pks
+
+
 class Command(BaseCommand):
     help = 'Checks conditions to see if their status has changed and, if it has, re-runs associated actions.'
 
-    def handle(self, *args, **options):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of due conditions to load at a time',
+        )
 
-        for condition_class in get_all_conditions():
+    def check_due_conditions(self, condition_class, now, batch_size):
+        """Retries the actions of unresolved conditions whose deadline has passed, batching by pk."""
 
-            for instance in condition_class.objects.all():
+        checked, last_pk = 0, 0
+        due_conditions = condition_class.get_due_conditions(now=now).order_by("pk")
 
-                if instance.has_timeout:
+        while True:
+            batch = list(due_conditions.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                return checked
+            retry_conditions(condition_class, batch)
+            checked += len(batch)
+            last_pk = batch[-1].pk
+
+    def handle(self, *args, **options):
 
-                    if timezone.now() > instance.get_timeout():
+        now = timezone.now()
 
-                        retry_action_signal.send(sender=condition_class, instance=instance, created=False)
+        for condition_class in get_timed_conditions():
+            self.check_due_conditions(condition_class, now, options['batch_size'])
@@ -0,0 +1,40 @@
+"""Management command which runs a worker for the condition retry queue. See conditionals/retry_queue.py."""
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Runs continuously, retrying actions queued by the condition retry queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5.0,
+            help='Maximum number of seconds between checks for queued retries',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Retry actions which are currently due and exit',
+        )
+
+    def handle(self, *args, **options):
+
+        from concord.conditionals.retry_queue import retry_queue
+
+        if not retry_queue.enabled:
+            raise CommandError("The retry queue is not enabled. Set CONDITION_RETRY_QUEUE in settings.")
+
+        if options['once']:
+            retried = 0
+            while True:
+                batch_retried = retry_queue.process_due()
+                if not batch_retried:
+                    break
+                retried += batch_retried
+            self.stdout.write(f"Retried {retried} actions")
+            return
+
+        self.stdout.write("Processing retry queue")
+        retry_queue.run_worker(poll_interval=options['poll_interval'])
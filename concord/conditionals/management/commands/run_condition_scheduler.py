@@ -0,0 +1,145 @@
+"""Management command which runs continuously, retrying actions as soon as their conditions time out.
+
+Unresolved deadlines are kept in a heap, and the scheduler sleeps until the earliest one (or until the next poll,
+whichever comes first). The heap is seeded at startup from unresolved conditions with deadlines, and new conditions
+are picked up by polling for pks above the highest pk that existed at startup or has been seen since. Pks aren't
+guaranteed to commit in order, so a condition whose transaction commits after a higher pk has been seen would be
+missed by that poll; to catch those, the heap is rebuilt from all unresolved conditions with deadlines every
+--reseed-every polls. If a deadline is pushed back after being loaded, the condition is re-queued when its old
+deadline comes up. Deadlines brought forward are only noticed when the old deadline is reached or the heap is next
+rebuilt, so running check_condition_status occasionally is still a useful backstop.
+
+If retrying the conditions of a class fails, the error is logged and those conditions are put back on the heap to
+be retried after the next poll."""
+
+import datetime
+import heapq
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.db.models import Max
+from django.utils import timezone
+
+from concord.conditionals.management.commands.check_condition_status import retry_conditions, get_timed_conditions
+
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Runs continuously, retrying actions as soon as the conditions set on them time out.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5.0,
+            help='Maximum number of seconds between checks for new conditions',
+        )
+        parser.add_argument(
+            '--reseed-every',
+            type=int,
+            default=60,
+            help='Number of polls after which to rebuild the list of deadlines from the database',
+        )
+
+    def setup(self, poll_interval=5.0, reseed_every=60):
+        self.condition_classes = {cls.__name__: cls for cls in get_timed_conditions()}
+        self.high_water_marks = {name: 0 for name in self.condition_classes}
+        self.deadlines = []
+        self.poll_interval = poll_interval
+        self.reseed_every = reseed_every
+        self.polls = 0
+
+    def load_pending_conditions(self):
+        """Seeds the heap with unresolved conditions that have a deadline, replacing anything already on it, and
+        sets each high-water mark to the current highest pk so later polls only look at new conditions. Returns the
+        number added. The heap is only replaced once everything has loaded, so nothing is lost if loading fails."""
+        deadlines, high_water_marks = [], {}
+        for name, condition_class in self.condition_classes.items():
+            high_water_marks[name] = condition_class.objects.aggregate(max_pk=Max("pk"))["max_pk"] or 0
+            pending = condition_class.objects.filter(
+                resolved=False, deadline__isnull=False, pk__lte=high_water_marks[name])
+            deadlines += [(deadline, name, pk) for pk, deadline in pending.values_list("pk", "deadline")]
+        heapq.heapify(deadlines)
+        self.deadlines, self.high_water_marks = deadlines, high_water_marks
+        return len(deadlines)
+
+    def load_new_conditions(self):
+        """Adds unresolved conditions created since the last poll to the heap. Returns the number added."""
+        added = 0
+        for name, condition_class in self.condition_classes.items():
+            new_conditions = condition_class.objects.filter(pk__gt=self.high_water_marks[name]) \
+                .order_by("pk").values_list("pk", "deadline", "resolved")
+            for pk, deadline, resolved in new_conditions:
+                self.high_water_marks[name] = pk
+                if deadline and not resolved:
+                    heapq.heappush(self.deadlines, (deadline, name, pk))
+                    added += 1
+        return added
+
+    def poll(self):
+        """Loads new conditions, rebuilding the heap instead every reseed_every polls. Returns the number added."""
+        self.polls += 1
+        if self.reseed_every and self.polls % self.reseed_every == 0:
+            return self.load_pending_conditions()
+        return self.load_new_conditions()
+
+    def pop_due_conditions(self, now):
+        """Removes entries whose deadline has passed from the heap, grouped by condition class."""
+        due = {}
+        while self.deadlines and self.deadlines[0][0] <= now:
+            deadline, name, pk = heapq.heappop(self.deadlines)
+            due.setdefault(name, []).append(pk)
+        return due
+
+    def fire_due_conditions(self, now=None):
+        """Retries the actions of conditions whose deadline has passed. If retrying a class of conditions fails,
+        its conditions are put back on the heap to be tried again after the poll interval. Returns the number of
+        conditions retried."""
+        now = now or timezone.now()
+        retried = 0
+        for name, pks in self.pop_due_conditions(now).items():
+            condition_class = self.condition_classes[name]
+            try:
+                instances = list(condition_class.objects.filter(pk__in=pks, resolved=False))
+                due_instances = []
+                for instance in instances:
+                    if instance.deadline and instance.deadline > now:
+                        heapq.heappush(self.deadlines, (instance.deadline, name, instance.pk))  # deadline was moved
+                    else:
+                        due_instances.append(instance)
+                retry_conditions(condition_class, due_instances)
+                retried += len(due_instances)
+            except Exception:
+                logger.exception(f"Error retrying {name} conditions {pks}")
+                close_old_connections()
+                retry_at = now + datetime.timedelta(seconds=self.poll_interval)
+                for pk in pks:
+                    heapq.heappush(self.deadlines, (retry_at, name, pk))
+        return retried
+
+    def seconds_until_next_run(self, poll_interval, now=None):
+        if not self.deadlines:
+            return poll_interval
+        seconds_until_deadline = (self.deadlines[0][0] - (now or timezone.now())).total_seconds()
+        return max(0, min(seconds_until_deadline, poll_interval))
+
+    def handle(self, *args, **options):
+
+        self.setup(poll_interval=options['poll_interval'], reseed_every=options['reseed_every'])
+        self.load_pending_conditions()
+        self.stdout.write(f"Scheduler started with {len(self.deadlines)} pending deadlines")
+
+        while True:
+            try:
+                retried = self.fire_due_conditions()
+                if retried:
+                    self.stdout.write(f"Retried actions for {retried} conditions")
+                self.poll()
+            except Exception:
+                logger.exception("Error running condition scheduler")
+            finally:
+                close_old_connections()
+            time.sleep(self.seconds_until_next_run(self.poll_interval))
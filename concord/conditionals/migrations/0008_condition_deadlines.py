@@ -0,0 +1,50 @@
+# Generated by Django 2.2.13 on 2026-10-16 20:37
+
+import datetime
+
+from django.db import migrations, models
+
+
+def populate_deadlines(apps, schema_editor):
+
+    VoteCondition = apps.get_model('conditionals', 'VoteCondition')
+    ConsensusCondition = apps.get_model('conditionals', 'ConsensusCondition')
+
+    for condition in VoteCondition.objects.all().iterator():
+        deadline = condition.voting_starts + datetime.timedelta(hours=condition.voting_period)
+        VoteCondition.objects.filter(pk=condition.pk).update(deadline=deadline)
+
+    for condition in ConsensusCondition.objects.all().iterator():
+        deadline = condition.discussion_starts + datetime.timedelta(hours=condition.minimum_duration)
+        ConsensusCondition.objects.filter(pk=condition.pk).update(deadline=deadline)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conditionals', '0007_auto_20201009_1809'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consensuscondition',
+            name='deadline',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='votecondition',
+            name='deadline',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='votecondition',
+            name='resolved',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AlterField(
+            model_name='consensuscondition',
+            name='resolved',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.RunPython(populate_deadlines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 2.2.13 on 2026-10-16 20:41
+
+import json
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_vote_records(apps, schema_editor):
+
+    VoteCondition = apps.get_model('conditionals', 'VoteCondition')
+    VoteRecord = apps.get_model('conditionals', 'VoteRecord')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+
+    for condition in VoteCondition.objects.exclude(voted="[]").iterator():
+        usernames = json.loads(condition.voted)
+        users = User.objects.filter(username__in=usernames).in_bulk(field_name="username")
+        VoteRecord.objects.bulk_create([VoteRecord(condition=condition, user=users[username])
+                                        for username in dict.fromkeys(usernames) if username in users])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('conditionals', '0008_condition_deadlines'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoteRecord',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vote', models.CharField(blank=True, max_length=10, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('condition', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vote_records', to='conditionals.VoteCondition')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vote_records', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('condition', 'user')},
+            },
+        ),
+        migrations.RunPython(populate_vote_records, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='votecondition',
+            name='voted',
+        ),
+    ]
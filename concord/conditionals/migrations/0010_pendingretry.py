@@ -0,0 +1,22 @@
+# Generated by Django 2.2.13 on 2026-10-16 20:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conditionals', '0009_vote_records'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingRetry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action_pk', models.IntegerField(unique=True)),
+                ('run_after', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
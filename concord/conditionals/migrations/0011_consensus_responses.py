@@ -0,0 +1,77 @@
+# Generated by Django 2.2.13 on 2026-10-16 20:45
+
+import json
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+TALLIES = {"support": "supports", "support with reservations": "supports_with_reservations",
+           "stand aside": "stand_asides", "block": "blocks", "no response": "no_responses"}
+
+
+def populate_consensus_responses(apps, schema_editor):
+
+    ConsensusCondition = apps.get_model('conditionals', 'ConsensusCondition')
+    ConsensusResponse = apps.get_model('conditionals', 'ConsensusResponse')
+
+    for condition in ConsensusCondition.objects.exclude(responses="{}").iterator():
+        responses = {int(user_pk): response for user_pk, response in json.loads(condition.responses).items()}
+        ConsensusResponse.objects.bulk_create([ConsensusResponse(condition=condition, user_pk=user_pk, response=response)
+                                               for user_pk, response in responses.items()])
+        counts = {tally: 0 for tally in TALLIES.values()}
+        for response in responses.values():
+            counts[TALLIES[response]] += 1
+        ConsensusCondition.objects.filter(pk=condition.pk).update(**counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conditionals', '0010_pendingretry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consensuscondition',
+            name='blocks',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='consensuscondition',
+            name='no_responses',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='consensuscondition',
+            name='stand_asides',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='consensuscondition',
+            name='supports',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='consensuscondition',
+            name='supports_with_reservations',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='ConsensusResponse',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_pk', models.IntegerField()),
+                ('response', models.CharField(default='no response', max_length=30)),
+                ('condition', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='response_records', to='conditionals.ConsensusCondition')),
+            ],
+            options={
+                'unique_together': {('condition', 'user_pk')},
+            },
+        ),
+        migrations.RunPython(populate_consensus_responses, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='consensuscondition',
+            name='responses',
+        ),
+    ]
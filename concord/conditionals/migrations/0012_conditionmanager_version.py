@@ -0,0 +1,18 @@
+# Generated by Django 2.2.13 on 2026-10-16 20:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conditionals', '0011_consensus_responses'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conditionmanager',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
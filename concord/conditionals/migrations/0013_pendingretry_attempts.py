@@ -0,0 +1,18 @@
+# Generated by Django 2.2.13 on 2026-10-16 20:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conditionals', '0012_conditionmanager_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingretry',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.13 on 2026-10-16 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('conditionals', '0013_pendingretry_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingretry',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -2,16 +2,24 @@
 
 import datetime, json, random
 from abc import abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
 
 
-from django.db import models
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
 from django.utils import timezone
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 from concord.actions.models import PermissionedModel
 from concord.conditionals import utils, forms
 from concord.utils import helpers
+from concord.utils.permission_cache import invalidate_permission_cache
+from concord.utils.versioning import VersionedStateMixin
+from concord.conditionals.retry_queue import retry_queue
 from concord.conditionals.management.commands.check_condition_status import retry_action_signal
 
 
@@ -20,7 +28,7 @@ from concord.conditionals.management.commands.check_condition_status import retr
 ##################################
 
 
-class ConditionManager(PermissionedModel):
+class ConditionManager(VersionedStateMixin, PermissionedModel):
     """The compound manager is associated with a single permission or leadership type on a community and
     coordinates any conditions set on that target. The set of conditions that apply are stored in the conditions
     field. To help manage multiple conditions, we generate a unique id called "element_id" for each condition,
@@ -39,20 +47,41 @@ class ConditionManager(PermissionedModel):
         ('governor', 'Governor'),
     )
     set_on = models.CharField(max_length=10, choices=SET_ON_CHOICES)
+    # bumped whenever the conditions change, so that anything compiled from them, such as filters, is recompiled
+    version = models.PositiveIntegerField(default=0)
+
+    def snapshot_state(self, fields=None):
+        """Records the conditions as loaded from the database, so save can tell whether they've changed."""
+        if fields is None or "conditions" in fields:
+            self._loaded_conditions = self.__dict__.get("conditions")
+
+    def state_has_changed(self):
+        return self.conditions != getattr(self, "_loaded_conditions", None)
+
+    def has_unsaved_conditions(self):
+        """Returns True if the manager hasn't been saved or its conditions have changed since they were loaded."""
+        return self._state.adding or self.state_has_changed()
 
     # get methods
 
+    def get_parsed_conditions(self):
+        """Parses the conditions field into a list of ConditionData and a dict of them by element_id. The result
+        is memoized on the instance and re-parsed only if the conditions field has changed."""
+        parsed = getattr(self, "_parsed_conditions", None)
+        if parsed is None or parsed[0] != self.conditions:
+            conditions = json.loads(self.conditions) if self.conditions else []
+            condition_data_list = [utils.ConditionData(**condition) for condition in conditions]
+            by_element_id = {}
+            for condition in condition_data_list:
+                by_element_id.setdefault(condition.element_id, condition)
+            parsed = self._parsed_conditions = (self.conditions, condition_data_list, by_element_id)
+        return parsed
+
     def get_conditions_as_data(self):
-        condition_data_list = []
-        conditions = json.loads(self.conditions) if self.conditions else []
-        for condition in conditions:
-            condition_data_list.append(utils.ConditionData(**condition))
-        return condition_data_list
+        return list(self.get_parsed_conditions()[1])
 
     def get_condition_data(self, element_id):
-        for condition in self.get_conditions_as_data():
-            if condition.element_id == element_id:
-                return condition
+        return self.get_parsed_conditions()[2].get(element_id)
 
     def get_element_ids(self):
         return [condition.element_id for condition in self.get_conditions_as_data()]
@@ -74,6 +103,7 @@ class ConditionManager(PermissionedModel):
     def set_conditions(self, condition_data_list):
         serialized_conditions = [condition.serialize() for condition in condition_data_list]
         self.conditions = json.dumps(serialized_conditions)
+        self._parsed_conditions = None
 
     def add_condition(self, data_for_condition):   # was add_condition(self, condition, mode="acceptance"):
         condition_data_list = self.get_conditions_as_data()
@@ -191,6 +221,45 @@ class ConditionModel(PermissionedModel):
         the condition for its unique status logic."""
 
 
+class TimedConditionModel(ConditionModel):
+    """
+    Base class for conditions whose status may change once a deadline passes, such as the end of a voting period.
+
+    Attributes:
+
+    deadline: the result of get_timeout, stored so check_condition_status can query it
+    resolved: set once the condition has reached its final status
+
+    Conditions with resolved_manually set, like ConsensusCondition, only change status when someone resolves them.
+    Their deadline is kept for display, but they're never due, since retrying them once it passes would do nothing.
+    """
+
+    class Meta:
+        abstract = True
+
+    deadline = models.DateTimeField(blank=True, null=True, db_index=True)
+    resolved = models.BooleanField(default=False, db_index=True)
+
+    has_timeout = True
+    resolved_manually = False
+
+    def save(self, *args, **kwargs):
+        """Keeps the deadline up to date on save."""
+        self.deadline = self.get_timeout()
+        super().save(*args, **kwargs)
+
+    @abstractmethod
+    def get_timeout(self):
+        """Returns the datetime after which the condition's status may change."""
+
+    @classmethod
+    def get_due_conditions(cls, now=None):
+        """Gets unresolved conditions whose deadline has passed."""
+        if cls.resolved_manually:
+            return cls.objects.none()
+        return cls.objects.filter(resolved=False, deadline__lte=now or timezone.now())
+
+
 class ApprovalCondition(ConditionModel):
     """Approval Condition class."""
 
@@ -251,12 +320,11 @@ class ApprovalCondition(ConditionModel):
         return utils.description_for_passing_approval_condition(permission_data=permission_data)
 
 
-class VoteCondition(ConditionModel):
+class VoteCondition(TimedConditionModel):
     """Vote Condition class."""
 
     descriptive_name = "Vote Condition"
     verb_name = "vote"
-    has_timeout = True
 
     yeas = models.IntegerField(default=0)
     nays = models.IntegerField(default=0)
@@ -266,14 +334,15 @@ class VoteCondition(ConditionModel):
     abstains = models.IntegerField(default=0)
     require_majority = models.BooleanField(default=False)
 
-    # 'voted' should eventually be a list field or json field or something
+    # who voted is recorded in VoteRecord
     publicize_votes = models.BooleanField(default=False)
-    voted = models.CharField(max_length=500, default="[]")
 
     # voting period in hours, default is 168 hours aka one week
     voting_starts = models.DateTimeField(default=timezone.now)
     voting_period = models.IntegerField(default=168)
 
+    vote_tallies = {"yea": "yeas", "nay": "nays", "abstain": "abstains"}
+
     def user_condition_status(self, user):
         """Checks whether a user has voted already."""
         if self.has_voted(user):
@@ -293,25 +362,24 @@ class VoteCondition(ConditionModel):
 
     def has_voted(self, actor):
         """Returns True if actor has voted, otherwise False."""
-        voted = json.loads(self.voted)
-        if actor.username in voted:
-            return True
-        return False
-
-    def add_vote(self, vote):
-        """Increments vote depending on vote type."""
-        if vote == "yea":
-            self.yeas += 1
-        elif vote == "nay":
-            self.nays += 1
-        elif vote == "abstain":
-            self.abstains += 1
-
-    def add_vote_record(self, actor):
-        """Adds vote to record."""
-        voted = json.loads(self.voted)
-        voted.append(actor.username)
-        self.voted = json.dumps(voted)
+        return self.vote_records.filter(user=actor.pk).exists()
+
+    def get_voters(self):
+        """Gets the usernames of everyone who has voted, in the order they voted."""
+        return list(self.vote_records.order_by("pk").values_list("user__username", flat=True))
+
+    def add_vote(self, vote, actor):
+        """Records the actor's vote and increments the tally for the vote type. The tally is updated in the
+        database with an F() expression, so concurrent votes aren't lost, and the unique constraint on VoteRecord
+        ensures each actor votes only once."""
+        tally = self.vote_tallies[vote]
+        try:
+            with transaction.atomic():
+                VoteRecord.objects.create(condition=self, user=actor, vote=vote)
+                VoteCondition.objects.filter(pk=self.pk).update(**{tally: F(tally) + 1})
+        except IntegrityError:
+            raise ValidationError("Actor may only vote once")
+        self.refresh_from_db(fields=list(self.vote_tallies.values()))
 
     def yeas_have_majority(self):
         """Helper method, returns True if yeas currently have majority."""
@@ -371,7 +439,7 @@ class VoteCondition(ConditionModel):
 
     def display_fields(self):
         """Gets condition fields in form dict format."""
-        individual_votes = self.voted if self.publicize_votes else []
+        individual_votes = self.get_voters() if self.publicize_votes else []
         return [
             # configuration data
             {"field_name": "allow_abstain", "field_value": self.allow_abstain, "hidden": False},
@@ -408,21 +476,52 @@ class VoteCondition(ConditionModel):
         return utils.description_for_passing_voting_condition(condition=self, permission_data=permission_data)
 
 
-class ConsensusCondition(ConditionModel):
+class VoteRecord(models.Model):
+    """Records that a user has voted on a vote condition. Votes recorded before this model existed have no vote
+    type, since only the names of voters were saved."""
+
+    class Meta:
+        unique_together = (("condition", "user"),)
+
+    condition = models.ForeignKey(VoteCondition, on_delete=models.CASCADE, related_name="vote_records")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="vote_records")
+    vote = models.CharField(max_length=10, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user_id} voted {self.vote} on vote condition {self.condition_id}"
+
+
+class ConsensusCondition(TimedConditionModel):
     """Consensus Condition class."""
     descriptive_name = "Consensus Condition"
     verb_name = "consense"
-    has_timeout = True
-
-    resolved = models.BooleanField(default=False)
+    resolved_manually = True
 
     is_strict = models.BooleanField(default=False)
-    responses = models.CharField(max_length=500, default="{}")
+
+    # individual responses are recorded in ConsensusResponse, with a count for each response type kept here
+    supports = models.IntegerField(default=0)
+    supports_with_reservations = models.IntegerField(default=0)
+    stand_asides = models.IntegerField(default=0)
+    blocks = models.IntegerField(default=0)
+    no_responses = models.IntegerField(default=0)
 
     minimum_duration = models.IntegerField(default=48)
     discussion_starts = models.DateTimeField(default=timezone.now)
 
     response_choices = ["support", "support with reservations", "stand aside", "block", "no response"]
+    response_tallies = {"support": "supports", "support with reservations": "supports_with_reservations",
+                        "stand aside": "stand_asides", "block": "blocks", "no response": "no_responses"}
+
+    def save(self, *args, **kwargs):
+        """Creates response records for participants set by create_response_dictionary, which is called before
+        the condition is first saved."""
+        super().save(*args, **kwargs)
+        if getattr(self, "pending_participants", None):
+            ConsensusResponse.objects.bulk_create(
+                [ConsensusResponse(condition=self, user_pk=pk) for pk in self.pending_participants])
+            self.pending_participants = None
 
     def initialize_condition(self, target, data, set_on):
         """Called when creating the condition, and passed data (which contains condition_data and permission data)."""
@@ -468,29 +567,26 @@ class ConsensusCondition(ConditionModel):
             return "approved"
 
     def create_response_dictionary(self, participant_pk_list):
-        response_dict = {pk: "no response" for pk in participant_pk_list}
-        self.responses = json.dumps(response_dict)
+        """Sets the participants, all of whom start with 'no response'."""
+        self.pending_participants = list(dict.fromkeys(int(pk) for pk in participant_pk_list))
+        self.no_responses = len(self.pending_participants)
 
     def get_responses(self):
-        return json.loads(self.responses)
+        """Gets a dict of participant pk (as a string) to response."""
+        return {str(user_pk): response for user_pk, response
+                in self.response_records.order_by("pk").values_list("user_pk", "response")}
+
+    def get_response_counts(self):
+        return {response: getattr(self, tally) for response, tally in self.response_tallies.items()}
 
     def has_support(self):
-        for user, response in self.get_responses().items():
-            if response in ["support", "support with reservations"]:
-                return True
-        return False
+        return self.supports + self.supports_with_reservations > 0
 
     def full_participation(self):
-        for user, response in self.get_responses().items():
-            if response == "no response":
-                return False
-        return True
+        return self.no_responses == 0
 
     def has_blocks(self):
-        for user, response in self.get_responses().items():
-            if response == "block":
-                return True
-        return False
+        return self.blocks > 0
 
     def time_until_duration_passed(self):
         seconds_passed = (timezone.now() - self.discussion_starts).total_seconds()
@@ -506,31 +602,40 @@ class ConsensusCondition(ConditionModel):
         units = utils.parse_duration_into_units(self.minimum_duration)
         return utils.display_duration_units(**units)
 
+    def get_timeout(self):
+        """Get when the minimum duration for discussion has passed."""
+        return self.discussion_starts + datetime.timedelta(hours=self.minimum_duration)
+
     def ready_to_resolve(self):
         if self.time_until_duration_passed() <= 0:
             return True
         return False
 
     def is_participant(self, actor):
-        for user, response in self.get_responses().items():
-            if int(user) == int(actor.pk):
-                return True
-        return False
+        return self.response_records.filter(user_pk=actor.pk).exists()
 
     def add_response(self, actor, new_response):
-        responses = self.get_responses()
-        for user, response in responses.items():
-            if int(user) == int(actor.pk):
-                responses[user] = new_response
-        self.responses = json.dumps(responses)
+        """Changes the actor's response, if they're a participant, and moves them from the count for their old
+        response to the count for the new one. Counts are updated in the database with F() expressions."""
+        with transaction.atomic():
+            record = self.response_records.select_for_update().filter(user_pk=actor.pk).first()
+            if not record or record.response == new_response:
+                return
+            old_tally, new_tally = self.response_tallies[record.response], self.response_tallies[new_response]
+            ConsensusResponse.objects.filter(pk=record.pk).update(response=new_response)
+            ConsensusCondition.objects.filter(pk=self.pk).update(
+                **{old_tally: F(old_tally) - 1, new_tally: F(new_tally) + 1})
+        self.refresh_from_db(fields=list(self.response_tallies.values()))
 
     def display_fields(self):
-        """Gets condition fields in form dict format, for displaying in the condition component."""
+        """Gets condition fields in form dict format, for displaying in the condition component. Each participant's
+        response is fetched with a single query; the counts come from the condition itself."""
         return [
             # configuration data
             {"field_name": "minimum_duration", "field_value": self.duration_display(), "hidden": False},
             {"field_name": "time_remaining", "field_value": self.time_remaining_display(), "hidden": False},
             {"field_name": "responses", "field_value": self.get_responses(), "hidden": False},
+            {"field_name": "response_counts", "field_value": self.get_response_counts(), "hidden": False},
             {"field_name": "response_options", "field_value": self.response_choices, "hidden": False},
             {"field_name": "can_be_resolved", "field_value": self.ready_to_resolve(), "hidden": False},
             {"field_name": "current_result", "field_value": self.current_result(), "hidden": False}
@@ -569,16 +674,81 @@ class ConsensusCondition(ConditionModel):
         }
 
 
+class PendingRetry(models.Model):
+    """An action waiting to be retried by the retry queue. There is at most one row per action, so that many
+    updates to an action's conditions result in a single retry."""
+
+    action_pk = models.IntegerField(unique=True)
+    run_after = models.DateTimeField(db_index=True)
+    attempts = models.PositiveIntegerField(default=0)  # number of failed retries
+    claimed_at = models.DateTimeField(blank=True, null=True)  # set while a worker is retrying the action
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Retry of action {self.action_pk} after {self.run_after}"
+
+
+class ConsensusResponse(models.Model):
+    """The response of a participant in a consensus condition."""
+
+    class Meta:
+        unique_together = (("condition", "user_pk"),)
+
+    condition = models.ForeignKey(ConsensusCondition, on_delete=models.CASCADE, related_name="response_records")
+    user_pk = models.IntegerField()
+    response = models.CharField(max_length=30, default="no response")
+
+    def __str__(self):
+        return f"{self.user_pk} responded {self.response} on consensus condition {self.condition_id}"
+
+
 # Set up signals so that when a condition is updated, the action it's linked to is retried.
 
+deferred_retries = ContextVar("deferred_retries", default=None)
+
+
+@contextmanager
+def defer_retries():
+    """Within this context, retry_action collects the actions it would retry instead of retrying them, and each
+    collected action is retried once when the context exits without error. Used when changing a condition many
+    times in a row, for instance when taking votes in bulk."""
+    if deferred_retries.get() is not None:  # an outer context will do the retrying
+        yield
+        return
+    action_pks = []
+    token = deferred_retries.set(action_pks)
+    try:
+        yield
+    finally:
+        deferred_retries.reset(token)
+    for action_pk in dict.fromkeys(action_pks):
+        request_retry(action_pk)
+
+
+def request_retry(action_pk):
+    """Retries the action, or queues it to be retried if the retry queue is enabled. See retry_queue.py."""
+    if retry_queue.enabled:
+        retry_queue.enqueue(action_pk)
+        return
+    client = helpers.Client()
+    action = client.Action.get_action_given_pk(pk=action_pk)
+    client.Action.retake_action(action=action)
+
+
 @receiver(retry_action_signal)
 def retry_action(sender, instance, created, **kwargs):
     """Signal handler which retries the corresponding action or action container when condition has been updated."""
     if not created:
-        client = helpers.Client()
-        action = client.Action.get_action_given_pk(pk=instance.action)
-        client.Action.retake_action(action=action)
+        if deferred_retries.get() is not None:
+            deferred_retries.get().append(instance.action)
+            return
+        request_retry(instance.action)
 
 
 for conditionModel in [ApprovalCondition, VoteCondition, ConsensusCondition]:
     post_save.connect(retry_action, sender=conditionModel)
+
+post_save.connect(invalidate_permission_cache, sender=ConditionManager)
+post_delete.connect(invalidate_permission_cache, sender=ConditionManager)
+post_save.connect(utils.forget_compiled_filters, sender=ConditionManager)
+post_delete.connect(utils.forget_compiled_filters, sender=ConditionManager)
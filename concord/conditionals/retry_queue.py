@@ -0,0 +1,169 @@
+"""
+This module implements an optional queue for retrying actions after the conditions set on them are updated.
+
+By default, when a condition is updated, the action it was created for is retried immediately, within the request
+that updated the condition. To retry actions in the background instead, set CONDITION_RETRY_QUEUE in settings:
+
+    CONDITION_RETRY_QUEUE = {"DEBOUNCE": 2, "WORKER": "thread", "MAX_BACKOFF": 3600, "CLAIM_TIMEOUT": 600}
+
+Retries are stored in the PendingRetry table, one row per action, so any updates made to an action's conditions
+while a retry is pending are collapsed into that retry. DEBOUNCE is the number of seconds to wait after the latest
+update before retrying, so that a burst of votes results in a single re-evaluation. If a retry fails, it is queued
+again with an exponential backoff, up to MAX_BACKOFF seconds (an hour by default). With WORKER set to "thread", a
+worker thread is started in each process the first time something is queued. Set WORKER to None to process the
+queue elsewhere, for instance with the process_retry_queue management command.
+
+Workers claim a retry by stamping its row with claimed_at in a single conditional UPDATE, and retake the action
+after that has committed, so no row lock is held while the action is retaken and queueing more updates for the
+action never waits on a worker. Since claiming doesn't rely on SELECT ... FOR UPDATE or SKIP LOCKED, the queue works
+on every database backend Django supports, including SQLite and MySQL before 8.0. If a worker dies partway through
+a retry, its claim expires after CLAIM_TIMEOUT seconds (ten minutes by default) and another worker picks it up.
+"""
+
+import datetime
+import logging
+import threading
+
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from django.db.models import Min, Q
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+
+class RetryQueue:
+    """Queues actions to be retried, and retries them once their debounce period has passed."""
+
+    def __init__(self):
+        self.is_configured = False
+        self.debounce = None
+        self.worker_type = None
+        self.max_backoff = 3600
+        self.claim_timeout = 600
+        self.worker = None
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+
+    def configure(self, debounce=None, worker=None, max_backoff=3600, claim_timeout=600):
+        """Configures the queue. If no debounce is passed in, uses the CONDITION_RETRY_QUEUE setting, and if that's
+        not set, leaves the queue disabled. Passing in values is mostly useful for tests."""
+        if debounce is None:
+            config = getattr(settings, "CONDITION_RETRY_QUEUE", None) or {}
+            debounce, worker = config.get("DEBOUNCE"), config.get("WORKER", "thread")
+            max_backoff = config.get("MAX_BACKOFF", max_backoff)
+            claim_timeout = config.get("CLAIM_TIMEOUT", claim_timeout)
+        self.debounce, self.worker_type, self.max_backoff = debounce, worker, max_backoff
+        self.claim_timeout = claim_timeout
+        self.is_configured = True
+
+    def disable(self):
+        self.debounce = None
+        self.is_configured = True
+
+    @property
+    def enabled(self):
+        if not self.is_configured:
+            self.configure()
+        return self.debounce is not None
+
+    def enqueue(self, action_pk, now=None):
+        """Queues the action to be retried once the debounce period has passed. If a retry is already pending, it's
+        pushed back, so the action is only retried once updates to its conditions have stopped for that long."""
+        from concord.conditionals.models import PendingRetry
+        run_after = (now or timezone.now()) + datetime.timedelta(seconds=self.debounce)
+        PendingRetry.objects.update_or_create(action_pk=action_pk, defaults={"run_after": run_after})
+        if self.worker_type == "thread":
+            self.start_worker()
+            transaction.on_commit(self.wakeup.set)
+
+    def get_backoff(self, attempts):
+        """Gets the number of seconds to wait before retrying an action whose retry has failed attempts times."""
+        return min(self.debounce * 2 ** attempts, self.max_backoff)
+
+    def claim(self, pk, now):
+        """Claims a due retry, unless another worker holds an unexpired claim on it. The claim is a single
+        conditional UPDATE, so it's atomic without locking the row. Returns the claimed retry, or None."""
+        from concord.conditionals.models import PendingRetry
+        expired = now - datetime.timedelta(seconds=self.claim_timeout)
+        claimed = PendingRetry.objects.filter(pk=pk, run_after__lte=now) \
+            .filter(Q(claimed_at__isnull=True) | Q(claimed_at__lt=expired)).update(claimed_at=now)
+        return PendingRetry.objects.filter(pk=pk).first() if claimed else None
+
+    def process_due(self, now=None, batch_size=100):
+        """Retries actions whose debounce period has passed. Each retry is claimed before its action is retaken, so
+        that multiple workers don't retry the same action, and the row is only deleted once the retry succeeds, so
+        nothing is lost if the worker dies partway through. Returns the number of actions retried."""
+
+        from concord.conditionals.models import PendingRetry
+
+        now = now or timezone.now()
+        due = PendingRetry.objects.filter(run_after__lte=now).order_by("run_after")
+        retried = 0
+
+        for pk in list(due.values_list("pk", flat=True)[:batch_size]):
+            retry = self.claim(pk, now)
+            if retry and self.retry(retry):  # no retry if claimed by another worker or pushed back
+                retried += 1
+
+        return retried
+
+    def retry(self, retry):
+        """Retakes the action for a claimed retry. If it succeeds, deletes the retry, or releases the claim if it
+        was queued again while the action was being retaken. If it fails, its changes are rolled back and the retry
+        is released and pushed back with a backoff. Returns True if the action was retaken."""
+
+        from concord.conditionals.models import PendingRetry
+        from concord.utils.helpers import Client
+
+        action = Client().Action.get_action_given_pk(pk=retry.action_pk)
+        try:
+            if action:
+                with transaction.atomic():
+                    Client().Action.retake_action(action=action)
+        except Exception:
+            retry.attempts += 1
+            logger.exception(f"Error retrying action {retry.action_pk}, attempt {retry.attempts}")
+            retry.run_after = timezone.now() + datetime.timedelta(seconds=self.get_backoff(retry.attempts))
+            retry.claimed_at = None
+            retry.save(update_fields=["attempts", "run_after", "claimed_at"])
+            return False
+
+        deleted, _ = PendingRetry.objects.filter(pk=retry.pk, run_after=retry.run_after).delete()
+        if not deleted:
+            PendingRetry.objects.filter(pk=retry.pk).update(claimed_at=None)
+        return bool(action)
+
+    def seconds_until_next_due(self, max_wait, now=None):
+        from concord.conditionals.models import PendingRetry
+        next_due = PendingRetry.objects.aggregate(next_due=Min("run_after"))["next_due"]
+        if next_due is None:
+            return max_wait
+        return max(0, min((next_due - (now or timezone.now())).total_seconds(), max_wait))
+
+    def run_worker(self, poll_interval=5, stop_event=None):
+        """Processes the queue until stop_event is set. Sleeps until the next retry is due, until something is
+        queued in this process, or for poll_interval seconds, whichever comes first."""
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            try:
+                while self.process_due():
+                    pass
+                wait = self.seconds_until_next_due(poll_interval)
+            except Exception:
+                logger.exception("Error processing retry queue")
+                wait = poll_interval
+            finally:
+                close_old_connections()
+            self.wakeup.wait(wait)
+            self.wakeup.clear()
+
+    def start_worker(self):
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self.run_worker, name="concord-retry-queue", daemon=True)
+                self.worker.start()
+
+
+retry_queue = RetryQueue()
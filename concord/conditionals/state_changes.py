@@ -4,7 +4,7 @@ from django.core.exceptions import ValidationError
 
 from concord.actions.state_changes import BaseStateChange
 from concord.utils.helpers import Client
-from concord.conditionals.models import VoteCondition, ApprovalCondition, ConsensusCondition
+from concord.conditionals.models import VoteCondition, ApprovalCondition, ConsensusCondition, retry_action_signal
 from concord.conditionals.utils import validate_condition
 from concord.actions.models import Action
 from concord.permission_resources.models import PermissionsItem
@@ -203,9 +203,9 @@ class AddVoteStateChange(BaseStateChange):
             raise ValidationError("Actor abstained but this vote does not allow abstentions.")
 
     def implement(self, actor, target, **kwargs):
-        target.add_vote(self.vote)
-        target.add_vote_record(actor)
-        target.save()
+        # add_vote updates the tallies directly rather than saving, so we retry the action ourselves
+        target.add_vote(self.vote, actor)
+        retry_action_signal.send(sender=VoteCondition, instance=target, created=False)
         return True
 
 
@@ -299,8 +299,9 @@ class RespondConsensusStateChange(BaseStateChange):
                 f"Response must be one of {', '.join(target.response_choices)}, not {self.response}")
 
     def implement(self, actor, target, **kwargs):
+        # add_response updates the counts directly rather than saving, so we retry the action ourselves
         target.add_response(actor, self.response)
-        target.save()
+        retry_action_signal.send(sender=ConsensusCondition, instance=target, created=False)
         return self.response
 
 
@@ -1,12 +1,14 @@
 """Utils for conditionals package."""
+import copy
 import math
 
 from django.core.exceptions import ValidationError
 
 from concord.utils.helpers import Changes
 from concord.utils.text_utils import roles_and_actors
-from concord.utils.lookups import get_all_conditions, get_filter_conditions, get_state_change_object
+from concord.utils.lookups import get_all_conditions, get_filter_condition_class, get_state_change_object
 from concord.utils.dependent_fields import replacer
+from concord.utils.permission_cache import LRUBackend
 from concord.permission_resources.models import PermissionsItem
 
 
@@ -135,26 +137,98 @@ def validate_condition(condition_type, condition_data, permission_data, change_o
 
 # Get utils
 
-def get_acceptance_condition(*, element_id, manager, data, action):
-    condition_model = get_condition_model(condition_type=data.condition_type)
-    instances = condition_model.objects.filter(action=action.pk, source=manager.pk, element_id=element_id)
-    return instances[0] if instances else None
+class PrefetchedConditions:
+    """Holds acceptance condition instances for a set of (action, manager) pairs, keyed by action pk, manager pk
+    and element_id. Pairs are loaded with one query per condition model, either up front via load() or lazily the
+    first time they're looked up, and instances created later can be added so the map stays current."""
+
+    def __init__(self):
+        self.instances = {}
+        self.loaded = set()
+
+    @staticmethod
+    def get_key(action_pk, manager_pk, element_id):
+        return (int(action_pk), str(manager_pk), str(element_id))
+
+    def load(self, pairs):
+        """Fetches instances for the (action, manager) pairs which haven't been loaded yet."""
+
+        element_ids_by_model = {}
+        pairs_to_load = set()
+        for action, manager in pairs:
+            if (action.pk, manager.pk) in self.loaded:
+                continue
+            pairs_to_load.add((action.pk, manager.pk))
+            for data in manager.get_conditions_as_data():
+                if data.mode == "acceptance":
+                    condition_model = get_condition_model(condition_type=data.condition_type)
+                    element_ids_by_model.setdefault(condition_model, set()).add(str(data.element_id))
+
+        action_pks = set(action_pk for action_pk, manager_pk in pairs_to_load)
+        manager_pks = set(str(manager_pk) for action_pk, manager_pk in pairs_to_load)
+        for condition_model, element_ids in element_ids_by_model.items():
+            instances = condition_model.objects.filter(
+                action__in=action_pks, source__in=manager_pks, element_id__in=element_ids).order_by("pk")
+            for instance in instances:
+                if (instance.action, int(instance.source)) in pairs_to_load:
+                    self.instances.setdefault(self.get_key(instance.action, instance.source, instance.element_id),
+                                              instance)
+
+        self.loaded.update(pairs_to_load)
+
+    def get(self, *, action, manager, element_id):
+        self.load([(action, manager)])
+        return self.instances.get(self.get_key(action.pk, manager.pk, element_id))
+
+    def add(self, instance):
+        self.instances[self.get_key(instance.action, instance.source, instance.element_id)] = instance
 
 
 def get_filter_condition(*, data, action):
-    for condition in get_filter_conditions():
-        if condition.__name__ == data.condition_type:
-            return condition(**data.get_fields_as_dict()["condition_data"])
+    condition = get_filter_condition_class(data.condition_type)
+    if condition:
+        return condition(**data.get_fields_as_dict()["condition_data"])
     raise ValueError(f"No matching filter condition found for {data.condition_type}")
 
 
-def get_condition_instances(*, manager, action):
+compiled_filters = LRUBackend(max_size=1000)  # manager pk -> (manager version, dict of element_id -> prepared filter)
+
+
+def get_compiled_filters(manager):
+    """Gets the manager's filter conditions, instantiated and prepared, keyed by element_id. These are cached per
+    process by manager pk and version, except for managers with unsaved changes to their conditions."""
+    if manager.has_unsaved_conditions():
+        return compile_filters(manager)
+    cached = compiled_filters.get(manager.pk)
+    if cached and cached[0] == manager.version:
+        return cached[1]
+    filters = compile_filters(manager)
+    compiled_filters.set(manager.pk, (manager.version, filters))
+    return filters
+
+
+def compile_filters(manager):
+    return {data.element_id: get_filter_condition(data=data, action=None).prepare()
+            for data in manager.get_conditions_as_data() if data.mode == "filter"}
+
+
+def forget_compiled_filters(sender, instance, created=True, **kwargs):
+    """Signal handler which drops compiled filters when a manager is created or deleted, since its pk may be reused
+    (eg after a rollback) and a new manager starts again at version 0."""
+    if created:
+        compiled_filters.set(instance.pk, None)
+
+
+def get_condition_instances(*, manager, action, prefetched=None):
+    """Gets a dict of element_id to condition instance for each condition in the manager, or None for acceptance
+    conditions which haven't been created yet. Pass in prefetched to share fetched instances between calls."""
+    prefetched = prefetched if prefetched else PrefetchedConditions()
     conditions = {}
     for data in manager.get_conditions_as_data():
         if data.mode == "acceptance":
-            instance = get_acceptance_condition(element_id=data.element_id, manager=manager, action=action, data=data)
+            instance = prefetched.get(action=action, manager=manager, element_id=data.element_id)
         if data.mode == "filter":
-            instance = get_filter_condition(data=data, action=action)
+            instance = get_compiled_filters(manager)[data.element_id]
         conditions.update({data.element_id: instance})
     return conditions
 
@@ -166,41 +240,41 @@ def get_condition_status(condition, action):
         return condition.condition_status(action)
 
 
-def get_condition_statuses(*, manager, action):
+def get_condition_statuses(*, manager, action, prefetched=None):
     return [get_condition_status(condition_instance, action) if condition_instance else "not created"
-            for condition_instance in get_condition_instances(manager=manager, action=action).values()]
+            for condition_instance in get_condition_instances(manager=manager, action=action,
+                                                              prefetched=prefetched).values()]
 
 
-def condition_status(*, manager, action):
-    condition_statuses = get_condition_statuses(manager=manager, action=action)
+def condition_status(*, manager, action, prefetched=None):
+    condition_statuses = get_condition_statuses(manager=manager, action=action, prefetched=prefetched)
     if "rejected" in condition_statuses: return "rejected"
     if "waiting" in condition_statuses or "not created" in condition_statuses: return "waiting"
     return "approved"
 
 
-def uncreated_condition_names(*, manager, action):
+def uncreated_condition_names(*, manager, action, prefetched=None):
     items = [manager.get_name_given_element_id(element_id) for element_id, condition_instance
-             in get_condition_instances(manager=manager, action=action) if not condition_instance]
+             in get_condition_instances(manager=manager, action=action, prefetched=prefetched).items()
+             if not condition_instance]
     return ", ".join(items)
 
 
-def waiting_conditions(*, manager, action):
+def waiting_conditions(*, manager, action, prefetched=None):
     return [condition_instance for element_id, condition_instance
-            in get_condition_instances(manager=manager, action=action)
-            if condition_instance and condition_instance.condition_status() == "waiting"]
+            in get_condition_instances(manager=manager, action=action, prefetched=prefetched).items()
+            if condition_instance and get_condition_status(condition_instance, action) == "waiting"]
 
 
-def waiting_condition_names(*, manager, action):
+def waiting_condition_names(*, manager, action, prefetched=None):
     return ", ".join([condition.descriptive_name for condition
-                      in waiting_conditions(manager=manager, action=action)])
+                      in waiting_conditions(manager=manager, action=action, prefetched=prefetched)])
 
 
 def get_condition_target_filter(manager):
-    for data in manager.get_conditions_as_data():
-        if data.mode == "filter":
-            instance = get_filter_condition(data=data, action=None)
-            if instance.__class__.__name__ == "TargetTypeFilter":
-                return instance.target_type
+    for instance in get_compiled_filters(manager).values():
+        if instance.__class__.__name__ == "TargetTypeFilter":
+            return instance.target_type
 
 # Create utils
 
@@ -253,22 +327,25 @@ def create_condition(*, manager, element_id, data, action):
 
     if data.mode == "acceptance":
 
+        data = copy.deepcopy(data)  # data may be memoized on the manager, so don't replace fields in place
         replace_condition_fields(data=data, action=action)
         replace_permission_fields(data=data, action=action)
 
         return create_acceptance_condition(manager, element_id, data, action)
 
 
-def create_conditions(*, manager, action):
+def create_conditions(*, manager, action, prefetched=None):
     """Gets already created instances, then loops through the conditions set in the manager. If any are not
-    already created, creates and returns them."""
+    already created, creates and returns them. Newly created instances are added to prefetched, if passed in."""
 
-    created_instances = get_condition_instances(manager=manager, action=action)
+    created_instances = get_condition_instances(manager=manager, action=action, prefetched=prefetched)
 
     for data in manager.get_conditions_as_data():
         if not created_instances.get(data.element_id, None):
             instance = create_condition(manager=manager, element_id=data.element_id, data=data, action=action)
             created_instances.update({data.element_id: instance})
+            if instance and prefetched:
+                prefetched.add(instance)
 
     return created_instances.values()
 
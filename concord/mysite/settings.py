@@ -131,6 +131,9 @@ TEMPLATE_LIBARIES = [] # template libraries must be stored as a template_library
 
 DEFAULT_COMMUNITY_MODEL = "community"  # the main community/group model used
 
+PERMISSION_CACHE = None  # opt-in cache for permission decisions, eg {"BACKEND": "lru", "MAX_SIZE": 10000}
+CONDITION_RETRY_QUEUE = None  # opt-in background retries after condition updates, eg {"DEBOUNCE": 2, "WORKER": "thread"}
+
 ### Logging
 import logging
 
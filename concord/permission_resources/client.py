@@ -1,9 +1,10 @@
 """Client for permissions"""
 
 from typing import Tuple, List
+from collections import defaultdict
 
 from django.contrib.contenttypes.models import ContentType
-from django.db.models import Model
+from django.db.models import Model, Q
 
 from concord.actions.client import BaseClient
 from concord.permission_resources.models import PermissionsItem
@@ -33,13 +34,14 @@ class PermissionResourceClient(BaseClient):
         return PermissionsItem.objects.filter(permitted_object_content_type=content_type,
                                               permitted_object_id=target_object.pk)
 
-    def get_permissions_for_role(self, *, role_name):
-        """Given a role, get all permissions associated with it."""
-        matching_permissions = []
-        for permission in PermissionsItem.objects.all():
-            if permission.has_role(role=role_name):
-                matching_permissions.append(permission)
-        return matching_permissions
+    def get_permissions_for_role(self, *, role_name, community=None):
+        """Given a role, get all permissions associated with it. If community is passed in, only gets permissions
+        owned by that community."""
+        permissions = PermissionsItem.objects.filter(role_references__role_name=role_name)
+        if community:
+            permissions = permissions.filter(owner_content_type=ContentType.objects.get_for_model(community),
+                                             owner_object_id=community.pk)
+        return list(permissions.order_by("pk"))
 
     def get_all_permissions_in_community(self, *, community):
         """Gets all permissions set in a community by first, getting all permissioned models owned by a given
@@ -84,6 +86,36 @@ class PermissionResourceClient(BaseClient):
 
         return filtered_permissions
 
+    def get_specific_permissions_for_objects(self, *, objects, change_types) -> dict:
+        """Given a list of objects and a list of change types, gets all permissions set on any of the objects
+        and matching any of the change types, in a single query. Returns a dict with keys in the format
+        (content_type_pk, object_pk, change_type) and lists of permissions, ordered by pk, as values. The
+        permitted object and condition manager are set on each permission so they don't need to be fetched
+        again."""
+
+        objects_by_key, object_pks_by_content_type = {}, defaultdict(set)
+        for obj in objects:
+            content_type = ContentType.objects.get_for_model(obj)
+            objects_by_key[(content_type.pk, obj.pk)] = obj
+            object_pks_by_content_type[content_type.pk].add(obj.pk)
+
+        if not objects_by_key or not change_types:
+            return {}
+
+        query = Q()
+        for content_type_pk, object_pks in object_pks_by_content_type.items():
+            query |= Q(permitted_object_content_type=content_type_pk, permitted_object_id__in=object_pks)
+        permissions = PermissionsItem.objects.filter(query, change_type__in=set(change_types)) \
+            .select_related("condition").order_by("pk")
+
+        permissions_by_key = defaultdict(list)
+        for permission in permissions:
+            object_key = (permission.permitted_object_content_type_id, permission.permitted_object_id)
+            permission.permitted_object = objects_by_key[object_key]
+            permissions_by_key[object_key + (permission.change_type,)].append(permission)
+
+        return permissions_by_key
+
     def actor_satisfies_permission(self, *, actor, permission: PermissionsItem) -> bool:
         """Returns True if given actor satisfies given permission."""
         return permission.match_actor(actor)
@@ -134,11 +166,8 @@ class PermissionResourceClient(BaseClient):
     def get_permissions_associated_with_actor(self, actor: int) -> List[PermissionsItem]:
         """Given an actor, get all permissions on the target they are listed as an individual actor within."""
         permissions = self.get_permissions_on_object(target_object=self.target)
-        matching_permissions = []
-        for permission in permissions:
-            if permission.actors.actor_in_list(actor):
-                matching_permissions.append(permission)
-        return matching_permissions
+        actor_pk = getattr(actor, "pk", actor)
+        return list(permissions.filter(actor_references__actor_pk=actor_pk).order_by("pk"))
 
     def get_condition_data(self) -> dict:
         """Get condition data on the target."""
@@ -0,0 +1,50 @@
+# Generated by Django 2.2.13 on 2026-10-16 20:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_permission_references(apps, schema_editor):
+
+    PermissionsItem = apps.get_model('permission_resources', 'PermissionsItem')
+    PermissionActor = apps.get_model('permission_resources', 'PermissionActor')
+    PermissionRole = apps.get_model('permission_resources', 'PermissionRole')
+
+    for item in PermissionsItem.objects.all():
+        PermissionActor.objects.bulk_create(
+            [PermissionActor(permission=item, actor_pk=pk) for pk in set(item.actors.as_pks())])
+        PermissionRole.objects.bulk_create(
+            [PermissionRole(permission=item, role_name=role) for role in set(item.roles.get_roles())])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('permission_resources', '0007_remove_permissionsitem_configuration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PermissionRole',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role_name', models.CharField(db_index=True, max_length=200)),
+                ('permission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='role_references', to='permission_resources.PermissionsItem')),
+            ],
+            options={
+                'unique_together': {('permission', 'role_name')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PermissionActor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('actor_pk', models.PositiveIntegerField(db_index=True)),
+                ('permission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='actor_references', to='permission_resources.PermissionsItem')),
+            ],
+            options={
+                'unique_together': {('permission', 'actor_pk')},
+            },
+        ),
+        migrations.RunPython(populate_permission_references, migrations.RunPython.noop),
+    ]
@@ -3,13 +3,14 @@
 from django.db import models
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 
 from concord.actions.models import PermissionedModel
 from concord.permission_resources.customfields import ActorList, ActorListField, RoleList, RoleListField
 from concord.utils.text_utils import permission_to_text, permission_change_to_text
 from concord.utils.helpers import Client
 from concord.utils.lookups import get_state_change_object
+from concord.utils.permission_cache import invalidate_permission_cache
 
 
 class PermissionsItem(PermissionedModel):
@@ -189,6 +190,39 @@ class PermissionsItem(PermissionedModel):
     def get_nested_objects(self):
         return [self.get_owner(), self.permitted_object]
 
+    def sync_references(self):
+        """Brings the PermissionActor and PermissionRole rows for this permission in line with its actors and
+        roles, adding and deleting only what's changed."""
+
+        for model, field_name, values in [(PermissionActor, "actor_pk", set(self.actors.as_pks())),
+                                          (PermissionRole, "role_name", set(self.roles.get_roles()))]:
+            existing = set(model.objects.filter(permission=self).values_list(field_name, flat=True))
+            if existing - values:
+                model.objects.filter(permission=self, **{f"{field_name}__in": existing - values}).delete()
+            model.objects.bulk_create([model(permission=self, **{field_name: value}) for value in values - existing])
+
+
+class PermissionActor(models.Model):
+    """Records that an actor is listed on a permission, so permissions can be looked up by actor with an indexed
+    query. Kept in sync with PermissionsItem.actors on save."""
+
+    permission = models.ForeignKey(PermissionsItem, on_delete=models.CASCADE, related_name="actor_references")
+    actor_pk = models.PositiveIntegerField(db_index=True)
+
+    class Meta:
+        unique_together = ["permission", "actor_pk"]
+
+
+class PermissionRole(models.Model):
+    """Records that a role is listed on a permission, so permissions can be looked up by role with an indexed
+    query. Kept in sync with PermissionsItem.roles on save."""
+
+    permission = models.ForeignKey(PermissionsItem, on_delete=models.CASCADE, related_name="role_references")
+    role_name = models.CharField(max_length=200, db_index=True)
+
+    class Meta:
+        unique_together = ["permission", "role_name"]
+
 
 def delete_empty_permission(sender, instance, created, **kwargs):
     """Toggle is_active so it is only true when there are actors or roles set on the permission."""
@@ -206,4 +240,12 @@ def delete_empty_permission(sender, instance, created, **kwargs):
             instance.save(override_check=True)
 
 
+def sync_permission_references(sender, instance, **kwargs):
+    """Keeps the actor and role reference tables in sync with the permission."""
+    instance.sync_references()
+
+
 post_save.connect(delete_empty_permission, sender=PermissionsItem)
+post_save.connect(sync_permission_references, sender=PermissionsItem)
+post_save.connect(invalidate_permission_cache, sender=PermissionsItem)
+post_delete.connect(invalidate_permission_cache, sender=PermissionsItem)
@@ -4,19 +4,28 @@ import time
 from collections import namedtuple
 from unittest import skip
 from datetime import timedelta
+import importlib
 import inspect
+from io import StringIO
+from unittest.mock import patch
 
 from django.utils import timezone
+from django.apps import apps
 from django.test import TestCase
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
 
-from concord.actions.models import Action, TemplateModel
+from concord.actions.models import Action, TemplateModel, authorize_save
+from concord.communities.models import Community, RoleMembership
+from concord.communities.customfields import RoleHandler
 from concord.utils.helpers import Changes, Client, get_all_state_changes
 from concord.permission_resources.models import PermissionsItem
-from concord.conditionals.models import ApprovalCondition, ConsensusCondition
+from concord.conditionals.models import (
+    ApprovalCondition, ConsensusCondition, VoteCondition, ConditionManager, PendingRetry)
 from concord.conditionals.state_changes import AddConditionStateChange
+from concord.conditionals.management.commands.check_condition_status import retry_action_signal
 from concord.utils.text_utils import condition_to_text
 
 
@@ -456,6 +465,293 @@ class ConditionalsTest(DataTestCase):
         self.assertDictEqual(vote_condition.get_current_results(),
             { "yeas": 1, "nays": 0, "abstains": 1})
 
+    def test_vote_records(self):
+
+        # Pinoe places a vote condition on Rose adding rows, and Rose adds a row
+        self.client.PermissionResource.set_target(target=self.new_list)
+        action, permission = self.client.PermissionResource.add_permission(
+            change_type=Changes().Resources.AddRow, actors=[self.users.rose.pk])
+        self.client.update_target_on_all(target=permission)
+        permission_data = [{ "permission_type": Changes().Conditionals.AddVote,
+            "permission_actors": [self.users.jmac.pk, self.users.crystal.pk] }]
+        self.client.Conditional.add_condition(condition_type="votecondition", permission_data=permission_data)
+        self.client.update_actor_on_all(actor=self.users.rose)
+        self.client.update_target_on_all(target=self.new_list)
+        action, result = self.client.List.add_row_to_list(row_content={"player name": "Sam Staab"})
+        item = self.client.Conditional.get_condition_items_given_action_and_source(action=action, source=permission)[0]
+
+        # Votes are recorded, and tallied in the database rather than on the instance that was voted on
+        stale_item = VoteCondition.objects.get(pk=item.pk)
+        vote_condition = self.client.Conditional.get_condition_as_client(condition_type="VoteCondition", pk=item.pk)
+        vote_condition.set_actor(actor=self.users.crystal)
+        vote_condition.vote(vote="yea")
+        stale_item.add_vote("nay", self.users.jmac)
+        self.assertDictEqual(stale_item.current_results(), {"yeas": 1, "nays": 1, "abstains": 0})
+        self.assertTrue(stale_item.has_voted(self.users.crystal))
+        self.assertFalse(stale_item.has_voted(self.users.rose))
+        self.assertEquals(stale_item.get_voters(), ["crystaldunn", "jessicamacdonald"])
+
+        # Nobody can vote twice, even if the instance they're voting on hasn't seen their vote
+        with self.assertRaises(ValidationError):
+            stale_item.add_vote("yea", self.users.crystal)
+        self.assertDictEqual(VoteCondition.objects.get(pk=item.pk).current_results(),
+                             {"yeas": 1, "nays": 1, "abstains": 0})
+
+    def test_vote_in_bulk(self):
+
+        # Pinoe places a vote condition on Rose adding rows, and Rose adds a row
+        self.client.PermissionResource.set_target(target=self.new_list)
+        action, permission = self.client.PermissionResource.add_permission(
+            change_type=Changes().Resources.AddRow, actors=[self.users.rose.pk])
+        self.client.update_target_on_all(target=permission)
+        permission_data = [{ "permission_type": Changes().Conditionals.AddVote,
+            "permission_actors": [self.users.jmac.pk, self.users.crystal.pk] }]
+        self.client.Conditional.add_condition(condition_type="votecondition", permission_data=permission_data)
+        self.client.update_actor_on_all(actor=self.users.rose)
+        self.client.update_target_on_all(target=self.new_list)
+        action, result = self.client.List.add_row_to_list(row_content={"player name": "Sam Staab"})
+        item = self.client.Conditional.get_condition_items_given_action_and_source(action=action, source=permission)[0]
+        log_count = len(action.get_logs())
+
+        # Crystal and JMac's votes are recorded, while Rose can't vote and Tobin's vote is invalid
+        vote_condition = self.client.Conditional.get_condition_as_client(condition_type="VoteCondition", pk=item.pk)
+        responses = vote_condition.vote_in_bulk(votes=[
+            (self.users.crystal, "yea"), (self.users.rose, "yea"), (self.users.tobin, "maybe"),
+            (self.users.jmac, "nay")])
+        self.assertEquals([response[0].status for response in responses],
+                          ["implemented", "rejected", "invalid", "implemented"])
+        self.assertEquals([response[0].actor for response in responses[:2]], [self.users.crystal, self.users.rose])
+        self.assertDictEqual(vote_condition.get_current_results(), {"yeas": 1, "nays": 1, "abstains": 0})
+
+        # Rose's action was retried once, rather than once per vote
+        self.assertEquals(len(Action.objects.get(pk=action.pk).get_logs()), log_count + 1)
+
+        # Nobody may vote twice in the same batch
+        with self.assertRaises(ValueError):
+            vote_condition.vote_in_bulk(votes=[(self.users.pinoe, "yea"), (self.users.pinoe, "nay")])
+
+    def test_retry_queue(self):
+
+        from concord.conditionals.retry_queue import retry_queue
+        retry_queue.configure(debounce=60, worker=None)
+        self.addCleanup(retry_queue.disable)
+
+        # Pinoe places a one hour vote condition on Rose adding rows, and Rose adds a row
+        self.client.PermissionResource.set_target(target=self.new_list)
+        action, permission = self.client.PermissionResource.add_permission(
+            change_type=Changes().Resources.AddRow, actors=[self.users.rose.pk])
+        self.client.update_target_on_all(target=permission)
+        permission_data = [{ "permission_type": Changes().Conditionals.AddVote,
+            "permission_actors": [self.users.jmac.pk, self.users.crystal.pk] }]
+        self.client.Conditional.add_condition(condition_type="votecondition",
+            condition_data={"voting_period": 1}, permission_data=permission_data)
+        self.client.update_actor_on_all(actor=self.users.rose)
+        self.client.update_target_on_all(target=self.new_list)
+        action, result = self.client.List.add_row_to_list(row_content={"player name": "Sam Staab"})
+        item = self.client.Conditional.get_condition_items_given_action_and_source(action=action, source=permission)[0]
+        log_count = len(action.get_logs())
+
+        # Both votes are collapsed into a single queued retry, rather than retrying Rose's action immediately
+        vote_condition = self.client.Conditional.get_condition_as_client(condition_type="VoteCondition", pk=item.pk)
+        for voter in [self.users.crystal, self.users.jmac]:
+            vote_condition.set_actor(actor=voter)
+            vote_condition.vote(vote="yea")
+        self.assertEquals(list(PendingRetry.objects.values_list("action_pk", flat=True)), [action.pk])
+        self.assertEquals(len(Action.objects.get(pk=action.pk).get_logs()), log_count)
+
+        # Nothing is retried until the debounce period has passed, and each update pushes the retry back
+        self.assertEquals(retry_queue.process_due(), 0)
+        run_after = PendingRetry.objects.get(action_pk=action.pk).run_after
+        retry_queue.enqueue(action.pk, now=timezone.now() + timedelta(seconds=30))
+        self.assertGreater(PendingRetry.objects.get(action_pk=action.pk).run_after, run_after)
+        self.assertEquals(retry_queue.process_due(now=timezone.now() + timedelta(seconds=61)), 0)
+        retry_queue.enqueue(action.pk)
+        VoteCondition.objects.filter(pk=item.pk).update(voting_starts=timezone.now() - timedelta(hours=2))
+
+        # If the worker is killed partway through a retry, the retry is still queued, and other workers leave it
+        # alone until the claim expires
+        with patch("concord.actions.client.ActionClient.retake_action", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                retry_queue.process_due(now=timezone.now() + timedelta(seconds=61))
+        retry = PendingRetry.objects.get(action_pk=action.pk)
+        self.assertEquals(retry.attempts, 0)
+        self.assertIsNotNone(retry.claimed_at)
+        self.assertEquals(retry_queue.process_due(now=timezone.now() + timedelta(seconds=62)), 0)
+
+        # Queueing another update doesn't wait on the claim, and keeps it
+        retry_queue.enqueue(action.pk, now=timezone.now() - timedelta(seconds=1))
+        self.assertEquals(PendingRetry.objects.get(action_pk=action.pk).claimed_at, retry.claimed_at)
+
+        # A retry which fails is queued again with a backoff rather than lost, and its claim is released
+        claim_expired = timezone.now() + timedelta(seconds=retry_queue.claim_timeout + 61)
+        with patch("concord.actions.client.ActionClient.retake_action", side_effect=RuntimeError):
+            self.assertEquals(retry_queue.process_due(now=claim_expired), 0)
+        retry = PendingRetry.objects.get(action_pk=action.pk)
+        self.assertEquals(retry.attempts, 1)
+        self.assertIsNone(retry.claimed_at)
+        self.assertGreater(retry.run_after, timezone.now() + timedelta(seconds=119))
+        self.assertEquals(Action.objects.get(pk=action.pk).status, "waiting")
+
+        self.assertEquals(retry_queue.process_due(now=timezone.now() + timedelta(seconds=121)), 1)
+        self.assertEquals(Action.objects.get(pk=action.pk).status, "implemented")
+        self.assertFalse(PendingRetry.objects.exists())
+
+    def test_check_condition_status_only_retries_due_conditions(self):
+
+        # Pinoe places a one hour vote condition on Rose adding rows
+        self.client.PermissionResource.set_target(target=self.new_list)
+        action, permission = self.client.PermissionResource.add_permission(
+            change_type=Changes().Resources.AddRow, actors=[self.users.rose.pk])
+        self.client.update_target_on_all(target=permission)
+        permission_data = [{ "permission_type": Changes().Conditionals.AddVote,
+            "permission_actors": [self.users.crystal.pk] }]
+        self.client.Conditional.add_condition(condition_type="votecondition",
+            condition_data={"voting_period": 1}, permission_data=permission_data)
+
+        # Rose adds two rows, and Crystal votes yes on both
+        self.client.update_actor_on_all(actor=self.users.rose)
+        self.client.update_target_on_all(target=self.new_list)
+        first_action, result = self.client.List.add_row_to_list(row_content={"player name": "Sam Staab"})
+        second_action, result = self.client.List.add_row_to_list(row_content={"player name": "Tierna Davidson"})
+        items = [self.client.Conditional.get_condition_items_given_action_and_source(
+            action=action, source=permission)[0] for action in [first_action, second_action]]
+        for item in items:
+            self.assertEquals(item.deadline, item.voting_deadline())
+            vote_condition = self.client.Conditional.get_condition_as_client(condition_type="VoteCondition",
+                                                                             pk=item.pk)
+            vote_condition.set_actor(actor=self.users.crystal)
+            vote_condition.vote(vote="yea")
+
+        # Only the first vote is past its deadline, so only its action is retried
+        VoteCondition.objects.filter(pk=items[0].pk).update(deadline=timezone.now() - timedelta(hours=1),
+                                                            voting_starts=timezone.now() - timedelta(hours=2))
+        self.assertEquals(list(VoteCondition.get_due_conditions().values_list("pk", flat=True)), [items[0].pk])
+        call_command("check_condition_status", batch_size=1)
+        self.assertEquals(Action.objects.get(pk=first_action.pk).status, "implemented")
+        self.assertEquals(Action.objects.get(pk=second_action.pk).status, "waiting")
+
+        # The first vote has been marked resolved and is no longer due, so running the command again retries nothing
+        self.assertTrue(VoteCondition.objects.get(pk=items[0].pk).resolved)
+        self.assertFalse(VoteCondition.get_due_conditions().exists())
+        with patch.object(retry_action_signal, "send") as send:
+            call_command("check_condition_status")
+        self.assertEquals(send.call_count, 0)
+
+    def test_condition_manager_memoizes_parsed_conditions(self):
+
+        manager = ConditionManager(community=self.instance.pk, set_on="permission")
+        manager.add_condition({"condition_type": "votecondition", "condition_data": {"voting_period": 1}})
+        element_id = manager.get_element_ids()[0]
+
+        # parsed conditions are reused until the conditions change
+        data = manager.get_condition_data(element_id)
+        self.assertIs(manager.get_conditions_as_data()[0], data)
+        self.assertEquals(manager.get_name_given_element_id(element_id), "votecondition")
+        self.assertIsNone(manager.get_condition_data(-1))
+
+        manager.edit_condition(element_id, {"condition_data": {"voting_period": 2}})
+        self.assertIsNot(manager.get_condition_data(element_id), data)
+        self.assertEquals(manager.get_condition_data(element_id).condition_data, {"voting_period": 2})
+
+        # conditions loaded from the database are parsed afresh
+        manager.conditions = json.dumps([])
+        self.assertEquals(manager.get_element_ids(), [])
+
+    def test_prefetched_conditions(self):
+
+        from concord.conditionals.utils import PrefetchedConditions, get_condition_instances
+
+        # Pinoe places a vote condition on Rose adding rows, and Rose adds two rows
+        self.client.PermissionResource.set_target(target=self.new_list)
+        action, permission = self.client.PermissionResource.add_permission(
+            change_type=Changes().Resources.AddRow, actors=[self.users.rose.pk])
+        self.client.update_target_on_all(target=permission)
+        permission_data = [{ "permission_type": Changes().Conditionals.AddVote,
+            "permission_actors": [self.users.crystal.pk] }]
+        self.client.Conditional.add_condition(condition_type="votecondition", permission_data=permission_data)
+        self.client.update_actor_on_all(actor=self.users.rose)
+        self.client.update_target_on_all(target=self.new_list)
+        first_action, result = self.client.List.add_row_to_list(row_content={"player name": "Sam Staab"})
+        second_action, result = self.client.List.add_row_to_list(row_content={"player name": "Tierna Davidson"})
+        permission = PermissionsItem.objects.get(pk=permission.pk)
+        manager = permission.condition
+
+        # Instances for both actions are fetched in a single query and then looked up without querying
+        prefetched = PrefetchedConditions()
+        with self.assertNumQueries(1):
+            prefetched.load([(first_action, manager), (second_action, manager)])
+        with self.assertNumQueries(0):
+            first_instances = get_condition_instances(manager=manager, action=first_action, prefetched=prefetched)
+            second_instances = get_condition_instances(manager=manager, action=second_action, prefetched=prefetched)
+        self.assertEquals([item.action for item in first_instances.values()], [first_action.pk])
+        self.assertEquals([item.action for item in second_instances.values()], [second_action.pk])
+        self.assertEquals(list(first_instances.values()), self.client.Conditional.get_condition_items_for_action(
+            action_pk=first_action.pk))
+
+    def test_condition_scheduler(self):
+
+        from concord.conditionals.management.commands.run_condition_scheduler import Command
+        scheduler = Command()
+        scheduler.setup()
+        self.assertEquals(scheduler.load_pending_conditions(), 0)
+
+        # Pinoe places a one hour vote condition on Rose adding rows, and Rose adds a row
+        self.client.PermissionResource.set_target(target=self.new_list)
+        action, permission = self.client.PermissionResource.add_permission(
+            change_type=Changes().Resources.AddRow, actors=[self.users.rose.pk])
+        self.client.update_target_on_all(target=permission)
+        permission_data = [{ "permission_type": Changes().Conditionals.AddVote,
+            "permission_actors": [self.users.crystal.pk] }]
+        self.client.Conditional.add_condition(condition_type="votecondition",
+            condition_data={"voting_period": 1}, permission_data=permission_data)
+        self.client.update_actor_on_all(actor=self.users.rose)
+        self.client.update_target_on_all(target=self.new_list)
+        action, result = self.client.List.add_row_to_list(row_content={"player name": "Sam Staab"})
+        item = self.client.Conditional.get_condition_items_given_action_and_source(action=action, source=permission)[0]
+
+        # The scheduler picks up the new condition on its next poll, and only once
+        self.assertEquals(scheduler.load_new_conditions(), 1)
+        self.assertEquals(scheduler.load_new_conditions(), 0)
+        self.assertEquals(scheduler.deadlines, [(item.deadline, "VoteCondition", item.pk)])
+
+        # A scheduler started now seeds its heap with the pending condition, and doesn't load it again when polling
+        restarted_scheduler = Command()
+        restarted_scheduler.setup()
+        self.assertEquals(restarted_scheduler.load_pending_conditions(), 1)
+        self.assertEquals(restarted_scheduler.load_new_conditions(), 0)
+        self.assertEquals(restarted_scheduler.deadlines, scheduler.deadlines)
+        self.assertAlmostEqual(scheduler.seconds_until_next_run(10), 10)
+        self.assertAlmostEqual(scheduler.seconds_until_next_run(7200, now=item.deadline - timedelta(seconds=30)), 30)
+
+        # A condition committed after a higher pk was seen is missed by polling, but picked up when the heap is rebuilt
+        lagging_scheduler = Command()
+        lagging_scheduler.setup(reseed_every=2)
+        lagging_scheduler.high_water_marks["VoteCondition"] = item.pk
+        self.assertEquals(lagging_scheduler.poll(), 0)
+        self.assertEquals(lagging_scheduler.poll(), 1)
+        self.assertEquals(lagging_scheduler.deadlines, scheduler.deadlines)
+
+        # Nothing fires before the deadline
+        self.assertEquals(scheduler.fire_due_conditions(now=item.deadline - timedelta(seconds=1)), 0)
+
+        # If retrying fails, the condition goes back on the heap to be tried again after the poll interval
+        scheduler_module = "concord.conditionals.management.commands.run_condition_scheduler"
+        with patch(f"{scheduler_module}.retry_conditions", side_effect=Exception("database went away")):
+            with self.assertLogs(scheduler_module, level="ERROR"):
+                self.assertEquals(scheduler.fire_due_conditions(now=item.deadline), 0)
+        retry_at = item.deadline + timedelta(seconds=scheduler.poll_interval)
+        self.assertEquals(scheduler.deadlines, [(retry_at, "VoteCondition", item.pk)])
+
+        # Crystal votes yes, and once the deadline passes the action is retried and implemented
+        vote_condition = self.client.Conditional.get_condition_as_client(condition_type="VoteCondition", pk=item.pk)
+        vote_condition.set_actor(actor=self.users.crystal)
+        vote_condition.vote(vote="yea")
+        VoteCondition.objects.filter(pk=item.pk).update(voting_starts=timezone.now() - timedelta(hours=2))
+        self.assertEquals(scheduler.fire_due_conditions(now=retry_at), 1)
+        self.assertEquals(Action.objects.get(pk=action.pk).status, "implemented")
+        self.assertTrue(VoteCondition.objects.get(pk=item.pk).resolved)
+        self.assertEquals(scheduler.deadlines, [])
+
     def test_approval_conditional(self):
         """
         Tests that changes to a resource require approval from a specific person,
@@ -771,6 +1067,72 @@ class BasicCommunityTest(DataTestCase):
         self.assertEquals(Action.objects.get(pk=action.pk).status, "rejected")
         self.assertEquals(community.name, "A New Community")
 
+    def test_community_can_only_be_updated_by_state_change(self):
+        community = self.client.Community.create_community(name="A New Community")
+        community.name = "A Newly Named Community"
+        with self.assertRaisesMessage(BaseException, "Save called incorrectly"):
+            community.save()
+        with authorize_save():
+            community.save()
+        self.assertEquals(Community.objects.get(pk=community.pk).name, "A Newly Named Community")
+        with self.assertRaisesMessage(BaseException, "Save called incorrectly"):
+            community.save()
+
+    def test_get_communities_for_user(self):
+        community = self.client.Community.create_community(name="A New Community")
+        other_community = self.client.Community.create_community(name="Another Community")
+        self.client.Community.set_target(target=community)
+        self.client.Community.add_members_to_community(member_pk_list=[self.users.rose.pk])
+        self.assertEquals(self.client.Community.get_communities_for_user(self.users.rose.pk), [community])
+        self.assertEquals(self.client.Community.get_communities_for_user(self.users.rose.pk, split=True),
+                          ([], [community]))
+
+        # Rose becomes a governor through a role
+        self.client.Community.add_role_to_community(role_name="forwards")
+        self.client.Community.add_people_to_role(role_name="forwards", people_to_add=[self.users.rose.pk])
+        self.client.Community.change_governors_of_community(roles_to_add=["forwards"])
+        self.assertEquals(self.client.Community.get_communities_for_user(self.users.rose.pk, split=True),
+                          ([community], []))
+
+        # Once removed from the role, Rose is a regular member again
+        self.client.Community.remove_people_from_role(role_name="forwards", people_to_remove=[self.users.rose.pk])
+        self.assertEquals(self.client.Community.get_communities_for_user(self.users.rose.pk, split=True),
+                          ([], [community]))
+        leader_list, member_list = self.client.Community.get_communities_for_user(self.users.pinoe.pk, split=True)
+        self.assertCountEqual(leader_list, [community, other_community])
+
+    def test_rebuild_role_memberships(self):
+        community = self.client.Community.create_community(name="A New Community")
+        memberships = RoleMembership.objects.for_community(community)
+        expected = set(memberships.values_list("user_pk", "role_name"))
+        memberships.filter(role_name="owners").delete()
+        RoleMembership.objects.create(community=community, user_pk=self.users.rose.pk, role_name="members")
+        RoleMembership.objects.create(community_content_type=ContentType.objects.get_for_model(Community),
+                                      community_object_id=community.pk + 100, user_pk=self.users.rose.pk,
+                                      role_name="members")
+        call_command("rebuild_role_memberships", stdout=StringIO())
+        self.assertEquals(set(memberships.values_list("user_pk", "role_name")), expected)
+        self.assertEquals(expected, {(self.users.pinoe.pk, role) for role in ["members", "owners", "governors"]})
+        self.assertFalse(RoleMembership.objects.filter(community_object_id=community.pk + 100).exists())
+
+    def test_role_membership_migration_backfills_existing_communities(self):
+        community = self.client.Community.create_community(name="A New Community")
+        self.client.Community.set_target(community)
+        self.client.Community.add_members_to_community(member_pk_list=[self.users.rose.pk])
+        self.client.Community.add_role_to_community(role_name="forwards")
+        self.client.Community.add_people_to_role(role_name="forwards", people_to_add=[self.users.rose.pk])
+        expected = set(RoleMembership.objects.values_list(
+            "community_content_type", "community_object_id", "user_pk", "role_name"))
+
+        # communities existed before the membership table did, so it starts out empty
+        RoleMembership.objects.all().delete()
+        migration = importlib.import_module("concord.communities.migrations.0008_rolemembership")
+        migration.populate_role_memberships(apps, None)
+
+        self.assertEquals(set(RoleMembership.objects.values_list(
+            "community_content_type", "community_object_id", "user_pk", "role_name")), expected)
+        self.assertEquals(self.client.Community.get_communities_for_user(self.users.rose.pk), [community])
+
     def test_add_governor_to_community(self):
         community = self.client.Community.create_community(name="A New Community")
         self.client.Community.set_target(community)
@@ -1002,6 +1364,81 @@ class GoverningAuthorityTest(DataTestCase):
         self.client.Community.add_members_to_community(member_pk_list=[self.users.sonny.pk])
         self.client.Community.change_governors_of_community(actors_to_add=[self.users.sonny.pk])
 
+    def test_roles_version_bumped_only_when_roles_change(self):
+        version = Community.objects.get(pk=self.community.pk).roles_version
+        self.client.Community.change_name_of_community(name="A Newly Named Community")
+        self.assertEquals(Community.objects.get(pk=self.community.pk).roles_version, version)
+        self.client.Community.add_members_to_community(member_pk_list=[self.users.tobin.pk])
+        self.assertEquals(Community.objects.get(pk=self.community.pk).roles_version, version + 1)
+        self.assertEquals(self.community.roles_version, version + 1)
+
+    def test_loading_community_does_not_serialize_roles(self):
+        with patch.object(RoleHandler, "serialize", side_effect=AssertionError("roles serialized on load")):
+            community = Community.objects.get(pk=self.community.pk)
+        self.assertFalse(community.roles_have_changed())
+
+    def test_filter_action_history_by_change_type_and_resolution(self):
+        name_action, result = self.client.Community.change_name_of_community(name="A Newly Named Community")
+        self.assertEquals(name_action.resolved_through, "governing")
+        self.assertEquals(name_action.change_type, Changes().Communities.ChangeName)
+
+        foundational_actions = self.client.Action.get_foundational_actions_given_target(self.community)
+        self.assertEquals([action.change.get_change_type() for action in foundational_actions],
+                          [Changes().Communities.ChangeGovernors])
+        self.assertIn(name_action, self.client.Action.get_governing_actions_given_target(self.community))
+        self.assertEquals([action.change.get_change_type() for action in
+                           self.client.Action.get_owning_actions_given_target(self.community)],
+                          [Changes().Communities.ChangeGovernors])
+
+    def test_fill_change_types(self):
+        name_action, result = self.client.Community.change_name_of_community(name="A Newly Named Community")
+        Action.objects.filter(pk=name_action.pk).update(change_type=None)
+        call_command("fill_change_types", stdout=StringIO())
+        self.assertEquals(Action.objects.get(pk=name_action.pk).change_type, Changes().Communities.ChangeName)
+        self.assertFalse(Action.objects.filter(change_type__isnull=True).exists())
+
+    def test_stale_copy_of_community_picks_up_new_governor(self):
+        stale_copy = Community.objects.get(pk=self.community.pk)
+        self.client.Community.add_members_to_community(member_pk_list=[self.users.tobin.pk])
+        self.client.Community.change_governors_of_community(actors_to_add=[self.users.tobin.pk])
+        self.assertFalse(stale_copy.roles.is_governor(self.users.tobin.pk)[0])
+
+        community_client = Client(actor=self.users.pinoe, target=stale_copy).Community
+        self.assertTrue(community_client.has_governing_authority(actor=self.users.tobin)[0])
+        self.assertEquals(stale_copy.roles_version, self.community.roles_version)
+
+    def test_freshly_loaded_owner_skips_roles_staleness_check(self):
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from concord.actions.utils import MockAction
+        from concord.resources.models import SimpleList
+        from concord.resources.state_changes import EditListStateChange
+        from concord.utils.pipelines import has_permission
+
+        action, new_list = self.client.List.add_list(name="Go USWNT!", description="Our favorite players")
+        mock_action = MockAction(change=EditListStateChange(name="Go Team"), actor=self.users.sonny,
+                                 target=SimpleList.objects.get(pk=new_list.pk))
+        with CaptureQueriesContext(connection) as context:
+            matches = has_permission(mock_action)
+        self.assertEquals(matches[-1].status, "approved")
+        version_checks = [query for query in context.captured_queries
+                          if query["sql"].startswith('SELECT "communities_community"."roles_version"')]
+        self.assertEquals(version_checks, [])
+
+    def test_stale_community_target_picks_up_new_governor(self):
+
+        from concord.actions.utils import MockAction
+        from concord.communities.state_changes import ChangeNameStateChange
+        from concord.utils.pipelines import has_permission
+
+        stale_copy = Community.objects.get(pk=self.community.pk)
+        self.client.Community.add_members_to_community(member_pk_list=[self.users.tobin.pk])
+        self.client.Community.change_governors_of_community(actors_to_add=[self.users.tobin.pk])
+
+        mock_action = MockAction(change=ChangeNameStateChange(name="Go Team"), actor=self.users.tobin,
+                                 target=stale_copy)
+        self.assertEquals(has_permission(mock_action)[-1].status, "approved")
 
     def test_with_conditional_on_governer_decision_making(self):
 
@@ -1265,6 +1702,30 @@ class RolesetTest(DataTestCase):
         roles = self.client.Community.get_custom_roles()
         self.assertEquals(roles, {})
 
+    def test_role_referenced_in_permission_cannot_be_removed(self):
+
+        self.client.Community.add_role_to_community(role_name="forwards")
+        self.client.Community.add_members_to_community(member_pk_list=[self.users.christen.pk])
+        self.client.PermissionResource.set_target(self.resource)
+        action, permission = self.client.PermissionResource.add_permission(
+            change_type=Changes().Resources.AddRow, roles=["forwards"], actors=[self.users.christen.pk])
+
+        self.assertEquals(self.client.PermissionResource.get_permissions_for_role(
+            role_name="forwards", community=self.community), [permission])
+        self.assertEquals(self.client.PermissionResource.get_permissions_associated_with_actor(
+            self.users.christen.pk), [permission])
+
+        action, result = self.client.Community.remove_role_from_community(role_name="forwards")
+        self.assertEquals(action.error_message,
+            f"Role cannot be deleted until it is removed from permissions: {permission.pk}")
+
+        # Once the role is removed from the permission, the role can be removed
+        self.client.PermissionResource.set_target(permission)
+        self.client.PermissionResource.remove_role_from_permission(role_name="forwards")
+        self.assertEquals(self.client.PermissionResource.get_permissions_for_role(role_name="forwards"), [])
+        action, result = self.client.Community.remove_role_from_community(role_name="forwards")
+        self.assertEquals(Action.objects.get(pk=action.pk).status, "implemented")
+
     def test_basic_role_works_with_permission_item(self):
 
         # Aubrey wants to add an item to the list, she can't
@@ -1525,6 +1986,97 @@ class MockActionTest(DataTestCase):
         self.assertEquals(log[0]["status"], "waiting")
         self.assertEquals(log[1]["status"], "waiting")
 
+    def test_batch_permission_check_matches_individual_checks(self):
+
+        from concord.utils.pipelines import has_permission, has_permission_batch, mock_action_pipeline_batch
+
+        # Christen has specific permission to add roles, Tobin has conditional permission to change the name
+        action, permission = self.client.PermissionResource.add_permission(
+            change_type=Changes().Communities.AddRole, actors=[self.users.christen.pk])
+        action, permission = self.client.PermissionResource.add_permission(
+            change_type=Changes().Communities.ChangeName, actors=[self.users.tobin.pk])
+        self.client.Conditional.set_target(permission)
+        perm_data = [{"permission_type": Changes().Conditionals.Approve, "permission_actors": [self.users.pinoe.pk]}]
+        self.client.Conditional.add_condition(condition_type="approvalcondition", permission_data=perm_data)
+
+        mock_actions = []
+        self.client.Community.mode = "mock"
+        for user in [self.users.pinoe, self.users.christen, self.users.tobin, self.users.aubrey]:
+            self.client.Community.set_actor(actor=user)
+            mock_actions.append(self.client.Community.add_role_to_community(role_name="forwards"))
+            mock_actions.append(self.client.Community.change_name_of_community(name="Team USA"))
+
+        batch_matches = has_permission_batch(mock_actions)
+        for mock_action, matches in zip(mock_actions, batch_matches):
+            individual_matches = has_permission(mock_action)
+            self.assertEquals([m.serialize() for m in matches], [m.serialize() for m in individual_matches])
+
+        self.assertEquals(mock_action_pipeline_batch(mock_actions),
+                          [True, True, True, False, False, False, False, False])
+        self.assertEquals(mock_action_pipeline_batch(mock_actions, exclude_conditional=True),
+                          [True, True, True, False, False, True, False, False])
+
+
+class PermissionCacheTest(DataTestCase):
+
+    def setUp(self):
+        from concord.utils.permission_cache import permission_cache, LRUBackend
+        self.cache = permission_cache
+        self.cache.configure(backend=LRUBackend())
+
+        self.client = Client(actor=self.users.pinoe)
+        self.instance = self.client.Community.create_community(name="USWNT")
+        self.client.update_target_on_all(self.instance)
+        self.client.Community.add_members_to_community(member_pk_list=[self.users.rose.pk])
+
+    def tearDown(self):
+        self.cache.disable()
+
+    def check_rose_can_add_role(self):
+        self.client.update_actor_on_all(actor=self.users.rose)
+        result = self.client.PermissionResource.has_permission(
+            self.client, "add_role_to_community", {"role_name": "forwards"})
+        self.client.update_actor_on_all(actor=self.users.pinoe)
+        self.client.set_mode_for_all(mode="default")
+        return result
+
+    def test_repeated_decision_is_cached(self):
+        self.cache.reset_stats()
+        self.assertFalse(self.check_rose_can_add_role())
+        self.assertFalse(self.check_rose_can_add_role())
+        self.assertEquals(self.cache.stats()["hits"], 1)
+        self.assertEquals(self.cache.stats()["misses"], 1)
+
+    def test_adding_permission_invalidates_cache(self):
+        self.assertFalse(self.check_rose_can_add_role())
+        self.client.PermissionResource.add_permission(
+            change_type=Changes().Communities.AddRole, actors=[self.users.rose.pk])
+        self.assertTrue(self.check_rose_can_add_role())
+
+    def test_changing_roles_invalidates_cache(self):
+        self.client.Community.add_role_to_community(role_name="forwards")
+        self.client.PermissionResource.add_permission(
+            change_type=Changes().Communities.AddRole, roles=["forwards"])
+        self.assertFalse(self.check_rose_can_add_role())
+        self.client.Community.add_people_to_role(role_name="forwards", people_to_add=[self.users.rose.pk])
+        self.assertTrue(self.check_rose_can_add_role())
+
+    def test_models_with_same_name_have_different_change_keys(self):
+        from concord.utils.permission_cache import get_change_fields_key
+
+        class FakeChange:
+            def __init__(self, value):
+                self.value = value
+
+            def serialize_fields(self):
+                return {"value": self.value}
+
+        namesake = self.client.Community.create_community(name="USWNT")
+        self.assertEquals(str(namesake), str(self.instance))
+        self.assertNotEqual(get_change_fields_key(FakeChange(namesake)), get_change_fields_key(FakeChange(self.instance)))
+        self.assertEquals(get_change_fields_key(FakeChange(Community.objects.get(pk=namesake.pk))),
+                          get_change_fields_key(FakeChange(namesake)))
+
 
 class TemplateTest(DataTestCase):
 
@@ -1670,6 +2222,34 @@ class PermissionedReadTest(DataTestCase):
         result = self.tobinClient.Action.view_fields(fields_to_include=["potato"])
         self.assertTrue(result, "Attempting to view field(s) potato that are not on target Resource object (1)")
 
+    def test_compiled_filters_cached_by_manager_version(self):
+
+        from concord.conditionals.utils import get_compiled_filters
+
+        action, permission = self.client.PermissionResource.add_permission(change_type=Changes().Actions.View, roles=["forwards"])
+        self.client.update(target=permission)
+        self.client.Conditional.add_condition(condition_type="LimitedFieldsFilter",
+            condition_data={"limited_fields": json.dumps(["name", "id"])})
+
+        # Filters are compiled once, with their configuration parsed, and shared by copies of the manager
+        manager = PermissionsItem.objects.get(pk=permission.pk).condition
+        filters = get_compiled_filters(manager)
+        element_id = manager.get_element_ids()[0]
+        self.assertEquals(filters[element_id].parsed_limited_fields, {"name", "id"})
+        self.assertIs(get_compiled_filters(PermissionsItem.objects.get(pk=permission.pk).condition), filters)
+
+        # Changing the conditions bumps the manager's version, and the filters are recompiled
+        version = manager.version
+        manager.edit_condition(element_id, {"condition_data": {"limited_fields": json.dumps(["name"])}})
+        self.assertEquals(get_compiled_filters(manager)[element_id].parsed_limited_fields, {"name"})  # not cached
+        self.assertIs(get_compiled_filters(PermissionsItem.objects.get(pk=permission.pk).condition), filters)
+        with authorize_save():
+            manager.save()
+        self.assertEquals(manager.version, version + 1)
+        self.assertEquals(get_compiled_filters(manager)[element_id].parsed_limited_fields, {"name"})
+        action, result = self.tobinClient.Action.view_fields(fields_to_include=["id"])
+        self.assertEquals(action.status, "rejected")
+
     def test_multiple_readpermissions(self):
 
         # Permission 1: user Tobin can only see field "name"
@@ -1763,6 +2343,38 @@ class CommentTest(DataTestCase):
         comments = self.client.Comment.get_all_comments_on_target()  # refresh
         self.assertEquals(list(comments), [])
 
+    def test_nested_comment_permissions_fetched_in_one_query(self):
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from concord.actions.utils import MockAction
+        from concord.resources.models import CommentCatcher
+        from concord.resources.state_changes import AddCommentStateChange
+        from concord.utils.pipelines import specific_permission_pipeline
+
+        # Pinoe comments on an action, creating a comment catcher owned by the community
+        self.client.Comment.set_target(self.resource.get_actions()[0])
+        self.client.Comment.add_comment(text="Let's add some players")
+        catcher = CommentCatcher.objects.get()
+
+        # Rose may comment on the catcher directly, and as a forward may comment on anything in the community
+        self.client.Community.add_people_to_role(role_name="forwards", people_to_add=[self.users.rose.pk])
+        for target, data in [(self.instance, {"roles": ["forwards"]}), (catcher, {"actors": [self.users.rose.pk]})]:
+            self.client.PermissionResource.set_target(target)
+            self.client.PermissionResource.add_permission(change_type=Changes().Resources.AddComment, **data)
+
+        # Permissions on the catcher and the community are fetched in a single query
+        mock_action = MockAction(change=AddCommentStateChange(text="Agreed"), actor=self.users.rose, target=catcher)
+        with CaptureQueriesContext(connection) as context:
+            match = specific_permission_pipeline(mock_action, Client())
+        permission_queries = [query for query in context.captured_queries
+                              if "permission_resources_permissionsitem" in query["sql"]]
+        self.assertEquals(len(permission_queries), 1)
+
+        # The permission set on the catcher wins over the one set on its owner
+        self.assertEquals(match.status, "approved")
+        self.assertIsNone(match.matched_role)
+
 
 class SimpleListTest(DataTestCase):
 
@@ -1973,6 +2585,75 @@ class ConsensusConditionTest(DataTestCase):
         self.client.ConsensusCondition.resolve()
         self.assertEquals(self.condition_item.condition_status(), "approved")
 
+    def test_respond_in_bulk(self):
+
+        # add & trigger condition
+        action, result = self.client.Conditional.add_condition(
+            condition_type="consensuscondition", permission_data=self.permission_data)
+        self.client.update_actor_on_all(self.users.midge)
+        self.trigger_action, result = self.client.Community.change_name_of_community(name="United States Women's National Team")
+        self.condition_item = self.client.Conditional.get_condition_items_for_action(action_pk=self.trigger_action.pk)[0]
+        log_count = len(self.trigger_action.get_logs())
+
+        # Rose, Midge and Lindsey respond at once, while Christen isn't a participant
+        self.client.update_target_on_all(self.condition_item)
+        responses = self.client.ConsensusCondition.respond_in_bulk(responses=[
+            (self.users.rose, "support"), (self.users.midge, "stand aside"), (self.users.christen, "block"),
+            (self.users.lindsey, "support with reservations")])
+        self.assertEquals([response[0].status for response in responses],
+                          ["implemented", "implemented", "rejected", "implemented"])
+        self.assertDictEqual(self.client.ConsensusCondition.get_current_results(),
+                          {"8": "no response", "2": "support", "11": "support with reservations", "12": "stand aside"})
+        self.assertEquals(len(Action.objects.get(pk=self.trigger_action.pk).get_logs()), log_count + 1)
+
+    def test_check_condition_status_skips_consensus_past_deadline(self):
+
+        # add & trigger condition, and let the minimum duration pass
+        action, result = self.client.Conditional.add_condition(
+            condition_type="consensuscondition", permission_data=self.permission_data)
+        self.client.update_actor_on_all(self.users.midge)
+        self.trigger_action, result = self.client.Community.change_name_of_community(name="United States Women's National Team")
+        self.condition_item = self.client.Conditional.get_condition_items_for_action(action_pk=self.trigger_action.pk)[0]
+        ConsensusCondition.objects.filter(pk=self.condition_item.pk).update(
+            deadline=timezone.now() - timedelta(hours=1), discussion_starts=timezone.now() - timedelta(hours=49))
+
+        # consensus is only resolved manually, so it's never due and neither run of the command retries it
+        self.assertFalse(ConsensusCondition.get_due_conditions().exists())
+        with patch.object(retry_action_signal, "send") as send:
+            call_command("check_condition_status")
+            call_command("check_condition_status")
+        self.assertEquals(send.call_count, 0)
+        self.assertEquals(Action.objects.get(pk=self.trigger_action.pk).status, "waiting")
+
+    def test_response_counts(self):
+
+        # add & trigger condition
+        action, result = self.client.Conditional.add_condition(
+            condition_type="consensuscondition", permission_data=self.permission_data)
+        self.client.update_actor_on_all(self.users.midge)
+        self.trigger_action, result = self.client.Community.change_name_of_community(name="United States Women's National Team")
+        self.condition_item = self.client.Conditional.get_condition_items_for_action(action_pk=self.trigger_action.pk)[0]
+        self.assertEquals(self.condition_item.get_response_counts()["no response"], 4)
+
+        # counts move with each response, and the result is computed from them without querying
+        self.client.update_target_on_all(self.condition_item)
+        self.client.update_actor_on_all(self.users.rose)
+        self.client.ConsensusCondition.respond(response="block")
+        self.client.ConsensusCondition.respond(response="support")
+        self.client.update_actor_on_all(self.users.midge)
+        self.client.ConsensusCondition.respond(response="support")
+        self.condition_item.refresh_from_db()
+        self.assertDictEqual(self.condition_item.get_response_counts(),
+            {"support": 2, "support with reservations": 0, "stand aside": 0, "block": 0, "no response": 2})
+        with self.assertNumQueries(0):
+            self.assertEquals(self.condition_item.current_result(), "approved")
+        with self.assertNumQueries(1):  # for the per-participant responses
+            display_fields = {field["field_name"]: field["field_value"] for field in self.condition_item.display_fields()}
+        self.assertEquals(display_fields["response_counts"]["support"], 2)
+        self.assertEquals(display_fields["responses"], self.condition_item.get_responses())
+        self.assertTrue(self.condition_item.is_participant(self.users.rose))
+        self.assertFalse(self.condition_item.is_participant(self.users.christen))
+
     def test_loose_consensus_reject(self):
 
         # add & trigger condition
@@ -1,4 +1,5 @@
 import inspect, json
+from collections import defaultdict
 
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import FieldDoesNotExist
@@ -6,40 +7,138 @@ from django.core.exceptions import FieldDoesNotExist
 from concord.utils.lookups import get_concord_class
 
 
+JSON_PRIMITIVES = (str, int, float, bool, type(None))
+
+
 def recursively_serialize(field):
-    """Tests if a field can be serialized. If this causes an error, crawls through structure and keeps attempting
-    to serialize things."""
+    """Returns a json-serializable version of the field, walking through lists and dicts and calling serialize()
+    on anything which has it. Values which can't be serialized become None."""
 
-    try:  # maybe the field is already serializable
-        json.dumps(field)
+    if isinstance(field, JSON_PRIMITIVES):
         return field
-    except TypeError:
-        pass
 
-    try:  # maybe the field is directly serializable
-        field = field.serialize()
-        return field
-    except AttributeError:
-        pass
+    if isinstance(field, dict):
+        return {key: recursively_serialize(value) for key, value in field.items()}
+
+    if isinstance(field, (list, tuple)):
+        new_field = [recursively_serialize(item) for item in field]
+        return tuple(new_field) if isinstance(field, tuple) else new_field
+
+    if hasattr(field, "serialize"):  # maybe the field is directly serializable
+        return field.serialize()
 
     if field.__class__.__name__ == "User":  # inbuilt user model needs special handling
         return {"class": field.__class__.__name__, "concord_dict": True, "pk": field.pk}
 
-    # crawl through structures to find the unserializable thing
+    return None
 
-    if type(field) == list:
-        new_field = []
-        for item in field:
-            new_item = recursively_serialize(item)
-            new_field.append(new_item)
-        return new_field
 
-    if type(field) == dict:
-        new_field = {}
-        for key, value in field.items():
-            new_value = recursively_serialize(value)
-            new_field.update({key: new_value})
-        return new_field
+# Field lists and deserializers are computed once per class, keyed by (class, kind)
+schema_cache = {}
+
+# Concord field types whose values are usually JSON primitives, which need no deserializing
+PRIMITIVE_FIELD_TYPES = ("CharField", "IntegerField", "BooleanField")
+
+
+def get_default_serializable_fields(cls):
+    """Gets the fields to serialize for a class with no concord fields or serializable_fields attribute: the
+    model fields for Django models, otherwise the parameters of __init__."""
+
+    if (cls, "default") not in schema_cache:
+        if hasattr(cls, "DoesNotExist"):
+            fields = [f.name for f in cls._meta.fields]
+        else:
+            params = dict(inspect.signature(cls.__init__).parameters)
+            for name in ["self", "args", "kwargs"]:
+                params.pop(name, None)
+            fields = list(params.keys())
+        schema_cache[(cls, "default")] = fields
+
+    return schema_cache[(cls, "default")]
+
+
+##########################
+### Compact wire format ###
+##########################
+
+# Serialized concord dicts repeat "class" and "concord_dict" and every field name at each level of nesting. The
+# compact format lists each (class, field names) combination once in a table, and encodes each object as
+# {"~": [table index, *field values]}, with trailing None values omitted. Payloads look like:
+#
+#     {"v": 1, "t": [["AddRowStateChange", ["row_content", "index"]]], "d": {"~": [0, "new row"]}}
+
+COMPACT_FORMAT_VERSION = 1
+
+
+def encode_compact(data):
+    """Encodes serialized data, as returned by serialize(), in the compact format."""
+
+    table, table_index = [], {}
+
+    def encode(value):
+        if isinstance(value, dict):
+            if value.get("concord_dict") and "class" in value:
+                field_names = tuple(key for key in value if key not in ["class", "concord_dict"])
+                key = (value["class"], field_names)
+                if key not in table_index:
+                    table_index[key] = len(table)
+                    table.append([value["class"], list(field_names)])
+                values = [encode(value[field_name]) for field_name in field_names]
+                while values and values[-1] is None:
+                    values.pop()
+                return {"~": [table_index[key]] + values}
+            if "~" in value:
+                raise ValueError("Dicts with the key '~' can't be encoded in the compact format")
+            return {key: encode(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [encode(item) for item in value]
+        return value
+
+    encoded = encode(data)
+    return json.dumps({"v": COMPACT_FORMAT_VERSION, "t": table, "d": encoded}, separators=(",", ":"))
+
+
+def decode_compact(payload):
+    """Decodes a payload in the compact format back into serialized data, as returned by serialize()."""
+
+    table = payload["t"]
+
+    def decode(value):
+        if isinstance(value, dict):
+            if len(value) == 1 and "~" in value:
+                index, *values = value["~"]
+                class_name, field_names = table[index]
+                decoded = {"class": class_name, "concord_dict": True}
+                for position, field_name in enumerate(field_names):
+                    decoded[field_name] = decode(values[position]) if position < len(values) else None
+                return decoded
+            return {key: decode(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [decode(item) for item in value]
+        return value
+
+    return decode(payload["d"])
+
+
+def is_compact(data):
+    return isinstance(data, dict) and "class" not in data and data.get("v") == COMPACT_FORMAT_VERSION and \
+        "t" in data and "d" in data
+
+
+def load_payload(value):
+    """Loads a payload saved in either the compact or the regular format, returning serialized data."""
+    data = json.loads(value) if isinstance(value, str) else value
+    return decode_compact(data) if is_compact(data) else data
+
+
+def dump_payload(data, compact=False):
+    """Dumps serialized data to a string, in the compact format if compact is True and the data allows it."""
+    if compact:
+        try:
+            return encode_compact(data)
+        except ValueError:
+            pass
+    return json.dumps(data)
 
 
 def get_class_name(cls, field_dict):
@@ -54,34 +153,117 @@ def get_class_name(cls, field_dict):
     raise ValueError("Need class information to deserialize.")
 
 
-def recursively_deserialize(field):
+def is_model_reference(field):
+    """Returns True if the field is a serialized reference to an existing Django model."""
+    return type(field) == dict and "concord_dict" in field and "pk" in field and field["pk"] is not None
+
+
+class DeserializationContext:
+    """Resolves the model references in one or more decoded payloads together. Call collect on each payload,
+    and the references are then fetched with one in_bulk query per class the first time any of them is needed.
+    Each (class, pk) maps to a single instance, so a model referenced several times is only fetched once."""
+
+    def __init__(self, *payloads):
+        self.references = defaultdict(set)
+        self.instances = {}
+        for payload in payloads:
+            self.collect(payload)
+
+    def collect(self, field):
+        """Walks the decoded payload, recording the class name and pk of every model reference found."""
+        if is_model_reference(field):
+            self.references[field["class"]].add(int(field["pk"]))
+        elif type(field) == dict:
+            for value in field.values():
+                self.collect(value)
+        elif type(field) == list:
+            for item in field:
+                self.collect(item)
+
+    def resolve(self):
+        for class_name, pks in self.references.items():
+            object_class = get_concord_class(class_name)
+            for pk, instance in object_class.objects.in_bulk(list(pks)).items():
+                self.instances[(class_name, pk)] = instance
+        self.references.clear()
+
+    def get(self, class_name, pk):
+        """Gets the instance with the given class name and pk, raising DoesNotExist if there isn't one."""
+        if self.references:
+            self.resolve()
+        if (class_name, pk) not in self.instances:  # not collected ahead of time or doesn't exist
+            self.instances[(class_name, pk)] = get_concord_class(class_name).objects.get(pk=pk)
+        return self.instances[(class_name, pk)]
+
+
+def recursively_deserialize(field, context=None):
 
     if type(field) == dict and "concord_dict" in field:
 
         if "pk" in field and field["pk"] is not None:  # this is an existing Django model - fetch it
             class_name = get_class_name(None, field)
+            if context:
+                return context.get(class_name, int(field["pk"]))
             object_class = get_concord_class(class_name)
             return object_class.objects.get(pk=int(field["pk"]))
         else:                                          # create it from scratch
-            return ConcordConverterMixin.deserialize(field)
+            return ConcordConverterMixin.deserialize(field, context=context)
 
     if type(field) == list:
         new_field = []
         for item in field:
-            new_item = recursively_deserialize(item)
+            new_item = recursively_deserialize(item, context)
             new_field.append(new_item)
         return new_field
 
     if type(field) == dict:
         new_field = {}
         for key, value in field.items():
-            new_value = recursively_deserialize(value)
+            new_value = recursively_deserialize(value, context)
             new_field.update({key: new_value})
         return new_field
 
     return field
 
 
+def deserialize_primitive(field, context=None):
+    """Converter for fields declared with a primitive type. Returns primitives as they are, only walking the value
+    if it turns out not to be one."""
+    if isinstance(field, JSON_PRIMITIVES):
+        return field
+    return recursively_deserialize(field, context)
+
+
+class CompiledDeserializer:
+    """Deserializes field dicts into instances of a single class. The class and a converter for each of its
+    declared fields are resolved once, when the deserializer is built; fields that aren't declared fall back to
+    recursively_deserialize."""
+
+    def __init__(self, object_class):
+        self.object_class = object_class
+        self.converters = {}
+        if hasattr(object_class, "get_concord_fields_with_names"):
+            for field_name, field in object_class.get_concord_fields_with_names().items():
+                if field.__class__.__name__ in PRIMITIVE_FIELD_TYPES:
+                    self.converters[field_name] = deserialize_primitive
+
+    def __call__(self, field_dict, context=None):
+        new_dict = {}
+        for field_name, field in field_dict.items():
+            if field_name in ("class", "concord_dict"):
+                continue
+            new_dict[field_name] = self.converters.get(field_name, recursively_deserialize)(field, context)
+        return self.object_class(**new_dict)
+
+
+def get_deserializer(class_name):
+    """Gets the compiled deserializer for the class with the given name, building it the first time."""
+    object_class = get_concord_class(class_name)
+    if (object_class, "deserializer") not in schema_cache:
+        schema_cache[(object_class, "deserializer")] = CompiledDeserializer(object_class)
+    return schema_cache[(object_class, "deserializer")]
+
+
 class ConcordConverterMixin(object):
     """This object is designed to be mixed in with any Concord object that may have to convert between formats.
     This includes non-permissioned models like Action and objects that aren't directly associated with a DB table,
@@ -95,10 +277,8 @@ class ConcordConverterMixin(object):
         object_dict = {"class": self.__class__.__name__, "concord_dict": True}
 
         for field_name in serializable_fields:
-            field = recursively_serialize(getattr(self, field_name))
-            object_dict.update({field_name: field})
+            object_dict[field_name] = recursively_serialize(getattr(self, field_name))
 
-        json.dumps(object_dict)  # will raise exception if this doesn't work - better to catch it here
         return object_dict
 
     def serialize(self, **kwargs):
@@ -117,17 +297,10 @@ class ConcordConverterMixin(object):
         if not serializable_fields:
             serializable_fields = getattr(self, "serializable_fields", None)
 
-        if not serializable_fields and hasattr(self, "DoesNotExist"):
-            serializable_fields = [f.name for f in self._meta.fields]
-
         # FIXME: get rid of serializable fields logic, no one is using it
 
-        if not serializable_fields and not hasattr(self, "DoesNotExist"):
-            params = dict(inspect.signature(self.__init__).parameters)
-            params.pop("self", None)
-            params.pop("args", None)
-            params.pop("kwargs", None)
-            serializable_fields = [param_name for param_name, value in params.items()]
+        if not serializable_fields:
+            serializable_fields = get_default_serializable_fields(self.__class__)
 
         if kwargs.pop("to_json", None):
             return json.dumps(self._serialize_fields(serializable_fields))
@@ -135,29 +308,23 @@ class ConcordConverterMixin(object):
         return self._serialize_fields(serializable_fields)
 
     @classmethod
-    def _deserialize_fields(cls, field_dict):
+    def _deserialize_fields(cls, field_dict, context=None):
 
         if not isinstance(field_dict, dict): return field_dict
 
         class_name = get_class_name(cls, field_dict)
-
-        field_dict.pop("concord_dict", None)
-        new_dict = {}
-        for field_name, field in field_dict.items():
-            new_field = recursively_deserialize(field)
-            new_dict.update({field_name: new_field})
-
-        object_class = get_concord_class(class_name)
-        return object_class(**new_dict)
+        return get_deserializer(class_name)(field_dict, context)
 
     @classmethod
-    def deserialize(cls, serialized_value=None, **kwargs):
+    def deserialize(cls, serialized_value=None, context=None, **kwargs):
         """Takes in a serialized dict and returns an instantiated Python object.  Used in conjunction with
         serialize.
         Determines what Python class to deserialize into based on, first, the class kwarg passed in via serialized
         dict. This should almost always be passed in, however if it's not we can try to see what class is calling it,
         and if it's a non-mixin class we assume this is the class we want to instantiate.  Otherwise we raise an
         exception. If a given field is itself a concord_dict, calls deserialize on it.
+        Models referenced in the serialized value are fetched together via a DeserializationContext. Pass one in to
+        share it across several serialized values.
         # FIXME: does this create a new target in the DB every time we deserialize an action with the same target?
         # or create a new user?
         """
@@ -173,7 +340,10 @@ class ConcordConverterMixin(object):
             except TypeError:
                 pass
 
-        return cls._deserialize_fields(kwargs)
+        if context is None:
+            context = DeserializationContext(kwargs)
+
+        return cls._deserialize_fields(kwargs, context)
 
     def db_lookup_info(self, **kwargs):
         """Takes a Django model and returns the content type and pk, allowing us to look up the correct row
@@ -205,7 +375,10 @@ class ConcordConverterMixin(object):
 
     @classmethod
     def get_concord_fields_with_names(cls):
-        return {field_name: field for field_name, field in cls.__dict__.items() if hasattr(field, "value")}
+        if (cls, "concord_fields") not in schema_cache:
+            schema_cache[(cls, "concord_fields")] = {
+                field_name: field for field_name, field in cls.__dict__.items() if hasattr(field, "value")}
+        return schema_cache[(cls, "concord_fields")]
 
     @classmethod
     def get_concord_field_instances(cls):
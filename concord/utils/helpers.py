@@ -1,4 +1,4 @@
-from concord.utils.lookups import get_all_state_changes, get_all_clients
+from concord.utils.lookups import get_all_state_changes, get_all_clients, registry
 
 
 class Attributes(object):
@@ -33,28 +33,82 @@ class Client(object):
 
     limit_to is a list of client names, if supplied actors and targets will only be supplied to
     the specified clients.
+
+    Clients are instantiated lazily, the first time they're accessed as attributes, so creating a Client is cheap.
+    The table of client classes is shared across instances.
     """
 
     community_client_override = None
 
     def __init__(self, actor=None, target=None, limit_to=None):
+        self.actor = actor
+        self.target = target
+        self.limit_to = limit_to
+        self.mode = None
+        self.updated = {}   # actor and/or target set on all clients after init, via update_actor/target_on_all
+        self.instantiated_clients = {}
+
+    @staticmethod
+    def get_client_classes():
+        """Gets a dict of client attribute names to client classes, computed once and cached in the registry."""
+
+        def map_client_classes():
+            client_classes = {}
+            for client_class in get_all_clients():
+                client_attribute_name = client_class.__name__.replace("Client", "")
+                if client_attribute_name == "Community":       # Helps deal with multiple community groups
+                    client_attribute_name = "Concord" + client_attribute_name
+                client_classes[client_attribute_name] = client_class
+            return client_classes
+
+        return registry.get().memoize("client_classes", map_client_classes)
+
+    @staticmethod
+    def get_community_client_name():
+        """Projects that use Concord may create a new model and client, descending from the Community model and
+        CommunityClient. To handle this scenario, we look for Clients with an attribute community_model and, if
+        something other than the CommunityClient exists, we use that."""
 
-        self.client_names = []
-
-        for client_class in get_all_clients():
-
-            client_attribute_name = client_class.__name__.replace("Client", "")
-
-            if not limit_to or client_attribute_name in limit_to:
-                client_instance = client_class(actor=actor, target=target)
-            else:
-                client_instance = client_class()
+        def find_community_client_name():
+            community_clients = [(name, client_class) for name, client_class in Client.get_client_classes().items()
+                                 if hasattr(client_class, "community_model")]
+            if len(community_clients) == 1:
+                return community_clients[0][0]
+            for name, client_class in community_clients:
+                if client_class.__name__ != "CommunityClient":
+                    return name
 
-            if client_attribute_name == "Community":       # Helps deal with multiple community groups
-                client_attribute_name = "Concord" + client_attribute_name
+        return registry.get().memoize("community_client_name", find_community_client_name)
 
-            setattr(self, client_attribute_name, client_instance)
-            self.client_names.append(client_attribute_name)
+    @property
+    def client_names(self):
+        return list(self.get_client_classes().keys())
+
+    def __getattr__(self, name):
+        """Called only when normal attribute lookup fails, which is the case for any client that hasn't been
+        instantiated yet.  Instantiates the client and sets it as an attribute so later lookups are direct."""
+
+        client_class = None if name.startswith("_") else self.get_client_classes().get(name)
+        if not client_class:
+            raise AttributeError(f"No attribute {name} on {self.__class__.__name__}")
+
+        # limit_to uses client class names without "Client", so the community client is "Community" rather than
+        # "ConcordCommunity"
+        if not self.limit_to or client_class.__name__.replace("Client", "") in self.limit_to:
+            client_instance = client_class(actor=self.actor, target=self.target)
+        else:
+            client_instance = client_class()
+
+        if "actor" in self.updated:
+            client_instance.set_actor(actor=self.updated["actor"])
+        if "target" in self.updated:
+            client_instance.set_target(target=self.updated["target"])
+        if self.mode:
+            client_instance.mode = self.mode
+
+        setattr(self, name, client_instance)
+        self.instantiated_clients[name] = client_instance
+        return client_instance
 
     def get_clients(self):
         """Gets a list of client objects set as attributes on Client()."""
@@ -62,12 +116,14 @@ class Client(object):
 
     def update_actor_on_all(self, actor):
         """Update actor for all clients."""
-        for client in self.get_clients():
+        self.updated["actor"] = actor
+        for client in self.instantiated_clients.values():
             client.set_actor(actor=actor)
 
     def update_target_on_all(self, target):
         """Update target for all clients."""
-        for client in self.get_clients():
+        self.updated["target"] = target
+        for client in self.instantiated_clients.values():
             client.set_target(target=target)
 
     def update(self, *, target=None, actor=None):
@@ -79,7 +135,8 @@ class Client(object):
             print("Warning: tried to update client with neither target nor actor")
 
     def set_mode_for_all(self, mode):
-        for client in self.get_clients():
+        self.mode = mode
+        for client in self.instantiated_clients.values():
             client.mode = mode
 
     def get_method(self, method_name):
@@ -92,19 +149,12 @@ class Client(object):
 
     @property
     def Community(self):
-        """Projects that use Concord may create a new model and client, descending from the Community model and
-        CommunityClient. To handle this scenario, we look for Clients with an attribute community_model and, if
-        something other than the CommunityClient exists, we use that. Users can override this behavior by
-        explicitly setting community_client_override to whatever client they want to use."""
+        """Returns the community client. Users can override the default behavior (see get_community_client_name)
+        by explicitly setting community_client_override to whatever client they want to use."""
 
         if self.community_client_override:
             return self.community_client_override
 
-        community_clients = [client for client in self.get_clients() if hasattr(client, "community_model")]
-
-        if len(community_clients) == 1:
-            return community_clients[0]
-
-        for client in community_clients:
-            if client.__class__.__name__ != "CommunityClient":
-                return client
+        community_client_name = self.get_community_client_name()
+        if community_client_name:
+            return getattr(self, community_client_name)
@@ -19,7 +19,15 @@ def get_all_apps(return_as="app_configs"):
     return relevant_apps
 
 
-def get_all_convertible_classes():
+################
+### Scanners ###
+################
+
+# The scanners below reflect over app modules to find Concord classes. They're expensive, so they should only be
+# called when building the registry. Everything else should go through the lookup functions further down.
+
+
+def _scan_convertible_classes():
     convertible_classes = []
     for app in get_all_apps():
         if hasattr(app, "get_all_modules"):
@@ -32,14 +40,7 @@ def get_all_convertible_classes():
     return convertible_classes + [User]  # FIXME: may need to do a proxy :/
 
 
-def get_concord_class(class_name):
-    for class_obj in get_all_convertible_classes():
-        if class_obj.__name__ == class_name:  # may not work, may need to pass name from get_all_convertible_classes
-            return class_obj
-
-
-def get_all_permissioned_models():
-    """Gets all non-abstract permissioned models in the system."""
+def _scan_permissioned_models():
     permissioned_models = []
     for app in get_all_apps():
         for model in app.get_models():
@@ -48,16 +49,7 @@ def get_all_permissioned_models():
     return permissioned_models
 
 
-def get_all_community_models():
-    """Gets all non-abstract permissioned models with attr is_community equal to True."""
-    community_models = []
-    for model in get_all_permissioned_models():
-        if hasattr(model, "is_community") and model.is_community:
-            community_models.append(model)
-    return community_models
-
-
-def get_all_concord_models():
+def _scan_concord_models():
     models = []
     for app in get_all_apps():
         module = app.get_concord_module("concord_models")
@@ -68,8 +60,7 @@ def get_all_concord_models():
     return models
 
 
-def get_all_clients():
-    """Gets all clients descended from Base Client in Concord and the app using it."""
+def _scan_clients():
     clients = []
     for app in get_all_apps():
         client_module = app.get_concord_module("client")
@@ -80,19 +71,16 @@ def get_all_clients():
     return clients
 
 
-def get_acceptance_conditions():
-    """Gets all possible condition models in Concord and the app using it."""
+def _scan_acceptance_conditions():
     conditions = []
-    existing_apps = get_all_apps()
-    for app in existing_apps:
+    for app in get_all_apps():
         for model in app.get_models():
             if hasattr(model, "is_condition") and model.is_condition and not model._meta.abstract:
                 conditions.append(model)
     return conditions
 
 
-def get_filter_conditions():
-    """Gets all possible filter_conditions in Concord and the app using it."""
+def _scan_filter_conditions():
     all_conditions = []
     for app in get_all_apps():
         conditions_module = app.get_concord_module("filter_conditions")
@@ -101,30 +89,18 @@ def get_filter_conditions():
     return all_conditions
 
 
-def get_all_conditions():
-    """Gets all possible filter and acceptance condition models in Concord and the app using it."""
-    return get_acceptance_conditions() + get_filter_conditions()
-
-
-def get_all_state_changes():
-    """Gets all possible state changes in Concord and the app using it."""
-    all_state_changes = []
+def _scan_state_changes_by_app():
+    """Returns a dict of app label to state change members found in that app's state_changes module. Note that
+    members include state changes imported into the module, as well as those defined there."""
+    state_changes_by_app = {}
     for app in get_all_apps():
         state_changes_module = app.get_concord_module("state_changes")
         state_changes = inspect.getmembers(state_changes_module)  # get_members returns (name, value) tuple
-        all_state_changes += [value for (name, value) in state_changes if "StateChange" in name]
-    return all_state_changes
-
-
-def get_all_foundational_state_changes():
-    """Gets all state changes in Concord and app using it that are foundational."""
-    return [change for change in get_all_state_changes() if change.is_foundational]
-
+        state_changes_by_app[app.label] = [(name, value) for (name, value) in state_changes if "StateChange" in name]
+    return state_changes_by_app
 
-def get_all_templates():
-    """Get all classes with TemplateLibraryObject as parent defined in template_library files, either in Concord
-    or app using Concord."""
 
+def _scan_templates():
     template_classes = []
 
     from django.conf import settings
@@ -140,6 +116,168 @@ def get_all_templates():
     return template_classes
 
 
+def _scan_default_permissions():
+    default_permissions = {}
+    for app in get_all_apps():
+        default_permissions_module = app.get_concord_module("default_permissions")
+        members = inspect.getmembers(default_permissions_module)
+        if members:
+            for name, value in members:
+                if name == "DEFAULT_PERMISSIONS":
+                    for model_type, permissions in value.items():
+                        if model_type not in default_permissions:
+                            default_permissions[model_type] = []
+                        default_permissions[model_type] += permissions
+    return default_permissions
+
+
+################
+### Registry ###
+################
+
+
+class ConcordRegistry(object):
+    """Holds the results of scanning Concord apps (and the app using Concord) for clients, state changes,
+    conditions, models and so on, along with dicts that let us look them up by name in constant time.
+
+    The registry is built once, when the apps are ready (see ConcordAppConfig.ready), and is not modified
+    afterwards, with the exception of the memo, which caches values derived from the registry. If classes are
+    added or removed at runtime, as sometimes happens in tests, call rebuild_registry()."""
+
+    def __init__(self):
+        self.is_built = False
+        self._memo = {}
+
+    def build(self):
+        """Scans all apps and populates the registry."""
+
+        self.convertible_classes = tuple(_scan_convertible_classes())
+        self.permissioned_models = tuple(_scan_permissioned_models())
+        self.community_models = tuple(model for model in self.permissioned_models
+                                      if hasattr(model, "is_community") and model.is_community)
+        self.concord_models = tuple(_scan_concord_models())
+        self.clients = tuple(_scan_clients())
+        self.acceptance_conditions = tuple(_scan_acceptance_conditions())
+        self.filter_conditions = tuple(_scan_filter_conditions())
+        self.templates = tuple(_scan_templates())
+        self.default_permissions = _scan_default_permissions()
+
+        self.state_changes_by_app, self.state_changes = {}, []
+        for app_label, members in _scan_state_changes_by_app().items():
+            self.state_changes_by_app[app_label] = {name: value for (name, value) in members}
+            self.state_changes += [value for (name, value) in members]
+        self.state_changes = tuple(self.state_changes)
+
+        # Where several classes share a name, the first one found wins, matching the old linear scans
+        self.convertible_classes_by_name = {}
+        for class_obj in self.convertible_classes:
+            self.convertible_classes_by_name.setdefault(class_obj.__name__, class_obj)
+
+        self.state_changes_by_type = {}
+        for change in self.state_changes:
+            if hasattr(change, "get_change_type"):
+                self.state_changes_by_type.setdefault(change.get_change_type(), change)
+
+        self.filter_conditions_by_name = {}
+        for condition in self.filter_conditions:
+            self.filter_conditions_by_name.setdefault(condition.__name__, condition)
+
+        self._memo = {}
+        self.is_built = True
+        logger.debug(f"Built Concord registry with {len(self.convertible_classes)} convertible classes, " +
+                     f"{len(self.state_changes)} state changes and {len(self.clients)} clients")
+
+    def get(self):
+        """Returns the registry, building it first if it hasn't been built yet."""
+        if not self.is_built:
+            self.build()
+        return self
+
+    def memoize(self, key, func):
+        """Caches the result of calling func under the given key until the registry is rebuilt. Used for values
+        derived from the registry which are expensive to compute but never change at runtime."""
+        if key not in self._memo:
+            self._memo[key] = func()
+        return self._memo[key]
+
+
+registry = ConcordRegistry()
+
+
+def rebuild_registry():
+    """Rescans all apps and rebuilds the registry. Typically only needed by tests."""
+    registry.build()
+    return registry
+
+
+###############
+### Lookups ###
+###############
+
+
+def get_all_convertible_classes():
+    return list(registry.get().convertible_classes)
+
+
+def get_concord_class(class_name):
+    return registry.get().convertible_classes_by_name.get(class_name)
+
+
+def get_all_permissioned_models():
+    """Gets all non-abstract permissioned models in the system."""
+    return list(registry.get().permissioned_models)
+
+
+def get_all_community_models():
+    """Gets all non-abstract permissioned models with attr is_community equal to True."""
+    return list(registry.get().community_models)
+
+
+def get_all_concord_models():
+    return list(registry.get().concord_models)
+
+
+def get_all_clients():
+    """Gets all clients descended from Base Client in Concord and the app using it."""
+    return list(registry.get().clients)
+
+
+def get_acceptance_conditions():
+    """Gets all possible condition models in Concord and the app using it."""
+    return list(registry.get().acceptance_conditions)
+
+
+def get_filter_conditions():
+    """Gets all possible filter_conditions in Concord and the app using it."""
+    return list(registry.get().filter_conditions)
+
+
+def get_filter_condition_class(condition_name):
+    """Gets a filter condition class given its name, or None if there is no such filter condition."""
+    return registry.get().filter_conditions_by_name.get(condition_name)
+
+
+def get_all_conditions():
+    """Gets all possible filter and acceptance condition models in Concord and the app using it."""
+    return get_acceptance_conditions() + get_filter_conditions()
+
+
+def get_all_state_changes():
+    """Gets all possible state changes in Concord and the app using it."""
+    return list(registry.get().state_changes)
+
+
+def get_all_foundational_state_changes():
+    """Gets all state changes in Concord and app using it that are foundational."""
+    return [change for change in get_all_state_changes() if change.is_foundational]
+
+
+def get_all_templates():
+    """Get all classes with TemplateLibraryObject as parent defined in template_library files, either in Concord
+    or app using Concord."""
+    return list(registry.get().templates)
+
+
 def process_field_type(field):
     """Helper method to inspect field and return appropriate type."""
     if field.name in ["actor", "commenter", "author"]:
@@ -181,15 +319,16 @@ def get_all_dependent_fields():
 
 def get_state_changes_for_app(app_name):
     """Given an app name, gets state_changes as list of state change objects."""
-    app_config = apps.get_app_config(app_name)
-    state_changes_module = app_config.get_concord_module("state_changes")
-    state_changes = inspect.getmembers(state_changes_module)  # get_members returns (name, value) tuple
-    return [value for (name, value) in state_changes if "StateChange" in name]
+    return list(registry.get().state_changes_by_app.get(app_name, {}).values())
 
 
 def get_state_change_object(state_change_name):
     """Given a full name string, gets the state change object."""
 
+    state_change_object = registry.get().state_changes_by_type.get(state_change_name)
+    if state_change_object:
+        return state_change_object
+
     name_elements = state_change_name.split(".")
 
     if name_elements[0] == "concord":  # format: concord.app.state_changes.state_change_object
@@ -199,36 +338,25 @@ def get_state_change_object(state_change_name):
         app_name = name_elements[0]
         change_name = name_elements[2]
 
-    for state_change_object in get_state_changes_for_app(app_name):
-        if state_change_object.__name__ == change_name:
-            return state_change_object
+    return registry.get().state_changes_by_app.get(app_name, {}).get(change_name)
 
 
 def get_state_changes_settable_on_model(model_class):
     """Gets all state changes a given model can be set on.  If state_changes is not passed in, checks against
     all possible state_changes."""
-    state_changes = get_all_state_changes()
-    matching_state_changes = []
 
-    for change in state_changes:
-        if hasattr(change, "can_set_on_model") and change.can_set_on_model(model_class.__name__) \
-                and change.__name__ != "BaseStateChange":
-            matching_state_changes.append(change)
+    def find_matching_state_changes():
+        matching_state_changes = []
+        for change in get_all_state_changes():
+            if hasattr(change, "can_set_on_model") and change.can_set_on_model(model_class.__name__) \
+                    and change.__name__ != "BaseStateChange":
+                matching_state_changes.append(change)
+        return tuple(matching_state_changes)
 
-    return matching_state_changes
+    return list(registry.get().memoize(("settable_on_model", model_class), find_matching_state_changes))
 
 
 def get_default_permissions():
     """Get default permissions for permissioned models."""
-    default_permissions = {}
-    for app in get_all_apps():
-        default_permissions_module = app.get_concord_module("default_permissions")
-        members = inspect.getmembers(default_permissions_module)
-        if members:
-            for name, value in members:
-                if name == "DEFAULT_PERMISSIONS":
-                    for model_type, permissions in value.items():
-                        if model_type not in default_permissions:
-                            default_permissions[model_type] = []
-                        default_permissions[model_type] += permissions
-    return default_permissions
+    default_permissions = registry.get().default_permissions
+    return {model_type: list(permissions) for model_type, permissions in default_permissions.items()}
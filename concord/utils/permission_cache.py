@@ -0,0 +1,235 @@
+"""
+This module implements an optional cache for permission decisions made by `has_permission`.
+
+The cache is disabled by default. To enable it, set PERMISSION_CACHE in settings, for example:
+
+    PERMISSION_CACHE = {"BACKEND": "lru", "MAX_SIZE": 10000}
+    PERMISSION_CACHE = {"BACKEND": "django", "CACHE_ALIAS": "default", "TIMEOUT": 3600}
+
+BACKEND may also be a dotted path to a custom backend class implementing the same methods as LRUBackend.
+
+Rather than deleting entries when something changes, we keep a version counter for each community and include it
+in the cache key. The counter is bumped whenever a permission, condition manager or the community itself (including
+its roles) is saved or deleted, so decisions made under an older version are never looked up again. Note that
+queryset.update() does not send signals and so will not invalidate the cache.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+
+################
+### Backends ###
+################
+
+
+class LRUBackend:
+    """In-process backend which holds up to max_size decisions, discarding the least recently used first."""
+
+    def __init__(self, max_size=10000, **kwargs):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def get_version(self, namespace):
+        return self.versions.get(namespace, 0)
+
+    def bump_version(self, namespace):
+        with self.lock:
+            self.versions[namespace] = self.versions.get(namespace, 0) + 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.versions.clear()
+
+
+class DjangoCacheBackend:
+    """Backend which stores decisions and version counters in one of the caches configured in the CACHES setting,
+    so that they can be shared between processes."""
+
+    def __init__(self, cache_alias="default", timeout=None, key_prefix="concord_permissions", **kwargs):
+        from django.core.cache import caches
+        self.cache = caches[cache_alias]
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    def get(self, key):
+        return self.cache.get(f"{self.key_prefix}:{key}")
+
+    def set(self, key, value):
+        self.cache.set(f"{self.key_prefix}:{key}", value, self.timeout)
+
+    def get_version(self, namespace):
+        return self.cache.get(f"{self.key_prefix}:version:{namespace}", 0)
+
+    def bump_version(self, namespace):
+        version_key = f"{self.key_prefix}:version:{namespace}"
+        try:
+            self.cache.incr(version_key)
+        except ValueError:  # key doesn't exist yet
+            if not self.cache.add(version_key, 1, None):
+                self.cache.incr(version_key)
+
+    def clear(self):
+        self.cache.clear()
+
+
+BACKENDS = {"lru": LRUBackend, "django": DjangoCacheBackend}
+
+
+def get_backend_from_settings():
+    """Instantiates the backend specified in the PERMISSION_CACHE setting, or returns None if not set."""
+    config = getattr(settings, "PERMISSION_CACHE", None)
+    if not config:
+        return None
+    config = dict(config)
+    backend = config.pop("BACKEND", "lru")
+    backend_class = BACKENDS[backend] if backend in BACKENDS else import_string(backend)
+    return backend_class(**{key.lower(): value for key, value in config.items()})
+
+
+#############
+### Cache ###
+#############
+
+
+def get_community_key(obj):
+    """Gets a string identifying the community that owns the object, without fetching the community."""
+    if getattr(obj, "is_community", False):
+        return f"{ContentType.objects.get_for_model(obj).pk}_{obj.pk}"
+    return f"{obj.owner_content_type_id}_{obj.owner_object_id}"
+
+
+def get_field_value_key(value):
+    """Gets a json-serializable key for a change field value that json can't encode itself. Saved models are
+    identified by content type and pk rather than by their string form, which needn't be unique."""
+    if isinstance(value, models.Model) and value.pk is not None:
+        return {"content_type": ContentType.objects.get_for_model(value).pk, "pk": value.pk}
+    if hasattr(value, "serialize"):
+        return value.serialize()
+    return f"{value.__class__.__module__}.{value.__class__.__qualname__}:{value}"
+
+
+def get_change_fields_key(change):
+    """Filters may read any field on the change object, so all of them are included in the cache key."""
+    return json.dumps(change.serialize_fields(), sort_keys=True, default=get_field_value_key)
+
+
+def matches_have_conditions(matches):
+    """Returns True if any of the matches, or matches nested within them, have a condition."""
+    for match in matches:
+        if getattr(match, "has_condition", False) or matches_have_conditions(getattr(match, "matches", [])):
+            return True
+    return False
+
+
+class PermissionCache:
+    """Caches the list of matches returned by has_permission. Decisions which depend on the state of conditions
+    (anything with a condition, for actions that aren't mocks) change over time and so are never cached."""
+
+    def __init__(self):
+        self.backend = None
+        self.is_configured = False
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, backend=None):
+        """Sets the backend. If no backend is passed in, uses the PERMISSION_CACHE setting. Passing in a backend
+        is mostly useful for tests."""
+        self.backend = backend if backend else get_backend_from_settings()
+        self.is_configured = True
+        self.reset_stats()
+
+    def disable(self):
+        self.backend = None
+        self.is_configured = True
+
+    @property
+    def enabled(self):
+        if not self.is_configured:
+            self.configure()
+        return self.backend is not None
+
+    def get_key(self, action):
+        target = action.target
+        actor_pk = action.actor.pk if action.actor else None
+        key_data = [
+            get_community_key(target), self.backend.get_version(get_community_key(target)),
+            ContentType.objects.get_for_model(target).pk, target.pk,
+            target.foundational_permission_enabled, target.governing_permission_enabled,
+            actor_pk, action.change.get_change_type(), get_change_fields_key(action.change),
+            action.__class__.__name__ == "MockAction"
+        ]
+        return hashlib.md5(json.dumps(key_data, default=str).encode()).hexdigest()
+
+    def fetch(self, action, compute):
+        """Returns the cached matches for the action, if any, otherwise calls compute(action) and caches the
+        result where it's safe to do so."""
+
+        if not self.enabled:
+            return compute(action)
+
+        key = self.get_key(action)
+        matches = self.backend.get(key)
+        if matches is not None:
+            self.hits += 1
+            return matches
+
+        self.misses += 1
+        matches = compute(action)
+        if action.__class__.__name__ == "MockAction" or not matches_have_conditions(matches):
+            self.backend.set(key, matches)
+        return matches
+
+    def invalidate(self, obj):
+        """Bumps the version of the community owning the object, so that decisions cached for that community
+        are no longer used."""
+        if self.enabled:
+            self.backend.bump_version(get_community_key(obj))
+
+    def clear(self):
+        if self.enabled:
+            self.backend.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else None}
+
+    def reset_stats(self):
+        self.hits, self.misses = 0, 0
+
+
+permission_cache = PermissionCache()
+
+
+def invalidate_permission_cache(sender, instance, **kwargs):
+    """Signal handler which invalidates cached decisions for the community owning the instance. Connected to
+    post_save and post_delete for permissions, condition managers and communities."""
+    permission_cache.invalidate(instance)
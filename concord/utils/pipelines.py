@@ -5,8 +5,13 @@ The `has_permission` function is called by external callers, while the rest of t
 has_permission.
 """
 import json
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
 
 from concord.utils.helpers import Client
+from concord.conditionals.utils import PrefetchedConditions
+from concord.utils.permission_cache import permission_cache
 
 
 class Match:
@@ -60,10 +65,12 @@ class Match:
 
 
 def determine_status(action, has_authority, has_condition, manager):
-    """Quick helper method to determine a pipeline's final status."""
+    """Quick helper method to determine a pipeline's final status. Condition instances are looked up in the
+    action's prefetched_conditions, if action_pipeline has set it, so they can be reused when creating conditions."""
     if not has_authority: return "rejected"
     if not has_condition: return "approved"
-    return Client().Conditional.check_condition_status(manager=manager, action=action)
+    return Client().Conditional.check_condition_status(
+        manager=manager, action=action, prefetched=getattr(action, "prefetched_conditions", None))
 
 
 def foundational_permission_pipeline(action, client, community):
@@ -81,7 +88,7 @@ def foundational_permission_pipeline(action, client, community):
 def governing_permission_pipeline(action, client, community):
     """Checks whether the actor behind the action has governing permission."""
 
-    has_authority, matched_role = client.Community.has_governing_authority(actor=action.actor)
+    has_authority, matched_role = client.Community.has_governing_authority(actor=action.actor, refresh_roles=False)
     has_condition = community.has_condition("governor")
     if has_authority and has_condition:
         manager = client.Conditional.get_condition_manager(community, "governor")
@@ -112,28 +119,30 @@ def check_specific_permission(action, client, permission):
                  has_condition=has_condition, condition_manager=manager, status=status, rejection=None)
 
 
-def specific_permission_pipeline(action, client):
+def specific_permission_pipeline(action, client, prefetched=None):
     """Looks for specific permissions matching the change type and configuration of the action. If found, evaluates
     if actor has the permission.
 
     We look at permissions set on the target, then permissions set on objects the target is nested within. If at any
     point we find an approved permission, we exit and return info for it. If we reach the end without approval, we
-    return any unresolved conditions we found along the way."""
+    return any unresolved conditions we found along the way.
+
+    Permissions on the target and all nested objects are fetched in a single query up front, unless prefetched is
+    passed in, in which case they're looked up there. See has_permission_batch."""
+
+    change_type = action.change.get_change_type()
+
+    if not prefetched:
+        nested_objects = {get_object_key(action.target): action.target.get_nested_objects()}
+        permissions = client.PermissionResource.get_specific_permissions_for_objects(
+            objects=[action.target] + nested_objects[get_object_key(action.target)], change_types=[change_type])
+        prefetched = PrefetchedPermissions(nested_objects=nested_objects, permissions=permissions)
 
-    client.PermissionResource.set_target(target=action.target)
     matches = []
 
-    # Get and check target level permissions
-    for permission in client.PermissionResource.get_specific_permissions(change_type=action.change.get_change_type()):
-        permission_dict = check_specific_permission(action, client, permission)
-        if permission_dict.status == "approved": return permission_dict
-        matches.append(permission_dict)
-
-    # If we're still here, that means nothing matched without a condition, so now we look for nested permissions
-    for nested_object in action.target.get_nested_objects():
-        client.PermissionResource.set_target(target=nested_object)
-        for permission in client.PermissionResource.get_specific_permissions(
-                change_type=action.change.get_change_type()):
+    # Check target level permissions first, then permissions on nested objects, in order
+    for obj in [action.target] + prefetched.get_nested_objects(action.target):
+        for permission in prefetched.get_permissions(obj, change_type):
             permission_dict = check_specific_permission(action, client, permission)
             if permission_dict.status == "approved": return permission_dict
             matches.append(permission_dict)
@@ -157,12 +166,41 @@ def has_permission(action):
     via a list of dictionaries (one for each pipeline).
 
     We preferentially enter the foundational pipeline if applicable. Otherwise we try the governing pipeline.
-    If not approved by governing pipeline, we try the specific pipeline."""
+    If not approved by governing pipeline, we try the specific pipeline.
+
+    If the permission cache is enabled, decisions may be returned from the cache. See utils/permission_cache.py."""
+    return permission_cache.fetch(action, check_permission)
+
+
+def owner_may_be_stale(target):
+    """Returns True if the target's owning community was loaded before the permission check started, either
+    because the target is the community itself, passed in by the caller, or because the owner is already cached on
+    the target. Otherwise get_owner loads it fresh, and its roles can't be stale."""
+    return getattr(target, "is_community", False) or target._meta.get_field("owner").is_cached(target)
+
+
+def check_permission(action):
+    """Gets the owning community and runs the action through the permission pipelines, bypassing the cache."""
 
     client = Client()
+    refresh_roles = owner_may_be_stale(action.target)
     community = client.Community.get_owner(owned_object=action.target)
     client.update_target_on_all(target=community)
 
+    return run_permission_pipelines(action, client, community, refresh_roles=refresh_roles)
+
+
+def run_permission_pipelines(action, client, community, prefetched=None, refresh_roles=True):
+    """Runs the action through the foundational, governing and specific pipelines, as appropriate. The client
+    passed in should have its targets set to the community.
+
+    If refresh_roles is True, the community's roles are checked for staleness once, up front, and treated as a
+    snapshot for the rest of the run. Pass refresh_roles=False if the community was just loaded or the caller has
+    already checked."""
+
+    if refresh_roles:
+        client.Community.refresh_roles_if_stale()
+
     if is_foundational(action):
         return [foundational_permission_pipeline(action, client, community)]
 
@@ -171,9 +209,117 @@ def has_permission(action):
         if governing_dict.status == "approved":
             return [governing_dict]
         else:
-            return [governing_dict, specific_permission_pipeline(action, client)]
+            return [governing_dict, specific_permission_pipeline(action, client, prefetched)]
+
+    return [specific_permission_pipeline(action, client, prefetched)]
+
+
+##############################
+### Batch Permission Check ###
+##############################
+
+
+def get_object_key(obj):
+    """Returns a tuple of content type pk and object pk which uniquely identifies a model instance."""
+    return (ContentType.objects.get_for_model(obj).pk, obj.pk)
+
+
+class PrefetchedPermissions:
+    """Helper class which holds the nested objects and specific permissions for a batch of actions, so the
+    pipelines can look them up instead of querying the database for each action."""
+
+    def __init__(self, nested_objects, permissions):
+        self.nested_objects = nested_objects  # dict of object key -> list of nested objects
+        self.permissions = permissions  # dict of (object key + change type) -> list of permissions
+
+    def get_nested_objects(self, target):
+        return self.nested_objects[get_object_key(target)]
 
-    return [specific_permission_pipeline(action, client)]
+    def get_permissions(self, obj, change_type):
+        return self.permissions.get(get_object_key(obj) + (change_type,), [])
+
+
+def prefetch_owners(targets):
+    """Fetches the owners of the given targets with one query per owner model and sets them on the targets, so
+    calling get_owner() doesn't hit the database. Communities own themselves, so they are skipped."""
+
+    owner_pks_by_content_type = defaultdict(set)
+    for target in targets:
+        if not getattr(target, "is_community", False) and target.owner_content_type_id and target.owner_object_id:
+            owner_pks_by_content_type[target.owner_content_type_id].add(target.owner_object_id)
+
+    owners = {}
+    for content_type_pk, owner_pks in owner_pks_by_content_type.items():
+        model_class = ContentType.objects.get_for_id(content_type_pk).model_class()
+        for pk, owner in model_class.objects.in_bulk(list(owner_pks)).items():
+            owners[(content_type_pk, pk)] = owner
+
+    for target in targets:
+        owner = owners.get((target.owner_content_type_id, target.owner_object_id))
+        if owner and not getattr(target, "is_community", False):
+            target.owner = owner
+
+
+def prefetch_leadership_condition_managers(communities):
+    """Fetches the owner and governor condition managers of the given communities in a single query and sets
+    them on the communities."""
+
+    from concord.conditionals.models import ConditionManager
+
+    manager_pks = set()
+    for community in communities:
+        manager_pks.update(filter(None, [community.owner_condition_id, community.governor_condition_id]))
+    if not manager_pks:
+        return
+
+    managers = ConditionManager.objects.in_bulk(list(manager_pks))
+    for community in communities:
+        if community.owner_condition_id in managers:
+            community.owner_condition = managers[community.owner_condition_id]
+        if community.governor_condition_id in managers:
+            community.governor_condition = managers[community.governor_condition_id]
+
+
+def has_permission_batch(actions):
+    """Equivalent to calling has_permission on each of the actions passed in, but fetches owning communities,
+    condition managers and specific permissions for the whole batch in a handful of set-based queries rather than
+    several queries per action. Returns a list with the list of matches for each action, in the order the actions
+    were passed in."""
+
+    # Group actions by target so that we only do per-target work once
+    targets = {}
+    for action in actions:
+        targets.setdefault(get_object_key(action.target), action.target)
+
+    # Fetch owning communities and their condition managers. Other owners are loaded fresh here, so only
+    # communities which are themselves targets might have stale roles.
+    stale_candidates = [target for target in targets.values() if getattr(target, "is_community", False)]
+    prefetch_owners(targets.values())
+    communities = {key: target.get_owner() for key, target in targets.items()}
+    prefetch_leadership_condition_managers({get_object_key(c): c for c in communities.values()}.values())
+
+    # Fetch nested objects, and permissions set on targets and nested objects
+    nested_objects = {key: target.get_nested_objects() for key, target in targets.items()}
+    objects = list(targets.values()) + [obj for obj_list in nested_objects.values() for obj in obj_list]
+    change_types = set(action.change.get_change_type() for action in actions)
+    permissions = Client().PermissionResource.get_specific_permissions_for_objects(
+        objects=objects, change_types=change_types)
+    prefetched = PrefetchedPermissions(nested_objects=nested_objects, permissions=permissions)
+
+    # Check each community's roles for staleness once, rather than once per action
+    community_client = Client().Community
+    for community in stale_candidates:
+        community_client.set_target(community)
+        community_client.refresh_roles_if_stale()
+
+    results = []
+    for action in actions:
+        client = Client()
+        community = communities[get_object_key(action.target)]
+        client.update_target_on_all(target=community)
+        results.append(run_permission_pipelines(action, client, community, prefetched, refresh_roles=False))
+
+    return results
 
 
 #######################
@@ -217,16 +363,24 @@ def create_conditions(action, matches):
         if match.unresolved:
             managers += match.get_condition_managers()
 
-    Client().Conditional.create_conditions_for_action(action=action, condition_managers=managers)
+    Client().Conditional.create_conditions_for_action(
+        action=action, condition_managers=managers, prefetched=getattr(action, "prefetched_conditions", None))
 
 
-def action_pipeline(action, do_create_conditions=True):
+def action_pipeline(action, do_create_conditions=True, matches=None):
+    """Checks permissions for the action and implements it if approved. Pass in matches if permissions have already
+    been checked, for instance by has_permission_batch."""
 
     if action.status in ["taken", "waiting"]:
 
-        matches = has_permission(action)
-        if do_create_conditions:
-            create_conditions(action, matches)
+        # condition instances fetched while checking status are reused when creating conditions, for this run only
+        action.prefetched_conditions = PrefetchedConditions()
+        try:
+            matches = matches if matches is not None else has_permission(action)
+            if do_create_conditions:
+                create_conditions(action, matches)
+        finally:
+            action.prefetched_conditions = None
         action.status = determine_action_status(matches)
         save_logs(matches, action)
 
@@ -251,3 +405,19 @@ def mock_action_pipeline(mock_action, exclude_conditional=False):
         return True
 
     return False
+
+
+def mock_action_pipeline_batch(mock_actions, exclude_conditional=False):
+    """Equivalent to calling mock_action_pipeline on each of the mock actions passed in, but checks permissions
+    for all of them at once via has_permission_batch. Returns a list of booleans in the order the mock actions
+    were passed in."""
+
+    for mock_action in mock_actions:
+        mock_action.status = "taken"
+
+    results = []
+    for matches in has_permission_batch(mock_actions):
+        status = determine_action_status(matches)
+        results.append(status == "approved" or (status == "waiting" and exclude_conditional))
+
+    return results
@@ -1,6 +1,14 @@
+import json
+
 from django.test import TestCase
+from django.contrib.auth.models import User
 
 from concord.utils.pipelines import Match
+from concord.utils import lookups
+from concord.utils.helpers import Client
+from concord.utils.converters import (
+    DeserializationContext, recursively_deserialize, recursively_serialize, encode_compact, load_payload, dump_payload,
+    get_deserializer, deserialize_primitive)
 
 
 class FakeCondition:
@@ -52,3 +60,165 @@ class MatchTestCase(TestCase):
                 {'pipeline': 'specific', 'has_authority': True, 'matched_role': 'friends', 'has_condition': True,
                 'condition_manager': None, 'status': 'waiting', 'rejection': None}]
             })
+
+
+class RegistryTestCase(TestCase):
+
+    def test_registry_built_when_apps_ready(self):
+        self.assertTrue(lookups.registry.is_built)
+
+    def test_lookups_by_name(self):
+        from concord.communities.state_changes import AddMembersStateChange
+        from concord.conditionals.filter_conditions import SelfMembershipFilter
+        self.assertEquals(lookups.get_concord_class("AddMembersStateChange"), AddMembersStateChange)
+        self.assertEquals(lookups.get_state_change_object(AddMembersStateChange.get_change_type()),
+                          AddMembersStateChange)
+        self.assertEquals(lookups.get_state_change_object("communities.state_changes.AddMembersStateChange"),
+                          AddMembersStateChange)
+        self.assertEquals(lookups.get_filter_condition_class("SelfMembershipFilter"), SelfMembershipFilter)
+        self.assertIsNone(lookups.get_concord_class("NotARealClass"))
+
+    def test_returned_lists_are_copies(self):
+        lookups.get_all_state_changes().append("junk")
+        self.assertNotIn("junk", lookups.get_all_state_changes())
+
+    def test_rebuild_registry(self):
+        state_changes = lookups.get_all_state_changes()
+        lookups.registry.memoize("test_key", lambda: "cached")
+        lookups.rebuild_registry()
+        self.assertEquals(lookups.get_all_state_changes(), state_changes)
+        self.assertEquals(lookups.registry.memoize("test_key", lambda: "recomputed"), "recomputed")
+
+
+class ClientTestCase(TestCase):
+
+    def test_clients_instantiated_lazily(self):
+        client = Client(actor="fake actor")
+        self.assertEquals(client.instantiated_clients, {})
+        action_client = client.Action
+        self.assertEquals(action_client.actor, "fake actor")
+        self.assertEquals(list(client.instantiated_clients.keys()), ["Action"])
+        self.assertIs(client.Action, action_client)
+
+    def test_limit_to(self):
+        client = Client(actor="fake actor", limit_to=["Action"])
+        self.assertEquals(client.Action.actor, "fake actor")
+        self.assertIsNone(client.Template.actor)
+
+    def test_limit_to_community(self):
+        client = Client(actor="fake actor", target="fake target", limit_to=["Community"])
+        self.assertEquals(client.Community.actor, "fake actor")
+        self.assertEquals(client.Community.target, "fake target")
+        self.assertIsNone(client.Action.actor)
+
+    def test_update_applies_to_clients_instantiated_later(self):
+        client = Client()
+        client.Action
+        client.update_actor_on_all(actor="new actor")
+        client.set_mode_for_all(mode="mock")
+        self.assertEquals(client.Action.actor, "new actor")
+        self.assertEquals(client.Template.actor, "new actor")
+        self.assertEquals(client.Template.mode, "mock")
+
+    def test_community_property(self):
+        client = Client()
+        self.assertIs(client.Community, client.ConcordCommunity)
+        self.assertIn("ConcordCommunity", client.client_names)
+
+    def test_missing_client_raises_attribute_error(self):
+        self.assertIsNone(getattr(Client(), "NotAClient", None))
+
+
+class LRUBackendTestCase(TestCase):
+
+    def test_least_recently_used_entry_is_evicted(self):
+        from concord.utils.permission_cache import LRUBackend
+        backend = LRUBackend(max_size=2)
+        backend.set("a", 1)
+        backend.set("b", 2)
+        backend.get("a")
+        backend.set("c", 3)
+        self.assertEquals(backend.get("a"), 1)
+        self.assertIsNone(backend.get("b"))
+
+    def test_versions(self):
+        from concord.utils.permission_cache import LRUBackend
+        backend = LRUBackend()
+        self.assertEquals(backend.get_version("1_1"), 0)
+        backend.bump_version("1_1")
+        self.assertEquals(backend.get_version("1_1"), 1)
+
+
+class DeserializationContextTestCase(TestCase):
+
+    def setUp(self):
+        from concord.communities.models import Community
+        self.communities = [Community.objects.create(name=name) for name in ["A", "B"]]
+        self.payloads = [{"class": "Community", "concord_dict": True, "pk": community.pk}
+                         for community in self.communities]
+
+    def test_references_fetched_together(self):
+        context = DeserializationContext({"nested": self.payloads}, self.payloads[0])
+        with self.assertNumQueries(1):
+            first, second = [context.get("Community", community.pk) for community in self.communities]
+            self.assertIs(context.get("Community", self.communities[0].pk), first)
+        self.assertEquals([first, second], self.communities)
+
+    def test_deserialize_with_context(self):
+        context = DeserializationContext(self.payloads)
+        with self.assertNumQueries(1):
+            communities = recursively_deserialize(self.payloads, context)
+        self.assertEquals(communities, self.communities)
+
+
+class SerializationTestCase(TestCase):
+
+    def test_recursively_serialize(self):
+        user = User(pk=5, username="fake")
+        self.assertEquals(recursively_serialize({"a": [1, "b", None, user], "c": (True, 1.5), "d": object()}),
+                          {"a": [1, "b", None, {"class": "User", "concord_dict": True, "pk": 5}],
+                           "c": (True, 1.5), "d": None})
+
+    def test_serialize_state_change(self):
+        from concord.resources.state_changes import AddRowStateChange
+        change = AddRowStateChange(row_content="new stuff for row")
+        serialized = change.serialize()
+        self.assertEquals(serialized, {"class": "AddRowStateChange", "concord_dict": True,
+                                       "row_content": "new stuff for row"})
+        self.assertEquals(change.serialize(to_json=True), json.dumps(serialized))
+        self.assertEquals(AddRowStateChange.deserialize(serialized).row_content, "new stuff for row")
+
+    def test_deserializer_compiled_once_per_class(self):
+        from concord.resources.state_changes import AddRowStateChange
+        deserializer = get_deserializer("AddRowStateChange")
+        self.assertIs(get_deserializer("AddRowStateChange"), deserializer)
+        self.assertIs(deserializer.object_class, AddRowStateChange)
+        self.assertIs(deserializer.converters["row_content"], deserialize_primitive)
+
+        serialized = AddRowStateChange(row_content="new stuff").serialize()
+        self.assertEquals(AddRowStateChange.deserialize(serialized).row_content, "new stuff")
+        self.assertIn("concord_dict", serialized)
+
+
+class CompactFormatTestCase(TestCase):
+
+    def setUp(self):
+        self.data = {"class": "Template", "concord_dict": True, "description": "", "system": False, "action_list": [
+            {"class": "MockAction", "concord_dict": True, "status": "created", "unique_id": None,
+             "change": {"class": "AddRowStateChange", "concord_dict": True, "row_content": "a", "index": None}},
+            {"class": "MockAction", "concord_dict": True, "status": "created", "unique_id": None,
+             "change": {"class": "AddRowStateChange", "concord_dict": True, "row_content": "b", "index": None}}]}
+
+    def test_round_trip(self):
+        encoded = encode_compact(self.data)
+        self.assertLess(len(encoded), len(json.dumps(self.data)))
+        self.assertEquals(json.loads(encoded)["t"][1], ["MockAction", ["status", "unique_id", "change"]])
+        self.assertEquals(load_payload(encoded), self.data)
+
+    def test_legacy_format_still_loaded(self):
+        self.assertEquals(load_payload(json.dumps(self.data)), self.data)
+        self.assertEquals(load_payload(dump_payload(self.data)), self.data)
+
+    def test_falls_back_to_regular_format(self):
+        data = {"class": "AddRowStateChange", "concord_dict": True, "row_content": {"~": "tilde"}}
+        self.assertEquals(dump_payload(data, compact=True), json.dumps(data))
@@ -0,0 +1,48 @@
+from abc import abstractmethod
+
+from django.db.models import F
+
+
+class VersionedStateMixin(object):
+    """Mixin for models which bump a version field whenever some tracked part of their state changes, so that other
+    copies of the instance, or anything compiled from it, can cheaply detect that they're stale.
+
+    Subclasses set version_field and implement snapshot_state, which records the tracked state as loaded from the
+    database, and state_has_changed, which compares the current state against that snapshot. The version is bumped
+    with an F() expression so that concurrent saves don't lose increments, then re-read so the instance holds an
+    integer again.
+
+    Models which don't implement the hooks still save, but bump their version on every save."""
+
+    version_field = "version"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot_state()
+        return instance
+
+    # Methods models must implement themselves
+
+    @abstractmethod
+    def snapshot_state(self, fields=None):
+        """Records the tracked state. If fields is given, only the tracked state in those fields is recorded."""
+
+    @abstractmethod
+    def state_has_changed(self):
+        """Returns True if the tracked state has changed since the last snapshot."""
+        return True
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self.snapshot_state(fields)
+
+    def save(self, *args, **kwargs):
+        bump_version = not self._state.adding and self.state_has_changed()
+        if bump_version:
+            setattr(self, self.version_field, F(self.version_field) + 1)
+        super().save(*args, **kwargs)
+        if bump_version:
+            version = self.__class__.objects.values_list(self.version_field, flat=True).get(pk=self.pk)
+            setattr(self, self.version_field, version)
+        self.snapshot_state()